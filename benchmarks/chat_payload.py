@@ -0,0 +1,60 @@
+"""
+Benchmark of the chat request payload serialization.
+
+Measures the cost of a chat turn (appending a message and encoding the request payload) as the chat
+history grows: the full serialization of all messages against the cached message prefix
+of the chat value. With the cache only the new message is encoded, the cached messages are copied
+into the payload once, so the cached cost still grows slowly with the payload size.
+
+Usage:
+    python benchmarks/chat_payload.py
+"""
+import json
+import time
+
+from sidusai.core.plugin import ChatAgentValue
+from sidusai.plugins.deepseek.components import DeepSeekClientComponent
+
+__sizes__ = [10, 100, 1000, 5000]
+__turns__ = 100
+__content__ = 'The quick brown fox jumps over the lazy dog. ' * 5
+
+
+def build_chat(size: int) -> ChatAgentValue:
+    chat = ChatAgentValue([])
+    for i in range(size):
+        chat.append_user(__content__) if i % 2 == 0 else chat.append_assistant(__content__)
+    return chat
+
+
+def full_payload(client: DeepSeekClientComponent, chat: ChatAgentValue) -> bytes:
+    messages = [{'role': v['role'], 'content': v['content']} for v in chat.messages]
+    return json.dumps({'messages': messages, **client._build_params()}).encode('utf-8')
+
+
+def measure_turns(chat: ChatAgentValue, encode) -> float:
+    started_at = time.perf_counter()
+    for _ in range(__turns__):
+        chat.append_user(__content__)
+        encode(chat)
+    return (time.perf_counter() - started_at) / __turns__ * 1e6
+
+
+def main():
+    client = DeepSeekClientComponent('api_key')
+
+    print(f'{"messages":>9} {"full, us":>9} {"cached, us":>11} {"payload, KiB":>13}')
+    for size in __sizes__:
+        full_time = measure_turns(build_chat(size), lambda chat: full_payload(client, chat))
+
+        chat = build_chat(size)
+        payload = client._build_payload(chat)
+        cached_time = measure_turns(chat, client._build_payload)
+        assert json.loads(client._build_payload(chat)) == json.loads(full_payload(client, chat))
+
+        print(f'{size:>9} {full_time:>9.1f} {cached_time:>11.1f} {len(payload) / 1024:>13.1f}')
+    client.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""
+Benchmark of NamedTypedContainer lookups.
+
+Measures the cost of lookups by exact type, by base type (subclass match), by missing type
+and of the name resolution by type as the number of registered components grows.
+
+Usage:
+    python benchmarks/container_lookup.py
+"""
+import timeit
+
+from sidusai.core.types import NamedTypedContainer
+
+__sizes__ = [10, 100, 500, 1000]
+__repeat__ = 5
+__number__ = 20000
+
+
+class BaseComponent:
+    pass
+
+
+class Missing:
+    pass
+
+
+def build_container(size: int):
+    container = NamedTypedContainer()
+    _types = []
+    for i in range(size):
+        _type = type(f'Component{i}', (BaseComponent,) if i == size - 1 else (), {})
+        container.put(_type(), f'component_{i}', _type)
+        _types.append(_type)
+    return container, _types
+
+
+def measure(statement) -> float:
+    """
+    :return: Best time of a single call in microseconds
+    """
+    return min(timeit.repeat(statement, repeat=__repeat__, number=__number__)) / __number__ * 1e6
+
+
+def main():
+    print(f'{"components":>10} {"exact, us":>10} {"subclass, us":>13} {"missing, us":>12} {"name, us":>9}')
+    for size in __sizes__:
+        container, _types = build_container(size)
+        exact = _types[size // 2]
+
+        exact_time = measure(lambda: container[exact])
+        subclass_time = measure(lambda: container[BaseComponent])
+        missing_time = measure(lambda: Missing in container)
+        name_time = measure(lambda: container.get_name_from_type(exact))
+
+        print(f'{size:>10} {exact_time:>10.3f} {subclass_time:>13.3f} {missing_time:>12.3f} {name_time:>9.3f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+"""
+Benchmark of the skill graph scaling.
+
+Measures the build time and memory of a task skill graph, the shortest path search
+and the cached active nodes lookup as the number of registered skills grows.
+
+Usage:
+    python benchmarks/skill_graph.py
+"""
+import time
+import tracemalloc
+
+from sidusai.core.graph import AgentSkillGraph
+
+__sizes__ = [10, 100, 1000, 5000]
+__chain__ = ['skill_1', 'skill_3', 'skill_1', 'skill_5', 'skill_7']
+__path_runs__ = 5
+
+
+def main():
+    print(f'{"skills":>7} {"build, ms":>10} {"memory, KiB":>12} {"path, ms":>9} {"cached, us":>11}')
+    for size in __sizes__:
+        skill_names = [f'skill_{i}' for i in range(size)]
+
+        tracemalloc.start()
+        started_at = time.perf_counter()
+        graph = AgentSkillGraph(skill_names, __chain__)
+        build_time = (time.perf_counter() - started_at) * 1e3
+        _, memory = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        # The route is resolved at build, the search is timed directly
+        started_at = time.perf_counter()
+        for _ in range(__path_runs__):
+            path = graph.find_shortest_path()
+        path_time = (time.perf_counter() - started_at) * 1e3 / __path_runs__
+        assert len(path) == len(__chain__) + 2
+        assert graph.get_active_nodes() == __chain__
+
+        started_at = time.perf_counter()
+        for _ in range(1000):
+            graph.get_active_nodes()
+        cached_time = (time.perf_counter() - started_at) * 1e3
+
+        print(f'{size:>7} {build_time:>10.2f} {memory / 1024:>12.1f} {path_time:>9.2f} {cached_time:>11.3f}')
+
+
+if __name__ == '__main__':
+    main()
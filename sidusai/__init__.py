@@ -14,12 +14,32 @@ from sidusai.core.context import (
     AgentContext
 )
 
+from sidusai.core.execute import (
+    TaskFuture, wait_all, as_completed
+)
+
+from sidusai.core.cache import (
+    ResponseCache
+)
+
+from sidusai.core.limiter import (
+    RateLimiter
+)
+
+from sidusai.core.budget import (
+    TokenBudget, estimate_tokens
+)
+
+from sidusai.core.routing import (
+    report_skill_tokens
+)
+
 from sidusai.core.types import (
-    AgentValue, AgentTask
+    AgentValue, AgentTask, complete_task
 )
 
 from sidusai.core.plugin import (
-    ChatAgentValue, CompletedAgentTask
+    ChatAgentValue, ChatChunkAgentValue, CompletedAgentTask
 )
 
 from sidusai.core.plugin import (
@@ -1,26 +1,74 @@
+import asyncio
+import concurrent.futures as futures
+import contextlib
+import functools
 import inspect
+import logging
 import time
 
 import sidusai.core.context as context
+import sidusai.core.dag as dag
 import sidusai.core.execute as ex
+import sidusai.core.process as process
+import sidusai.core.routing as routing
+import sidusai.core.stream as stream
 import sidusai.core.types as types
 import sidusai.core.utils as utils
 
+from sidusai.core.cache import SkillCache
+
 __default_agent_name__ = '_default_agent_name_'
 
+_log = logging.getLogger(__name__)
+
+_no_measure = contextlib.nullcontext()
+
 
 class Agent:
     """
     Default wrap application life cycle
     """
 
-    def __init__(self, agent_name: str = __default_agent_name__):
+    def __init__(self, agent_name: str = __default_agent_name__, pool_max_size: int = 16,
+                 queue_max_size: int = 1024, overflow_policy: str = 'block', async_concurrency_limit: int = 256,
+                 process_pool_max_size: int = None, process_start_method: str = None):
+        """
+        :param agent_name: Agent name
+        :param pool_max_size: Maximum number of worker threads executing tasks and loops
+        :param queue_max_size: Maximum number of tasks waiting for a worker
+        :param overflow_policy: Behavior when the task queue is full: 'block', 'reject' or 'drop_oldest'
+        :param async_concurrency_limit: Maximum number of tasks executed simultaneously in the async runtime
+        :param process_pool_max_size: Number of worker processes for process skills. Default is CPU count
+        :param process_start_method: Multiprocessing start method of worker processes ('spawn', 'fork', etc.)
+        """
         self.agent_name = agent_name
         self.ctx = context.AgentContext(self.agent_name)
         self.is_builded = False
         self.is_enabled = True
 
-        self._thread_pool = ex.ThreadPool()
+        self._thread_pool = ex.ThreadPool(
+            pool_max_size=pool_max_size,
+            queue_max_size=queue_max_size,
+            overflow_policy=overflow_policy
+        )
+
+        # Process pool for CPU-bound skills. Created at build if the context contains process skills
+        self._process_pool_max_size = process_pool_max_size
+        self._process_start_method = process_start_method
+        self._process_pool = None
+
+        # Batchers of batch skills by skill name
+        self._skill_batchers = {}
+
+        # Adaptive routing of tasks with alternative skills. Disabled by default
+        self._router = None
+
+        # Async runtime. The event loop is set while the application is running in async mode
+        self._async_concurrency_limit = async_concurrency_limit
+        self._async_semaphore = None
+        self._async_key_locks = {}
+        self._async_tasks = set()
+        self._event_loop = None
 
     #################################################################
     # Core decorators
@@ -40,21 +88,30 @@ class Agent:
 
         return decorator
 
-    def skill(self, name: str = None):
+    def skill(self, name: str = None, executor: str = 'thread', batch_max_size: int = 16,
+              batch_max_wait_sec: float = 0.01, cache_size: int = None, cache_ttl_sec: float = None,
+              cache_key=None):
         """
         Decorator for create application skill.
         This is a special class or method for forming the logic of an agent's available action.
         :param name:
+        :param executor: 'thread' or 'process'. Use process executor for CPU-bound skills
+        :param batch_max_size: Maximum batch size for skills accepting a list of values
+        :param batch_max_wait_sec: Maximum wait time for filling the batch
+        :param cache_size: Enables memoization of skill results with the given LRU size
+        :param cache_ttl_sec: Time to live of memoized results
+        :param cache_key: Function building the memoization key from the value
         :return:
         """
 
         def decorator(handler):
-            self.add_skill(handler, name)
+            self.add_skill(handler, name, executor, batch_max_size, batch_max_wait_sec,
+                           cache_size, cache_ttl_sec, cache_key)
             return handler
 
         return decorator
 
-    def task(self, task_name: str, skill_names: [str] = None):
+    def task(self, task_name: str, skill_names: [str] = None, skill_dag: dict = None, branch_timeouts: dict = None):
         """
         Decorator for create user's task
         This is a special class for forming and describing the logic of the task being solved by the agent.
@@ -62,7 +119,10 @@ class Agent:
         """
 
         def decorator(handler):
-            self.task_registration(handler=handler, name=task_name, skill_names=skill_names)
+            self.task_registration(
+                handler=handler, name=task_name, skill_names=skill_names,
+                skill_dag=skill_dag, branch_timeouts=branch_timeouts
+            )
             return handler
 
         return decorator
@@ -109,10 +169,18 @@ class Agent:
 
         return decorator
 
-    def exception_handler(self, error_types: list = None, order: int = 0):
+    def exception_handler(self, error_types: list = None, order: int = 0, detached: bool = False):
+        """
+        Decorator for task exception handlers
+        :param error_types: Handled exception types (including subclasses). None - all exceptions
+        :param order: Handlers are executed in ascending order
+        :param detached: Execute the handler in the thread pool (or as a separate coroutine in async mode)
+        instead of the worker of the failed task
+        :return:
+        """
 
         def decorator(handler):
-            self.add_exception_handler_method(handler, error_types, order)
+            self.add_exception_handler_method(handler, error_types, order, detached)
             return handler
 
         return decorator
@@ -132,24 +200,131 @@ class Agent:
             raise ValueError(f'Invalid service. Service \'{builder}\' must be class or function')
         self.ctx.add_component_builder(builder, name=name)
 
-    def add_skill(self, handler, name: str = None):
+    def add_skill(self, handler, name: str = None, executor: str = 'thread', batch_max_size: int = 16,
+                  batch_max_wait_sec: float = 0.01, cache_size: int = None, cache_ttl_sec: float = None,
+                  cache_key=None):
         """
         Add skill method/class to context
         :param handler: Function/Method/class skill.
         :param name: Skill name
+        :param executor: 'thread' or 'process'. Process skills are executed in the process pool:
+        the value is passed in and out by pickling, and components are built in each worker
+        process from the registered component builders.
+        :param batch_max_size: Maximum batch size. A skill that accepts a list of values (e.g.
+        values: list[ChatAgentValue]) receives values of simultaneously executed tasks in micro-batches
+        and must return a list of transformed values in the same order.
+        :param batch_max_wait_sec: Maximum wait time for filling the batch
+        :param cache_size: Enables memoization of skill results with the given LRU size. The memoized
+        result replaces the skill call, so the cache key must cover everything the result depends on
+        :param cache_ttl_sec: Time to live of memoized results. None - results do not expire
+        :param cache_key: Function building a hashable memoization key from the value.
+        By default, the value cache_key() method or its public attributes are used
+        :return:
+        """
+        cache = None
+        if cache_size is not None:
+            cache = SkillCache(max_size=cache_size, ttl_sec=cache_ttl_sec, key=cache_key)
+
+        self.ctx.add_agent_skill(
+            skill=handler,
+            skill_name=name,
+            executor=executor,
+            batch_max_size=batch_max_size,
+            batch_max_wait_sec=batch_max_wait_sec,
+            cache=cache
+        )
+
+    def get_skill_cache(self, name: str) -> SkillCache | None:
+        """
+        Get the memoization cache of the skill (e.g. to read hit and miss counters)
+        :param name: Skill name
         :return:
         """
-        self.ctx.add_agent_skill(skill=handler, skill_name=name)
+        skill = self.ctx.skills.get(name)
+        return skill.options.cache if skill is not None else None
 
-    def task_registration(self, handler, name: str = None, skill_names: [str] = None):
+    def task_registration(self, handler, name: str = None, skill_names: [str] = None,
+                          skill_dag: dict = None, branch_timeouts: dict = None):
         """
         Registration task type to context.
-        :param skill_names:
+        :param skill_names: Skill chain of the task. An item can be a tuple of alternative skills,
+        e.g. ['a', ('b1', 'b2'), 'c']. With the adaptive routing enabled the cheapest alternative is executed,
+        otherwise the first one
         :param handler:
         :param name:
+        :param skill_dag: Skill DAG used instead of the skill chain: dependencies by skill name,
+        e.g. {'merge': ['moderation', 'retrieval'], 'retrieval': ['detect_language']}. Independent skills are
+        executed concurrently, a skill with several dependencies receives their results (see SkillDag)
+        :param branch_timeouts: Maximum execution time of the skill DAG skills by skill name, seconds.
+        TimeoutError is raised if a skill is not finished in time
+        :return:
+        """
+        self.ctx.add_task_class(handler, name, skill_names, skill_dag, branch_timeouts)
+
+    def get_task_route(self, task: str | type) -> tuple:
+        """
+        Get the current skill route of the task
+        :param task: Task name or type
+        :return: Pair (route version, tuple of skill names). The version is incremented when the route changes
+        """
+        return self._find_task_graph(task).get_route()
+
+    def set_task_skill_weights(self, task: str | type, weights: dict) -> bool:
+        """
+        Update weights of the task skill graph. Can be called while tasks are executed: running tasks
+        finish with their current skill chain, the next tasks use the new route.
+        :param task: Task name or type
+        :param weights: Weights by (from node, to node) pairs
+        :return: True if the task route changed
+        """
+        return self._find_task_graph(task).set_skill_weights(weights)
+
+    def enable_adaptive_routing(self, alpha: float = 0.2, latency_weight: float = 1.0, error_weight: float = 10.0,
+                                token_weight: float = 0.001, update_interval_sec: float = 1.0,
+                                stale_sec: float = 300.0, max_latency_sec: float = 60.0):
+        """
+        Route tasks with alternative skills through the cheapest alternatives. Skill calls are measured,
+        the cost of a skill is the weighted sum of moving averages of its latency (seconds), error rate
+        and token cost. Skills report spent tokens with sai.report_skill_tokens.
+        :param alpha: Smoothing factor of the moving averages, (0, 1]
+        :param latency_weight: Cost of a second of the skill latency
+        :param error_weight: Cost of the skill error rate
+        :param token_weight: Cost of a token spent by the skill
+        :param update_interval_sec: Minimum interval between route updates
+        :param stale_sec: Time without calls after which the skill statistics are reset
+        :param max_latency_sec: Upper bound of a measured latency
+        :return:
+        """
+        self._router = routing.AdaptiveRouter(
+            self.ctx,
+            alpha=alpha,
+            latency_weight=latency_weight,
+            error_weight=error_weight,
+            token_weight=token_weight,
+            update_interval_sec=update_interval_sec,
+            stale_sec=stale_sec,
+            max_latency_sec=max_latency_sec
+        )
+
+    def get_skill_stats(self, name: str) -> dict | None:
+        """
+        Get the measured statistics of the skill. Available if the adaptive routing is enabled
+        :param name: Skill name
         :return:
         """
-        self.ctx.add_task_class(handler, name, skill_names)
+        if self._router is None:
+            return None
+        stats = self._router.get_stats(name)
+        return stats.to_dict() if stats is not None else None
+
+    def add_task_route_listener(self, task: str | type, listener):
+        """
+        Add a listener called when the task route changes
+        :param task: Task name or type
+        :param listener: Callable accepting the skill graph, the route version and the tuple of skill names
+        :return:
+        """
+        self._find_task_graph(task).add_route_listener(listener)
 
     def add_configuration(self, handler, order: int = 0):
         """
@@ -179,8 +354,17 @@ class Agent:
         """
         self.ctx.add_loop_method(handler, fixed_interval_sec, order)
 
-    def add_exception_handler_method(self, handler, error_types: list = None, order: int = 0):
-        self.ctx.add_exception_handler(handler, error_types, order)
+    def add_exception_handler_method(self, handler, error_types: list = None, order: int = 0,
+                                     detached: bool = False):
+        """
+        Add task exception handler to context
+        :param handler:
+        :param error_types: Handled exception types (including subclasses). None - all exceptions
+        :param order: Handlers are executed in ascending order
+        :param detached: Execute the handler off the worker of the failed task
+        :return:
+        """
+        self.ctx.add_exception_handler(handler, error_types, order, is_detached=detached)
 
     #################################################################
     # Application
@@ -195,16 +379,80 @@ class Agent:
         """
         return self.ctx.build_task(task)
 
-    def task_execute(self, task: types.AgentTask):
+    def task_execute(self, task: types.AgentTask, lock_key=None) -> ex.TaskFuture:
         """
         Performing a task using active skills in a separate thread
         :param task:
-        :return:
+        :param lock_key: Tasks with the same key (e.g. user id) are executed one after another
+        :return: Result handle of the task
         """
-        self._thread_pool.execute(
-            target=self._execute_task,
-            args=(task,)
+        future = ex.TaskFuture(task)
+        if self._event_loop is not None:
+            # The application is running in async mode
+            self._event_loop.call_soon_threadsafe(
+                self._create_async_task, self._execute_task_future_async(task, future, lock_key)
+            )
+            return future
+
+        self._thread_pool.submit(
+            ex.FutureWorkItem(self._execute_task, (task,), lock_key=lock_key, future=future)
         )
+        return future
+
+    def task_execute_many(self, tasks: list, lock_key=None) -> list:
+        """
+        Performing several tasks at once. Tasks are queued together, so batch skills
+        receive their values in as few batches as possible.
+        :param tasks: List of tasks
+        :param lock_key: Tasks with the same key (e.g. user id) are executed one after another
+        :return: List of result handles in the order of tasks
+        """
+        _futures = [ex.TaskFuture(task) for task in tasks]
+        if self._event_loop is not None:
+            for task, future in zip(tasks, _futures):
+                self._event_loop.call_soon_threadsafe(
+                    self._create_async_task, self._execute_task_future_async(task, future, lock_key)
+                )
+            return _futures
+
+        self._thread_pool.submit_batch([
+            ex.FutureWorkItem(self._execute_task, (task,), lock_key=lock_key, future=future)
+            for task, future in zip(tasks, _futures)
+        ])
+        return _futures
+
+    async def task_execute_async(self, task: types.AgentTask, lock_key=None) -> types.AgentValue:
+        """
+        Performing a task in the current event loop. Coroutine skills and task methods are awaited,
+        synchronous ones are executed in the thread pool.
+        :param task:
+        :param lock_key: Tasks with the same key (e.g. user id) are executed one after another
+        :return: Task value after all skills
+        """
+        async with self._get_async_semaphore():
+            if lock_key is None:
+                return await self._execute_task_async(task)
+
+            async with _AsyncKeyLock(self._async_key_locks, lock_key):
+                return await self._execute_task_async(task)
+
+    @property
+    def thread_pool(self) -> ex.ThreadPool:
+        return self._thread_pool
+
+    @property
+    def queue_depth(self) -> int:
+        """
+        :return: Number of tasks and loop calls waiting for a worker
+        """
+        return self._thread_pool.queue_depth
+
+    @property
+    def active_workers(self) -> int:
+        """
+        :return: Number of workers executing tasks and loop calls
+        """
+        return self._thread_pool.active_workers
 
     def application_build(self):
         if self.is_builded:
@@ -232,6 +480,26 @@ class Agent:
         # Build tasks
         context.build_tasks(self.ctx)
 
+        # Resolve arguments of all executables once
+        context.compile_executables(self.ctx)
+        self.ctx.freeze_exception_handlers()
+
+        for skill in self.ctx.skills.values():
+            if skill.options.is_batch:
+                self._skill_batchers[skill.name] = ex.SkillBatcher(
+                    execute=functools.partial(self._call_skill, skill),
+                    execute_async=functools.partial(self._call_skill_async, skill),
+                    max_size=skill.options.batch_max_size,
+                    max_wait_sec=skill.options.batch_max_wait_sec
+                )
+
+        if process.validate_process_skills(self.ctx):
+            self._process_pool = process.ProcessPool(
+                self.ctx,
+                max_workers=self._process_pool_max_size,
+                start_method=self._process_start_method
+            )
+
         self.is_builded = True
 
     def application_run(self, interval: int = 1):
@@ -249,39 +517,474 @@ class Agent:
             for loop in self.ctx.loops:
                 if loop.fixed_interval_sec is not None and cur_ms - loop.last_loop_at > loop.fixed_interval_sec and not loop.is_executing:
                     loop.is_executing = True
-                    self._thread_pool.execute(
-                        target=self._execute_loop,
-                        args=(loop,)
-                    )
+                    try:
+                        self._thread_pool.submit(_LoopWorkItem(self._execute_loop, loop))
+                    except ex.TaskRejectedError:
+                        # Skip the iteration, the loop will be run at the next tick
+                        loop.is_executing = False
             time.sleep(interval)
 
+    async def application_run_async(self, interval: int = 1):
+        """
+        Implementation of the main loop of the application in the current event loop.
+        Loop methods and tasks (including tasks passed to task_execute from other threads)
+        are executed as coroutines, synchronous methods are executed in the thread pool.
+        :param interval: wait between iterations
+        :return:
+        """
+        if not self.is_builded:
+            self.application_build()
+
+        self._event_loop = asyncio.get_running_loop()
+        try:
+            while self.is_enabled:
+                cur_ms = utils.current_sec()
+                for loop in self.ctx.loops:
+                    if loop.fixed_interval_sec is not None and cur_ms - loop.last_loop_at > loop.fixed_interval_sec and not loop.is_executing:
+                        loop.is_executing = True
+                        self._create_async_task(self._execute_loop_async(loop))
+                await asyncio.sleep(interval)
+        finally:
+            self._event_loop = None
+
     def _execute_loop(self, loop):
-        ex.execute_executable(loop.executable, self.ctx.components)
-        loop.is_executing = False
-        loop.last_loop_at = utils.current_sec()
+        try:
+            ex.execute_executable(loop.executable, self.ctx.components)
+        finally:
+            loop.is_executing = False
+            loop.last_loop_at = utils.current_sec()
 
     def _execute_task(self, task: types.AgentTask):
-        task_type = type(task)
-        task_container = self.ctx.get_task_container(task_type)
-        skill_names = task_container.skill_graph.get_active_nodes()
-        skills = self.ctx.find_executable_skills(skill_names)
+        task_container = self._get_task_container(task)
+        skill_dag = task_container.dag
+        skills = self.ctx.get_task_skills(task_container) if skill_dag is None else ()
+
+        try:
+            value: types.AgentValue = self._execute_task_method(
+                task, task_container.executable_forward, task.forward
+            )
+            if skill_dag is None:
+                value = self._execute_chain(task, task_container, skills, value)
+            else:
+                value = self._execute_dag(skill_dag, value)
+
+            self._execute_task_method(task, task_container.executable_on_complete, task.on_complete, {'value': value})
+        except BaseException as e:
+            self._handle_exception(e)
+            raise
+        return value
+
+    def _execute_chain(self, task: types.AgentTask, task_container: types.TaskContainer, skills: tuple,
+                       value: types.AgentValue) -> types.AgentValue:
+        for index, skill in enumerate(skills):
+            if skill.options.is_stream_consumer:
+                value = stream.to_stream(value)
+            value = self._execute_skill(skill, value)
+            if isinstance(value, types.TaskCompletion):
+                return value.value
+
+            if skill.is_generator:
+                value = stream.SkillStream(value)
+                if not is_stream_consumed(skills, index):
+                    value = self._drain_stream(task, task_container, value)
+        return value
+
+    def _drain_stream(self, task: types.AgentTask, task_container: types.TaskContainer,
+                      skill_stream: stream.SkillStream) -> types.AgentValue:
+        for chunk in skill_stream:
+            self._execute_task_method(task, task_container.executable_on_chunk, task.on_chunk, {'value': chunk})
+        return skill_stream.result
+
+    def _execute_dag(self, skill_dag: dag.SkillDag, value: types.AgentValue) -> types.AgentValue:
+        """
+        Execute the skill DAG. Ready skills are queued to the thread pool, the calling thread executes
+        the skills that are still waiting in the queue instead of waiting for them, so the task
+        never blocks a worker on the queued work.
+        """
+        results = {}
+        arguments = {}
+        started_at = {}
+        running = {}
+        sorter = skill_dag.new_sorter()
+        try:
+            while sorter.is_active():
+                for name in sorter.get_ready():
+                    started_at[name] = time.monotonic()
+                    arguments[name] = (skill_dag.skills[name], *skill_dag.get_arguments(name, value, results))
+                    try:
+                        future = self._thread_pool.call(self._execute_dag_skill, *arguments[name])
+                    except ex.TaskRejectedError:
+                        future = _call_in_place(self._execute_dag_skill, *arguments[name])
+                    running[future] = name
+
+                for future in self._wait_dag_skills(skill_dag, running, arguments, started_at):
+                    name = running.pop(future)
+                    result, finished_at = future.result()
+                    if skill_dag.is_timed_out(name, finished_at - started_at[name]):
+                        raise skill_dag.timeout_error(name)
+                    results[name] = result
+                    sorter.done(name)
+        finally:
+            for future in running:
+                future.cancel()
+        return results[skill_dag.sink]
+
+    def _wait_dag_skills(self, skill_dag: dag.SkillDag, running: dict, arguments: dict, started_at: dict) -> list:
+        while True:
+            done = [future for future in running if future.done()]
+            if len(done) > 0:
+                # Skills dropped from the full queue are executed in place
+                for future in done:
+                    if future.cancelled():
+                        name = running.pop(future)
+                        running[_call_in_place(self._execute_dag_skill, *arguments[name])] = name
+                return [future for future in running if future.done()]
+
+            # A skill still waiting in the queue is executed in place
+            queued = next((future for future in running if future.cancel()), None)
+            if queued is not None:
+                name = running.pop(queued)
+                running[_call_in_place(self._execute_dag_skill, *arguments[name])] = name
+                continue
+
+            deadlines = [
+                started_at[name] + skill_dag.branch_timeouts[name]
+                for name in running.values() if name in skill_dag.branch_timeouts
+            ]
+            timeout = max(min(deadlines) - time.monotonic(), 0) if len(deadlines) > 0 else None
+            futures.wait(list(running), timeout=timeout, return_when=futures.FIRST_COMPLETED)
+
+            now = time.monotonic()
+            for future, name in running.items():
+                if not future.done() and skill_dag.is_timed_out(name, now - started_at[name]):
+                    raise skill_dag.timeout_error(name)
+
+    def _execute_dag_skill(self, skill: ex.Executable, value: types.AgentValue, results: dict | None) -> tuple:
+        if results is None:
+            result = self._execute_skill(skill, value)
+        else:
+            with self._measure_skill(skill):
+                result = ex.execute_executable(skill, self.ctx.components, {'value': value, 'results': results})
+        return types.unwrap_completion(result), time.monotonic()
+
+    def _handle_exception(self, error: BaseException):
+        for handler in self.ctx.get_exception_handler_containers(type(error)):
+            if handler.is_detached:
+                try:
+                    self._thread_pool.execute(self._execute_exception_handler, (handler.executable, error))
+                    continue
+                except ex.TaskRejectedError:
+                    # The queue is full, the handler is executed in place
+                    pass
+            self._execute_exception_handler(handler.executable, error)
+
+    def _execute_exception_handler(self, executable: ex.Executable, error: BaseException):
+        try:
+            ex.execute_executable(executable, self.ctx.components, {'exception': error})
+        except BaseException as e:
+            _log.exception(f'Exception handler {executable.handler} failed: {e}')
+
+    def _get_task_container(self, task: types.AgentTask) -> types.TaskContainer:
+        return self._find_task_container(type(task))
+
+    def _find_task_container(self, task: str | type) -> types.TaskContainer:
+        task_container = self.ctx.get_task_container(task)
+        if task_container is None:
+            raise ValueError(f'Task {task} is not registered')
+        return task_container
+
+    def _find_task_graph(self, task: str | type):
+        task_container = self._find_task_container(task)
+        if task_container.skill_dag is not None:
+            raise ValueError(f'Task {task} is executed by the skill DAG and has no skill graph')
+        if task_container.skill_graph is None:
+            raise RuntimeError('Agent application is not built')
+        return task_container.skill_graph
+
+    def _execute_skill(self, skill: ex.Executable, value: types.AgentValue) -> types.AgentValue:
+        cache = skill.options.cache
+        if cache is not None:
+            key = cache.key(value)
+            is_found, result = cache.get(key)
+            if is_found:
+                return result
+
+        with self._measure_skill(skill):
+            if skill.options.is_batch:
+                result = self._skill_batchers[skill.name].process(value)
+            else:
+                result = self._call_skill(skill, value)
+
+        if cache is not None:
+            cache.put(key, result)
+        return result
+
+    def _measure_skill(self, skill: ex.Executable):
+        if self._router is None:
+            return _no_measure
+        return self._router.measure(skill.name)
+
+    def _call_skill(self, skill: ex.Executable, value: types.AgentValue | list) -> types.AgentValue | list:
+        if skill.options.executor == ex.__executor_process__:
+            return self._process_pool.call(skill, value).result()
+        return ex.execute_executable(skill, self.ctx.components, {'value': value})
+
+    def _execute_task_method(self, task: types.AgentTask, executable: ex.Executable | None, method,
+                             additional_container: dict = None):
+        if executable is None:
+            # The method is not a plain function of the task class
+            return ex.execute_executable(ex.get_executable(method), self.ctx.components, additional_container)
+        return ex.execute_executable(executable, self.ctx.components, additional_container, instance=task)
 
+    #################################################################
+    # Async runtime
+    #################################################################
+
+    def _get_async_semaphore(self) -> asyncio.Semaphore:
+        if self._async_semaphore is None:
+            self._async_semaphore = asyncio.Semaphore(self._async_concurrency_limit)
+        return self._async_semaphore
+
+    def _create_async_task(self, coroutine):
+        # The loop keeps only weak references to tasks
+        _task = asyncio.ensure_future(coroutine)
+        self._async_tasks.add(_task)
+        _task.add_done_callback(self._async_tasks.discard)
+
+    async def _execute_task_future_async(self, task: types.AgentTask, future: ex.TaskFuture, lock_key=None):
+        async with self._get_async_semaphore():
+            # The task can be cancelled while it is waiting for the semaphore
+            if not future.set_running_or_notify_cancel():
+                return
+            try:
+                if lock_key is None:
+                    result = await self._execute_task_async(task)
+                else:
+                    async with _AsyncKeyLock(self._async_key_locks, lock_key):
+                        result = await self._execute_task_async(task)
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+
+    async def _execute_loop_async(self, loop):
         try:
-            forward_executable = ex.Executable(task.forward)
-            on_complete_executable = ex.Executable(task.on_complete)
-            value: types.AgentValue = ex.execute_executable(forward_executable, self.ctx.components)
-            for skill in skills:
-                value = ex.execute_executable(skill, self.ctx.components, {'value': value})
+            await ex.execute_executable_async(loop.executable, self.ctx.components, pool=self._thread_pool)
+        except BaseException as e:
+            _log.exception(f'Unhandled exception in loop method {loop.executable.handler}: {e}')
+        finally:
+            loop.is_executing = False
+            loop.last_loop_at = utils.current_sec()
+
+    async def _execute_task_async(self, task: types.AgentTask):
+        task_container = self._get_task_container(task)
+        skill_dag = task_container.dag
+        skills = self.ctx.get_task_skills(task_container) if skill_dag is None else ()
 
-            ex.execute_executable(on_complete_executable, self.ctx.components, {'value': value})
+        try:
+            value: types.AgentValue = await self._execute_task_method_async(
+                task, task_container.executable_forward, task.forward
+            )
+            if skill_dag is None:
+                value = await self._execute_chain_async(task, task_container, skills, value)
+            else:
+                value = await self._execute_dag_async(skill_dag, value)
+
+            await self._execute_task_method_async(
+                task, task_container.executable_on_complete, task.on_complete, {'value': value}
+            )
         except BaseException as e:
-            error_type = type(e)
-            handlers = self.ctx.get_exception_handlers(error_type)
-            for handler in handlers:
-                ex.execute_executable(handler, self.ctx.components, {'exception': e})
+            await self._handle_exception_async(e)
+            raise
+        return value
+
+    async def _execute_chain_async(self, task: types.AgentTask, task_container: types.TaskContainer, skills: tuple,
+                                   value: types.AgentValue) -> types.AgentValue:
+        loop = asyncio.get_running_loop()
+        for index, skill in enumerate(skills):
+            if skill.options.is_stream_consumer:
+                value = stream.to_stream(value, loop, self._thread_pool)
+            value = await self._execute_skill_async(skill, value)
+            if isinstance(value, types.TaskCompletion):
+                return value.value
+
+            if skill.is_generator:
+                value = stream.SkillStream(value, loop, self._thread_pool)
+                if not is_stream_consumed(skills, index):
+                    value = await self._drain_stream_async(task, task_container, value)
+        return value
+
+    async def _drain_stream_async(self, task: types.AgentTask, task_container: types.TaskContainer,
+                                  skill_stream: stream.SkillStream) -> types.AgentValue:
+        async for chunk in skill_stream:
+            await self._execute_task_method_async(
+                task, task_container.executable_on_chunk, task.on_chunk, {'value': chunk}
+            )
+        return skill_stream.result
+
+    async def _execute_dag_async(self, skill_dag: dag.SkillDag, value: types.AgentValue) -> types.AgentValue:
+        results = {}
+        branches = {}
+
+        async def execute_branch(name: str):
+            deps = skill_dag.dependencies[name]
+            if len(deps) > 0:
+                await asyncio.gather(*[branches[dep] for dep in deps])
+
+            skill_value, skill_results = skill_dag.get_arguments(name, value, results)
+            call = self._execute_dag_skill_async(skill_dag.skills[name], skill_value, skill_results)
+            timeout = skill_dag.branch_timeouts.get(name)
+            if timeout is None:
+                results[name] = await call
+                return
+            try:
+                results[name] = await asyncio.wait_for(call, timeout)
+            except asyncio.TimeoutError:
+                raise skill_dag.timeout_error(name) from None
+
+        # Skills are ordered topologically, so the dependencies are created before the skill
+        for _name in skill_dag.order:
+            branches[_name] = asyncio.ensure_future(execute_branch(_name))
+        try:
+            await branches[skill_dag.sink]
         finally:
-            # TODO: Is it necessary to process the completion separately?
-            pass
+            for branch in branches.values():
+                if not branch.done():
+                    branch.cancel()
+                elif not branch.cancelled():
+                    # Mark the exception as retrieved, it is raised by the final skill
+                    branch.exception()
+        return results[skill_dag.sink]
+
+    async def _execute_dag_skill_async(self, skill: ex.Executable, value: types.AgentValue,
+                                       results: dict | None) -> types.AgentValue:
+        if results is None:
+            return types.unwrap_completion(await self._execute_skill_async(skill, value))
+        with self._measure_skill(skill):
+            result = await ex.execute_executable_async(
+                skill, self.ctx.components, {'value': value, 'results': results}, pool=self._thread_pool
+            )
+        return types.unwrap_completion(result)
+
+    async def _handle_exception_async(self, error: BaseException):
+        for handler in self.ctx.get_exception_handler_containers(type(error)):
+            if handler.is_detached:
+                self._create_async_task(self._execute_exception_handler_async(handler.executable, error))
+            else:
+                await self._execute_exception_handler_async(handler.executable, error)
+
+    async def _execute_exception_handler_async(self, executable: ex.Executable, error: BaseException):
+        try:
+            await ex.execute_executable_async(
+                executable, self.ctx.components, {'exception': error}, pool=self._thread_pool
+            )
+        except BaseException as e:
+            _log.exception(f'Exception handler {executable.handler} failed: {e}')
+
+    async def _execute_skill_async(self, skill: ex.Executable, value: types.AgentValue) -> types.AgentValue:
+        cache = skill.options.cache
+        if cache is not None:
+            key = cache.key(value)
+            is_found, result = cache.get(key)
+            if is_found:
+                return result
+
+        with self._measure_skill(skill):
+            if skill.options.is_batch:
+                result = await self._skill_batchers[skill.name].process_async(value)
+            else:
+                result = await self._call_skill_async(skill, value)
+
+        if cache is not None:
+            cache.put(key, result)
+        return result
+
+    async def _call_skill_async(self, skill: ex.Executable,
+                                value: types.AgentValue | list) -> types.AgentValue | list:
+        if skill.options.executor == ex.__executor_process__:
+            return await asyncio.wrap_future(self._process_pool.call(skill, value))
+        return await ex.execute_executable_async(skill, self.ctx.components, {'value': value}, pool=self._thread_pool)
+
+    async def _execute_task_method_async(self, task: types.AgentTask, executable: ex.Executable | None, method,
+                                         additional_container: dict = None):
+        if executable is None:
+            return await ex.execute_executable_async(
+                ex.get_executable(method), self.ctx.components, additional_container, pool=self._thread_pool
+            )
+        return await ex.execute_executable_async(
+            executable, self.ctx.components, additional_container, instance=task, pool=self._thread_pool
+        )
 
     def halt(self):
         self.is_enabled = False
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=False)
+
+
+def is_stream_consumed(skills: tuple, index: int) -> bool:
+    """
+    Check that the stream of the skill is consumed by the next skill. Otherwise, the chunks of the stream
+    are passed to the task on_chunk method and the stream result is passed to the next skill
+    :param skills: Skill chain
+    :param index: Index of the streaming skill
+    :return:
+    """
+    return index + 1 < len(skills) and skills[index + 1].options.is_stream_consumer
+
+
+def _call_in_place(target, *args) -> futures.Future:
+    """
+    Call the target in the current thread
+    :return: Completed future of the call
+    """
+    future = futures.Future()
+    try:
+        future.set_result(target(*args))
+    except BaseException as e:
+        future.set_exception(e)
+    return future
+
+
+class _LoopWorkItem(ex.WorkItem):
+    """
+    Loop method call. If the call is dropped from the queue, the loop is released for the next tick
+    """
+
+    def __init__(self, target, loop: types.LoopContainer):
+        super().__init__(target, (loop,))
+        self.loop = loop
+
+    def drop(self):
+        self.loop.is_executing = False
+
+
+class _AsyncKeyLock:
+    """
+    Async lock by key. The lock is removed from the registry when it has no holders
+    """
+
+    def __init__(self, locks: dict, lock_key):
+        self.locks = locks
+        self.lock_key = lock_key
+
+    async def __aenter__(self):
+        lock, holders = self.locks.get(self.lock_key, (None, 0))
+        if lock is None:
+            lock = asyncio.Lock()
+        self.locks[self.lock_key] = (lock, holders + 1)
+        try:
+            await lock.acquire()
+        except BaseException:
+            self._release_holder()
+            raise
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self.locks[self.lock_key][0].release()
+        self._release_holder()
+
+    def _release_holder(self):
+        lock, holders = self.locks[self.lock_key]
+        if holders <= 1:
+            del self.locks[self.lock_key]
+        else:
+            self.locks[self.lock_key] = (lock, holders - 1)
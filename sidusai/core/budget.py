@@ -0,0 +1,141 @@
+__default_message_overhead_tokens__ = 4
+__default_keep_last_turns__ = 1
+
+# Key marking the message folded from the dropped messages
+__folded_key__ = 'folded'
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Local estimate of the number of tokens of the text: about 4 characters per token
+    for ASCII text and a token per character for other text
+    :param text:
+    :return:
+    """
+    ascii_count = len(text.encode('ascii', 'ignore'))
+    return (ascii_count + 3) // 4 + len(text) - ascii_count
+
+
+class TokenBudget:
+    """
+    Token budget policy of the chat.
+
+    The chat is trimmed before the request if the estimated tokens of its messages exceed the budget.
+    System messages and the most recent turns are kept, the older turns (a user message with the following
+    replies) are dropped from the oldest one until the chat fits the budget. If the fold function is set,
+    the dropped messages are replaced with the message returned by it, e.g. a short summary; the folded
+    message is passed to the fold function again together with the messages dropped next time.
+    If the kept messages alone (or with the new folded message) exceed the budget, the chat is left
+    over the budget.
+
+    Providers cache the prompt prefix of the requests, and every trim changes the prefix. With the block
+    size set, the chat is trimmed in blocks: the turns are dropped until the chat is a block below the budget,
+    so the prefix stays stable (and cached) while the next block of messages is appended.
+    """
+
+    def __init__(self, max_tokens: int, estimator=None, keep_last_turns: int = __default_keep_last_turns__,
+                 message_overhead_tokens: int = __default_message_overhead_tokens__, fold=None,
+                 block_tokens: int = 0):
+        """
+        :param max_tokens: Maximum number of tokens of the chat messages
+        :param estimator: Function estimating the number of tokens of the text, e.g. a local tokenizer.
+        The default estimator is estimate_tokens
+        :param keep_last_turns: Number of the most recent turns which are never dropped
+        :param message_overhead_tokens: Tokens of the message apart from its content (role, delimiters)
+        :param fold: Function accepting the list of dropped messages and returning the message
+        replacing them, or None to drop them
+        :param block_tokens: Tokens below the budget the chat is trimmed to. Zero trims the chat just
+        to the budget on every request over it
+        """
+        if max_tokens <= 0:
+            raise ValueError('Token budget must be greater than 0')
+        if keep_last_turns < 0:
+            raise ValueError('Number of kept turns can not be negative')
+        if not 0 <= block_tokens < max_tokens:
+            raise ValueError('Block size must be in [0, max_tokens)')
+
+        self.max_tokens = max_tokens
+        self.estimator = estimator if estimator is not None else estimate_tokens
+        self.keep_last_turns = keep_last_turns
+        self.message_overhead_tokens = message_overhead_tokens
+        self.fold = fold
+        self.block_tokens = block_tokens
+
+    def count_message(self, message: dict) -> int:
+        content = message.get('content')
+        return self.message_overhead_tokens + (self.estimator(content) if isinstance(content, str) else 0)
+
+    def trim(self, messages: list, tokens: list, total: int) -> int:
+        """
+        Trim the messages to the budget. The messages and their tokens are changed in place
+        :param messages: Chat messages
+        :param tokens: Estimated tokens by message
+        :param total: Total tokens of the messages
+        :return: Total tokens of the trimmed messages
+        """
+        if total <= self.max_tokens:
+            return total
+
+        end = self._find_kept_turns(messages)
+        target_tokens = self.max_tokens - self.block_tokens
+        dropped = []
+        index = 0
+        # Tokens reserved for the new folded message, estimated by the previous one
+        reserved = 0
+        is_folded = False
+        while index < end and (total + reserved > target_tokens or is_folded):
+            if is_kept_message(messages[index]):
+                index += 1
+                continue
+
+            # The previous folded message is folded again together with the next turn at least,
+            # so that the folding reduces the chat
+            is_folded = messages[index].get(__folded_key__, False)
+            if is_folded:
+                reserved = tokens[index]
+
+            # The turn: the message with the following replies
+            dropped.append(index)
+            total -= tokens[index]
+            index += 1
+            while index < end and messages[index].get('role') not in ['user', 'system']:
+                dropped.append(index)
+                total -= tokens[index]
+                index += 1
+
+        if len(dropped) == 0:
+            return total
+
+        folded_message = self.fold([messages[i] for i in dropped]) if self.fold is not None else None
+
+        dropped_indexes = set(dropped)
+        messages[:] = [m for i, m in enumerate(messages) if i not in dropped_indexes]
+        tokens[:] = [t for i, t in enumerate(tokens) if i not in dropped_indexes]
+
+        if folded_message is not None:
+            folded_message = dict(folded_message)
+            folded_message[__folded_key__] = True
+            folded_tokens = self.count_message(folded_message)
+            messages.insert(dropped[0], folded_message)
+            tokens.insert(dropped[0], folded_tokens)
+            total += folded_tokens
+        return total
+
+    def _find_kept_turns(self, messages: list) -> int:
+        # Index of the first message of the kept recent turns
+        index = len(messages)
+        turns = 0
+        while index > 0 and turns < self.keep_last_turns:
+            index -= 1
+            if messages[index].get('role') == 'user':
+                turns += 1
+        return index
+
+
+def is_kept_message(message: dict) -> bool:
+    """
+    System messages are never dropped, except for the folded messages
+    :param message:
+    :return:
+    """
+    return message.get('role') == 'system' and not message.get(__folded_key__, False)
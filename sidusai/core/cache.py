@@ -0,0 +1,341 @@
+import collections
+import copy
+import hashlib
+import os
+import sqlite3
+import threading as th
+import time
+import weakref
+
+from sidusai.core.types import AgentValue
+
+# Minimum interval between updates of the access time of the cached response
+__response_access_update_sec__ = 60
+
+
+def default_value_key(value: AgentValue):
+    """
+    Default cache key of the value. Values can define the cache_key() method, otherwise
+    the key is built from the type and public attributes of the value
+    :param value:
+    :return: Hashable key
+    """
+    cache_key = getattr(value, 'cache_key', None)
+    if callable(cache_key):
+        return type(value), cache_key()
+
+    attributes = sorted((k, v) for k, v in vars(value).items() if not k.startswith('_'))
+    return type(value), repr(attributes)
+
+
+class SkillCache:
+    """
+    Memoization cache of skill results with LRU eviction and time to live.
+
+    The cached result is returned instead of calling the skill, so the key must cover everything
+    the skill result depends on. Results are stored and returned as deep copies, so tasks
+    never share the cached value objects.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl_sec: float = None, key=None):
+        """
+        :param max_size: Maximum number of cached results
+        :param ttl_sec: Result time to live. None - results do not expire
+        :param key: Function building a hashable key from the value. Default is default_value_key
+        """
+        if max_size < 1:
+            raise ValueError('Cache size must be greater than 0')
+
+        self.max_size = max_size
+        self.ttl_sec = ttl_sec
+        self.key = key if key is not None else default_value_key
+
+        self._items = collections.OrderedDict()
+        self._lock = th.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key) -> tuple:
+        """
+        Get the cached result
+        :param key:
+        :return: Pair (is found, result)
+        """
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None and self.ttl_sec is not None and time.monotonic() - item[0] > self.ttl_sec:
+                del self._items[key]
+                item = None
+
+            if item is None:
+                self.misses += 1
+                return False, None
+
+            self._items.move_to_end(key)
+            self.hits += 1
+            result = item[1]
+
+        return True, copy.deepcopy(result)
+
+    def put(self, key, result):
+        result = copy.deepcopy(result)
+        with self._lock:
+            self._items[key] = (time.monotonic(), result)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    @property
+    def hit_ratio(self) -> float:
+        requests = self.hits + self.misses
+        return self.hits / requests if requests > 0 else 0.0
+
+    def stats(self) -> dict:
+        return {
+            'size': len(self._items),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_ratio': self.hit_ratio,
+        }
+
+    def __len__(self):
+        return len(self._items)
+
+
+class ResponseCache:
+    """
+    Persistent cache of LLM responses by request payload, stored in a SQLite database.
+
+    The database is opened in WAL mode, so the cache can be shared by the threads and processes of the host:
+    readers are not blocked by the writer, writes are serialized by SQLite. The size of the stored responses
+    is bounded, the least recently used responses are evicted. Responses expire after the time to live.
+    Clients cache only the responses of deterministic requests (e.g. with zero temperature).
+    """
+
+    def __init__(self, path: str, max_size_bytes: int = 256 * 1024 * 1024, ttl_sec: float = None,
+                 timeout_sec: float = 30):
+        """
+        :param path: Path of the database file
+        :param max_size_bytes: Maximum total size of the cached responses
+        :param ttl_sec: Response time to live. None - responses do not expire
+        :param timeout_sec: Maximum time of waiting for the database lock of another process
+        """
+        if max_size_bytes < 1:
+            raise ValueError('Cache size must be greater than 0')
+
+        self.path = path
+        self.max_size_bytes = max_size_bytes
+        self.ttl_sec = ttl_sec
+        self.timeout_sec = timeout_sec
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        # SQLite connections can not be shared by threads, each thread opens its own connection.
+        # The connection is closed when its thread ends, only the open connections are referenced here
+        self._local = th.local()
+        self._connections = weakref.WeakSet()
+        self._lock = th.Lock()
+
+        self._connect()
+
+    @staticmethod
+    def build_key(*parts: bytes | str) -> str:
+        """
+        Key of the request: SHA-256 of the canonical request parts, e.g. the url and the payload
+        :param parts:
+        :return:
+        """
+        digest = hashlib.sha256()
+        for part in parts:
+            digest.update(part.encode('utf-8') if isinstance(part, str) else part)
+            digest.update(b'\0')
+        return digest.hexdigest()
+
+    def get(self, key: str) -> bytes | None:
+        """
+        Get the cached response
+        :param key:
+        :return: Response body, None if not found or expired
+        """
+        connection = self._connect()
+        now = time.time()
+        row = connection.execute(
+            'SELECT body, created_at, accessed_at FROM responses WHERE key = ?', (key,)
+        ).fetchone()
+
+        if row is not None and self.ttl_sec is not None and now - row[1] > self.ttl_sec:
+            with connection:
+                connection.execute('BEGIN IMMEDIATE')
+                self._delete(connection, [key])
+            row = None
+
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+
+        if now - row[2] > __response_access_update_sec__:
+            with connection:
+                connection.execute('UPDATE responses SET accessed_at = ? WHERE key = ?', (now, key))
+        return row[0]
+
+    def put(self, key: str, body: bytes):
+        """
+        Store the response. The least recently used responses are evicted if the cache size is exceeded
+        :param key:
+        :param body: Response body
+        :return:
+        """
+        if len(body) > self.max_size_bytes:
+            return
+
+        connection = self._connect()
+        now = time.time()
+        with connection:
+            connection.execute('BEGIN IMMEDIATE')
+            self._delete(connection, [key])
+            connection.execute(
+                'INSERT INTO responses (key, body, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)',
+                (key, body, len(body), now, now)
+            )
+            size = self._change_size(connection, len(body))
+            if size > self.max_size_bytes:
+                self._evict(connection, size - self.max_size_bytes, now)
+
+    def clear(self):
+        connection = self._connect()
+        with connection:
+            connection.execute('BEGIN IMMEDIATE')
+            connection.execute('DELETE FROM responses')
+            connection.execute('UPDATE meta SET size = 0')
+
+    def close(self):
+        with self._lock:
+            holders = list(self._connections)
+            self._connections = weakref.WeakSet()
+        for holder in holders:
+            holder.close()
+        self._local = th.local()
+
+    @property
+    def size_bytes(self) -> int:
+        return self._connect().execute('SELECT size FROM meta').fetchone()[0]
+
+    @property
+    def hit_ratio(self) -> float:
+        requests = self.hits + self.misses
+        return self.hits / requests if requests > 0 else 0.0
+
+    def stats(self) -> dict:
+        connection = self._connect()
+        return {
+            'size': connection.execute('SELECT COUNT(*) FROM responses').fetchone()[0],
+            'size_bytes': self.size_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_ratio': self.hit_ratio,
+        }
+
+    def _connect(self) -> sqlite3.Connection:
+        holder = getattr(self._local, 'holder', None)
+        if holder is not None and holder.pid == os.getpid():
+            return holder.connection
+
+        # Connections are not inherited by forked processes
+        directory = os.path.dirname(self.path)
+        if directory != '' and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+
+        connection = sqlite3.connect(self.path, timeout=self.timeout_sec, isolation_level=None,
+                                     check_same_thread=False)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        with connection:
+            connection.execute('BEGIN IMMEDIATE')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS responses ('
+                'key TEXT PRIMARY KEY, body BLOB NOT NULL, size INTEGER NOT NULL, '
+                'created_at REAL NOT NULL, accessed_at REAL NOT NULL)'
+            )
+            connection.execute('CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)')
+            connection.execute('CREATE TABLE IF NOT EXISTS meta (size INTEGER NOT NULL)')
+            if connection.execute('SELECT COUNT(*) FROM meta').fetchone()[0] == 0:
+                connection.execute('INSERT INTO meta (size) VALUES (0)')
+
+        holder = _ThreadConnection(connection)
+        self._local.holder = holder
+        with self._lock:
+            self._connections.add(holder)
+        return connection
+
+    def _delete(self, connection: sqlite3.Connection, keys: list):
+        size = 0
+        for key in keys:
+            row = connection.execute('SELECT size FROM responses WHERE key = ?', (key,)).fetchone()
+            if row is not None:
+                connection.execute('DELETE FROM responses WHERE key = ?', (key,))
+                size += row[0]
+        if size > 0:
+            self._change_size(connection, -size)
+
+    def _change_size(self, connection: sqlite3.Connection, delta: int) -> int:
+        if delta != 0:
+            connection.execute('UPDATE meta SET size = size + ?', (delta,))
+        return connection.execute('SELECT size FROM meta').fetchone()[0]
+
+    def _evict(self, connection: sqlite3.Connection, excess_bytes: int, now: float):
+        # Expired responses are evicted first
+        if self.ttl_sec is not None:
+            rows = connection.execute(
+                'SELECT key FROM responses WHERE created_at < ?', (now - self.ttl_sec,)
+            ).fetchall()
+            self._delete(connection, [row[0] for row in rows])
+            excess_bytes = self._change_size(connection, 0) - self.max_size_bytes
+
+        keys = []
+        rows = connection.execute('SELECT key, size FROM responses ORDER BY accessed_at')
+        for key, size in rows:
+            if excess_bytes <= 0:
+                break
+            keys.append(key)
+            excess_bytes -= size
+        rows.close()
+
+        self._delete(connection, keys)
+        with self._lock:
+            self.evictions += len(keys)
+
+
+class _ThreadConnection:
+    """
+    Connection of a thread, referenced only by the thread local storage. When the thread ends,
+    the holder is released and the connection is closed
+    """
+
+    __slots__ = ('connection', 'pid', '_finalizer', '__weakref__')
+
+    def __init__(self, connection: sqlite3.Connection):
+        self.connection = connection
+        self.pid = os.getpid()
+        self._finalizer = weakref.finalize(self, _close_connection, connection, self.pid)
+
+    def close(self):
+        self._finalizer()
+
+
+def _close_connection(connection: sqlite3.Connection, pid: int):
+    # Connections inherited by a forked process are left to the parent process
+    if os.getpid() == pid:
+        connection.close()
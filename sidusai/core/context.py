@@ -1,9 +1,12 @@
 import inspect
 
+import sidusai.core.dag as dag
 import sidusai.core.execute as ex
 import sidusai.core.graph as graph
 import sidusai.core.types as types
 
+from sidusai.core.cache import SkillCache
+
 
 class AgentContext:
     """
@@ -49,6 +52,9 @@ class AgentContext:
         # This way, heavy operations will be generated and cached in advance.
         self.tasks = {}
 
+        # Registered tasks by name and by type
+        self._task_index = {}
+
         # Reproducible Methods Registry Cache
         # The application's main loop runs methods on a schedule,
         # allowing events to be generated within the context.
@@ -56,6 +62,10 @@ class AgentContext:
 
         self.exception_handlers = []
 
+        # Exception handlers by exception type, ordered by handler order.
+        # Filled lazily and reset when a handler is added
+        self._exception_dispatch = {}
+
     def get_skill_by_handler(self, handler) -> ex.Executable | None:
         for name, skill in self.skills.items():
             if skill.handler == handler:
@@ -63,24 +73,38 @@ class AgentContext:
         return None
 
     def get_task_container(self, task_type: str | type) -> types.TaskContainer:
-        _task = None
-        for _name, _container in self.tasks.items():
-            if _name == task_type or _container.task_type == task_type:
-                _task = _container
-                break
-        return _task
+        return self._task_index.get(task_type)
+
+    def get_task_skills(self, task_container: types.TaskContainer) -> tuple:
+        """
+        Get the skill chain of the task. The chain is resolved at build and
+        is resolved again only after the route of the task skill graph is changed
+        :param task_container:
+        :return: Tuple of skill executables
+        """
+        graph_version, skill_names = task_container.skill_graph.get_route()
+        skills_version, skills = task_container.skill_chain
+        if skills_version != graph_version:
+            skills = tuple(self.find_executable_skills(skill_names))
+            task_container.skill_chain = (graph_version, skills)
+        return skills
 
     def get_exception_handlers(self, error_type: type) -> list:
-        res = []
-        for err in self.exception_handlers:
-            if len(err.error_types) == 0 or error_type in err.error_types:
-                res.append(err.executable)
-                continue
+        return [c.executable for c in self.get_exception_handler_containers(error_type)]
 
-            for _err_type in err.error_types:
-                if issubclass(error_type, _err_type):
-                    res.append(err.executable)
-        return res
+    def get_exception_handler_containers(self, error_type: type) -> tuple:
+        """
+        Get exception handlers for the exception type from the dispatch table. Each handler is included once,
+        handlers are ordered by their order
+        :param error_type:
+        :return: Tuple of exception handler containers
+        """
+        dispatch = self._exception_dispatch
+        handlers = dispatch.get(error_type)
+        if handlers is None:
+            handlers = build_exception_dispatch(self.exception_handlers, error_type)
+            dispatch[error_type] = handlers
+        return handlers
 
     def build_task(self, task_type: str | type):
         _task = self.get_task_container(task_type)
@@ -113,16 +137,32 @@ class AgentContext:
 
         self.components_builders.put(executable, key=_name)
 
-    def add_agent_skill(self, skill, skill_name: str = None) -> ex.Executable:
+    def add_agent_skill(self, skill, skill_name: str = None, executor: str = 'thread',
+                        batch_max_size: int = 16, batch_max_wait_sec: float = 0.01,
+                        cache: SkillCache = None) -> ex.Executable:
         """
         Method for adding a skill to the agent context.
         All agent skills will be initialized after the components are initialized.
         Components can be injected either into the class constructor or into the method parameters.
         :param skill: Function/Method/Class
         :param skill_name: User's skill name
+        :param executor: 'thread' or 'process'. Process skills are executed in the process pool,
+        the skill must be picklable (e.g. module level function or class)
+        :param batch_max_size: Maximum batch size for skills accepting a list of values
+        :param batch_max_wait_sec: Maximum wait time for filling the batch
+        :param cache: Memoization cache of skill results
         :return:
         """
         executable = ex.Executable(skill, name=skill_name)
+        executable.options = ex.SkillOptions(
+            skill,
+            executor=executor,
+            is_batch=ex.is_batch_executable(executable),
+            batch_max_size=batch_max_size,
+            batch_max_wait_sec=batch_max_wait_sec,
+            cache=cache,
+            is_stream_consumer=ex.is_stream_consumer_executable(executable)
+        )
 
         if executable.name in self.skills.keys():
             raise ValueError(
@@ -133,12 +173,15 @@ class AgentContext:
         self.skills[executable.name] = executable
         return executable
 
-    def add_task_class(self, handler, task_name: str, available_skills_names: [str]):
+    def add_task_class(self, handler, task_name: str, available_skills_names: [str],
+                       skill_dag: dict = None, branch_timeouts: dict = None):
         """
         Register a task by configuring the task solution graph
         :param available_skills_names:
         :param handler:
         :param task_name:
+        :param skill_dag: Dependencies of the skills by skill name. Used instead of available_skills_names
+        :param branch_timeouts: Maximum execution time of the skill DAG skills by skill name, seconds
         :return:
         """
         if not inspect.isclass(handler) or not issubclass(handler, types.AgentTask):
@@ -149,10 +192,22 @@ class AgentContext:
         if name in self.tasks.keys():
             raise ValueError(f'Task {name} already exists')
 
+        if skill_dag is not None:
+            if available_skills_names is not None:
+                raise ValueError(f'Task {name} must have either skill names or skill DAG')
+            if len(skill_dag) == 0:
+                raise ValueError(f'Task {name} have not skills')
+            available_skills_names = list(dag.SkillDag(skill_dag, branch_timeouts).order)
+        elif branch_timeouts is not None:
+            raise ValueError(f'Branch timeouts of task {name} require skill DAG')
+
         if available_skills_names is None or len(available_skills_names) == 0:
             raise ValueError(f'Task {name} have not skills')
 
-        self.tasks[name] = types.TaskContainer(handler, task_name, available_skills_names)
+        task_container = types.TaskContainer(handler, task_name, available_skills_names, skill_dag, branch_timeouts)
+        self.tasks[name] = task_container
+        self._task_index[name] = task_container
+        self._task_index.setdefault(handler, task_container)
 
     def add_post_processor(self, handler, order: int = 0):
         """
@@ -197,13 +252,39 @@ class AgentContext:
         container = types.LoopContainer(executable, fixed_interval_sec)
         self.loops.append(container)
 
-    def add_exception_handler(self, handler, error_types: list = None, order: int = 0):
+    def add_exception_handler(self, handler, error_types: list = None, order: int = 0, is_detached: bool = False):
+        """
+        Wrap and add to context exception handler
+        :param handler:
+        :param error_types: Handled exception types (including subclasses). Empty - all exceptions
+        :param order:
+        :param is_detached: Execute the handler in the thread pool instead of the failed task worker
+        :return:
+        """
         if not callable(handler):
             raise ValueError(f'Exception handler {handler} mast be callable')
 
         executable = ex.Executable(handler, order)
-        container = types.ExceptionHandlerContainer(executable, error_types)
-        self.exception_handlers.append(container)
+        container = types.ExceptionHandlerContainer(executable, error_types, is_detached)
+
+        # Handlers are replaced as a whole, so the running tasks can read them without locks
+        handlers = list(self.exception_handlers) + [container]
+        sort_executables_by_order(handlers)
+        self.exception_handlers = handlers
+        self._exception_dispatch = {}
+
+    def freeze_exception_handlers(self):
+        """
+        Build the dispatch table for all declared exception types. Other types are added lazily
+        :return:
+        """
+        self.exception_handlers = tuple(self.exception_handlers)
+        dispatch = {}
+        for container in self.exception_handlers:
+            for error_type in container.error_types:
+                if error_type not in dispatch:
+                    dispatch[error_type] = build_exception_dispatch(self.exception_handlers, error_type)
+        self._exception_dispatch = dispatch
 
 
 #############################################################
@@ -267,7 +348,12 @@ def build_skills(context: AgentContext):
                 f'Specify in it additional arguments that should be injected from the context'
             )
 
-        context.skills[skill_name] = ex.Executable(handler)
+        executable = ex.Executable(handler, order=skill_class.order, name=skill_class.name)
+        executable.options = skill_class.options
+        # The value parameter of the class skill is declared in __call__ method
+        executable.options.is_batch = ex.is_batch_executable(executable)
+        executable.options.is_stream_consumer = ex.is_stream_consumer_executable(executable)
+        context.skills[skill_name] = executable
 
 
 def validate_skills(context: AgentContext):
@@ -285,7 +371,11 @@ def validate_skills(context: AgentContext):
                 f'The data type must be inherited from the base data class sai.AgentValue'
             )
 
-        parameters = [k for k, v in skill.parameters.items() if issubclass(v, types.AgentValue)]
+        parameters = [
+            k for k, v in skill.parameters.items()
+            if (inspect.isclass(v) and issubclass(v, types.AgentValue))
+            or ex.get_batch_item_type(v) is not None or ex.get_stream_item_type(v) is not None
+        ]
         if len(parameters) != 1:
             raise SyntaxError(
                 f'The agent\'s skill works on the principle of transforming objects. '
@@ -293,6 +383,13 @@ def validate_skills(context: AgentContext):
                 f'accept the object inherited from sai.AgentValue in a single copy.'
             )
 
+        if skill.is_generator or skill.options.is_stream_consumer:
+            if skill.options.is_batch or skill.options.cache is not None \
+                    or skill.options.executor != ex.__executor_thread__:
+                raise SyntaxError(
+                    f'Skill {skill_name} produces or consumes a stream and can not be a batch, cached or process skill'
+                )
+
     # skill is correct and can be use
 
 
@@ -306,7 +403,60 @@ def build_tasks(context: AgentContext):
         if not isinstance(task_container, types.TaskContainer):
             raise SyntaxError('Unexpected data type for task wrapper')
         task_container.executable_init = ex.Executable(task_container.task_type)
+        task_container.executable_forward = build_task_method(task_container.task_type, 'forward')
+        task_container.executable_on_complete = build_task_method(task_container.task_type, 'on_complete')
+        task_container.executable_on_chunk = build_task_method(task_container.task_type, 'on_chunk')
+        if task_container.skill_dag is not None:
+            task_container.dag = dag.SkillDag(task_container.skill_dag, task_container.branch_timeouts)
+            task_container.dag.build(context.skills)
+            continue
+
         task_container.skill_graph = build_skill_graph(task_container, context)
+        context.get_task_skills(task_container)
+
+
+def build_task_method(task_type: type, method_name: str) -> ex.Executable | None:
+    """
+    Wrap the task method defined in the class. The executable is created once for the task type
+    and is called with the task object as the first argument.
+    :param task_type:
+    :param method_name:
+    :return: Executable or None if the method is not a plain function (e.g. static method)
+    """
+    method = inspect.getattr_static(task_type, method_name, None)
+    if not inspect.isfunction(method):
+        return None
+    return ex.Executable(method)
+
+
+def compile_executables(context: AgentContext):
+    """
+    Compile call plans of all context executables. Called at the end of the build,
+    after all components are created and configured.
+    :param context:
+    :return:
+    """
+    for skill in context.skills.values():
+        skill.compile(context.components, ('value',))
+
+    for loop in context.loops:
+        loop.executable.compile(context.components)
+
+    for handler in context.exception_handlers:
+        handler.executable.compile(context.components, ('exception',))
+
+    for task_container in context.tasks.values():
+        task_container.executable_init.compile(context.components)
+        if task_container.executable_forward is not None:
+            task_container.executable_forward.compile(context.components)
+        if task_container.executable_on_complete is not None:
+            task_container.executable_on_complete.compile(context.components, ('value',))
+        if task_container.executable_on_chunk is not None:
+            task_container.executable_on_chunk.compile(context.components, ('value',))
+        if task_container.dag is not None:
+            for name, skill in task_container.dag.skills.items():
+                if task_container.dag.is_merge(name):
+                    skill.compile(context.components, ('value', 'results'))
 
 
 def build_skill_graph(task_container: types.TaskContainer, context: AgentContext) -> graph.AgentSkillGraph:
@@ -320,6 +470,20 @@ def build_skill_graph(task_container: types.TaskContainer, context: AgentContext
     return graph.AgentSkillGraph(full_skill_names, task_container.available_skill_names)
 
 
+def build_exception_dispatch(handlers, error_type: type) -> tuple:
+    """
+    Select exception handlers for the exception type using its MRO
+    :param handlers: Exception handler containers ordered by order
+    :param error_type:
+    :return: Tuple of handler containers
+    """
+    mro = set(error_type.__mro__) if isinstance(error_type, type) else {error_type}
+    return tuple(
+        c for c in handlers
+        if len(c.error_types) == 0 or any(t in mro for t in c.error_types)
+    )
+
+
 def sort_executables_by_order(executables: list):
     """
     Sorting running objects by order key
@@ -0,0 +1,112 @@
+import copy
+import graphlib
+
+import sidusai.core.execute as ex
+
+
+class SkillDag:
+    """
+    Directed acyclic graph of the task skills.
+
+    Each skill receives the result of its dependency as the value. Skills without dependencies receive
+    the task value. A merge skill (a skill with several dependencies) receives the result of its first
+    dependency as the value and the results of all dependencies by skill name as the results parameter,
+    e.g. def merge(value: ChatAgentValue, results: dict) -> ChatAgentValue. A value consumed by several
+    skills is deep copied for each of them, so concurrent branches never share value objects.
+    The DAG must have a single final skill, its result is the task result.
+    """
+
+    def __init__(self, skill_dag: dict, branch_timeouts: dict = None):
+        """
+        :param skill_dag: Dependencies by skill name, e.g. {'merge': ['moderation', 'retrieval']}.
+        Dependencies not listed as keys are skills without dependencies
+        :param branch_timeouts: Maximum execution time of skills by skill name, seconds
+        """
+        self.dependencies = {name: tuple(deps) for name, deps in skill_dag.items()}
+        for deps in list(self.dependencies.values()):
+            for dep in deps:
+                self.dependencies.setdefault(dep, ())
+
+        try:
+            self.order = tuple(graphlib.TopologicalSorter(self.dependencies).static_order())
+        except graphlib.CycleError as e:
+            raise ValueError(f'Skill DAG contains a cycle {e.args[1]}')
+
+        self.dependents = {name: [] for name in self.order}
+        for name, deps in self.dependencies.items():
+            for dep in deps:
+                self.dependents[dep].append(name)
+
+        sinks = [name for name in self.order if len(self.dependents[name]) == 0]
+        if len(sinks) != 1:
+            raise ValueError(f'Skill DAG must have a single final skill, found {sinks}')
+        self.sink = sinks[0]
+        self.roots = [name for name in self.order if len(self.dependencies[name]) == 0]
+
+        self.branch_timeouts = dict(branch_timeouts) if branch_timeouts is not None else {}
+        unknown_names = [name for name in self.branch_timeouts if name not in self.dependencies]
+        if len(unknown_names) > 0:
+            raise ValueError(f'Skills {unknown_names} of branch timeouts are not found in the skill DAG')
+
+        # Skill executables by name. Resolved at build
+        self.skills = {}
+
+    def build(self, skills: dict):
+        """
+        Resolve the skill executables
+        :param skills: Registered skills by name
+        :return:
+        """
+        unknown_names = [name for name in self.order if name not in skills]
+        if len(unknown_names) > 0:
+            raise ValueError(f'Skills {unknown_names} are not registered in the agent context')
+
+        for name in self.order:
+            skill = skills[name]
+            if skill.is_generator or skill.options.is_stream_consumer:
+                raise SyntaxError(f'Skill {name} produces or consumes a stream and can not be used in the skill DAG')
+            if self.is_merge(name) and (
+                    skill.options.is_batch or skill.options.cache is not None or
+                    skill.options.executor != ex.__executor_thread__
+            ):
+                raise SyntaxError(
+                    f'Skill {name} merges the results of several skills and can not be a batch, '
+                    f'cached or process skill'
+                )
+        self.skills = {name: skills[name] for name in self.order}
+
+    def is_merge(self, name: str) -> bool:
+        return len(self.dependencies[name]) > 1
+
+    def is_timed_out(self, name: str, elapsed_sec: float) -> bool:
+        timeout = self.branch_timeouts.get(name)
+        return timeout is not None and elapsed_sec > timeout
+
+    def timeout_error(self, name: str) -> TimeoutError:
+        return TimeoutError(f'Skill {name} is not finished in {self.branch_timeouts[name]} sec')
+
+    def new_sorter(self) -> graphlib.TopologicalSorter:
+        sorter = graphlib.TopologicalSorter(self.dependencies)
+        sorter.prepare()
+        return sorter
+
+    def get_arguments(self, name: str, value, results: dict) -> tuple:
+        """
+        Get the arguments of the skill
+        :param name: Skill name
+        :param value: Task value
+        :param results: Results of the executed skills by name
+        :return: Pair (value, results of dependencies). Results are None for not merge skills
+        """
+        deps = self.dependencies[name]
+        if len(deps) == 0:
+            return (copy.deepcopy(value) if len(self.roots) > 1 else value), None
+
+        dep_results = {dep: self._take_result(dep, results) for dep in deps}
+        if len(deps) == 1:
+            return dep_results[deps[0]], None
+        return dep_results[deps[0]], dep_results
+
+    def _take_result(self, name: str, results: dict):
+        result = results[name]
+        return copy.deepcopy(result) if len(self.dependents[name]) > 1 else result
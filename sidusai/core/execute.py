@@ -1,13 +1,57 @@
+import asyncio
+import collections
+import collections.abc
+import concurrent.futures as futures
+import contextvars
+import copy
+import functools
 import inspect
+import logging
+import sys
 import threading as th
+import time
+import typing
 
 from typing import Hashable
 
-from sidusai.core.types import NamedTypedContainer
+from sidusai.core.cache import SkillCache
+from sidusai.core.types import NamedTypedContainer, AgentValue
 from sidusai.core.utils import camel_to_snake
 
 __return__ = 'return'
 
+# Keys of the per-call (additional) container and the base types of the parameters they are bound to.
+# A parameter receives the per-call object if it has the same name as the key or if its annotation
+# is inherited from the base type of the key.
+__runtime_slots__ = {
+    'value': AgentValue,
+    'exception': BaseException,
+    'results': dict,
+}
+
+__executable_cache_size__ = 1024
+
+# Skill executors
+__executor_thread__ = 'thread'
+__executor_process__ = 'process'
+__executors__ = [__executor_thread__, __executor_process__]
+
+# Thread pool queue overflow policies
+__overflow_block__ = 'block'
+__overflow_reject__ = 'reject'
+__overflow_drop_oldest__ = 'drop_oldest'
+__overflow_policies__ = [__overflow_block__, __overflow_reject__, __overflow_drop_oldest__]
+
+# Annotations of the stream parameter, e.g. value: Iterator[ChatAgentValue]
+__sync_stream_types__ = (
+    collections.abc.Iterator, collections.abc.Iterable, collections.abc.Generator,
+)
+__async_stream_types__ = (
+    collections.abc.AsyncIterator, collections.abc.AsyncIterable, collections.abc.AsyncGenerator,
+)
+
+_log = logging.getLogger(__name__)
+
 
 def build_handler_name(handler):
     """
@@ -54,12 +98,119 @@ class Executable(Hashable):
                 if __return__ in _params and _params[__return__] is not None else None
 
         self.parameters = {k: v for k, v in _params.items() if k != __return__}
+        self.is_coroutine = is_coroutine_handler(handler)
+        self.is_generator = is_generator_handler(handler)
         self.default_name = build_handler_name(handler)
         self.order = order
         self.name = name if name is not None else self.default_name
 
+        # Compiled call plans by the keys of the per-call container
+        self._plans = {}
+
+    def compile(self, container: NamedTypedContainer, keys: tuple = ()):
+        """
+        Compile a call plan of the executable object for the container.
+        The plan stores the container objects for each parameter and the parameters
+        that receive per-call objects by key (e.g. 'value' or 'exception')
+        :param container: Container with components
+        :param keys: Keys of the per-call container
+        :return: Call plan
+        """
+        plan = CallPlan(self, container, keys)
+        self._plans[keys] = plan
+        return plan
+
+    def get_plan(self, container: NamedTypedContainer, keys: tuple = ()):
+        """
+        Get the compiled call plan. The plan is recompiled if the container has been changed since compilation
+        :param container:
+        :param keys:
+        :return:
+        """
+        plan = self._plans.get(keys)
+        if plan is None or not plan.is_actual(container):
+            plan = self.compile(container, keys)
+        return plan
+
     def __hash__(self):
-        return hash(self)
+        return id(self)
+
+
+class SkillOptions:
+    """
+    Execution options of a registered skill. Options are shared between the registered skill
+    and the skill object built from it.
+    """
+
+    def __init__(self, handler, executor: str = __executor_thread__, is_batch: bool = False,
+                 batch_max_size: int = 16, batch_max_wait_sec: float = 0.01, cache: SkillCache = None,
+                 is_stream_consumer: bool = False):
+        if executor not in __executors__:
+            raise ValueError(f'Unknown skill executor {executor}. Use one of {__executors__}')
+
+        if batch_max_size < 1:
+            raise ValueError('Batch size must be greater than 0')
+
+        # Registered handler (function or class). Used to rebuild the skill in worker processes
+        self.handler = handler
+        self.executor = executor
+
+        # Batch skills accept a list of values and return a list of transformed values in the same order
+        self.is_batch = is_batch
+        self.batch_max_size = batch_max_size
+        self.batch_max_wait_sec = batch_max_wait_sec
+
+        # Memoization cache of skill results
+        self.cache = cache
+
+        # Stream consumers accept an iterator of values (chunks of the previous streaming skill)
+        self.is_stream_consumer = is_stream_consumer
+
+
+class CallPlan:
+    """
+    Precompiled arguments of an executable object. Parameters from the container are resolved
+    once at compilation, so the call is reduced to a plain keyword call.
+    """
+
+    def __init__(self, executable: Executable, container: NamedTypedContainer, keys: tuple = ()):
+        self.container = container
+        self.version = container.version
+        self.arguments = {}
+        self.slots = []
+
+        for k, v in executable.parameters.items():
+            key = find_runtime_slot(k, v, keys)
+            if key is not None:
+                self.slots.append((k, key))
+            elif v == any:
+                self.arguments[k] = container[k] if k in container else None
+            else:
+                self.arguments[k] = container[v] if v in container else None
+
+        self.slots = tuple(self.slots)
+
+    def is_actual(self, container: NamedTypedContainer):
+        return self.container is container and self.version == container.version
+
+    def call(self, handler, additional_container: dict = None, instance=None):
+        """
+        Call the handler with compiled arguments
+        :param handler: Executable handler
+        :param additional_container: Per-call objects
+        :param instance: Object for unbound methods
+        :return:
+        """
+        if len(self.slots) == 0:
+            kwargs = self.arguments
+        else:
+            kwargs = self.arguments.copy()
+            for name, key in self.slots:
+                kwargs[name] = additional_container[key]
+
+        if instance is not None:
+            return handler(instance, **kwargs)
+        return handler(**kwargs)
 
 
 class ExecutableContainer(NamedTypedContainer):
@@ -74,68 +225,752 @@ class ExecutableContainer(NamedTypedContainer):
         raise TypeError('This container must be contains only Executable objects')
 
 
+class TaskRejectedError(RuntimeError):
+    """
+    The pool queue is full and the overflow policy does not allow waiting
+    """
+    pass
+
+
+class WorkItem:
+    """
+    A queued call of the thread pool
+    """
+
+    def __init__(self, target, args: tuple = (), lock_key: Hashable = None):
+        self.target = target
+        self.args = args
+        self.lock_key = lock_key
+
+    def run(self):
+        self.target(*self.args)
+
+    def drop(self):
+        """
+        Called when the item is removed from the queue without execution
+        """
+        pass
+
+
+class TaskFuture(futures.Future):
+    """
+    Result handle of the task executed by the agent. The result is the task value after all skills.
+    If the task fails, the exception is raised from result() after the exception handlers are called.
+    The task can be cancelled while it is waiting in the queue.
+    """
+
+    def __init__(self, task=None):
+        super().__init__()
+        self.task = task
+
+
+class FutureWorkItem(WorkItem):
+    """
+    A queued call that passes its result or exception to the future
+    """
+
+    def __init__(self, target, args: tuple = (), lock_key: Hashable = None, future: futures.Future = None):
+        super().__init__(target, args, lock_key)
+        self.future = future if future is not None else futures.Future()
+
+    def run(self):
+        if not self.future.set_running_or_notify_cancel():
+            return
+
+        try:
+            result = self.target(*self.args)
+        except BaseException as e:
+            self.future.set_exception(e)
+        else:
+            self.future.set_result(result)
+
+    def drop(self):
+        self.future.cancel()
+
+
+class SkillBatch:
+    """
+    Values collected for one call of a batch skill
+    """
+
+    def __init__(self):
+        self.values = []
+        self.futures = []
+        self.is_closed = False
+
+        # Event of the filled batch in the async runtime
+        self.filled = None
+
+
+class SkillBatcher:
+    """
+    Collects values from simultaneously executed tasks into micro-batches for a batch skill.
+
+    The first task of a batch waits until the batch is full or the max wait time expires, and then executes
+    the skill for the whole batch. Other tasks wait for their results. The batch size is therefore also
+    limited by the number of tasks executed simultaneously.
+    """
+
+    def __init__(self, execute, execute_async, max_size: int = 16, max_wait_sec: float = 0.01):
+        """
+        :param execute: Callable executing the skill for a list of values
+        :param execute_async: Coroutine function executing the skill for a list of values
+        :param max_size: Maximum batch size
+        :param max_wait_sec: Maximum wait time for filling the batch
+        """
+        self._execute = execute
+        self._execute_async = execute_async
+        self._max_size = max_size
+        self._max_wait_sec = max_wait_sec
+
+        self._lock = th.Lock()
+        self._filled = th.Condition(self._lock)
+        self._batch = None
+        self._batch_async = None
+
+    def process(self, value: AgentValue) -> AgentValue:
+        """
+        Add the value to the batch and wait for the result
+        :param value:
+        :return: Transformed value
+        """
+        with self._lock:
+            batch, future, is_leader = self._add(value, self._batch)
+            self._batch = None if batch.is_closed else batch
+            if batch.is_closed:
+                self._filled.notify_all()
+
+        if is_leader:
+            with self._lock:
+                deadline = time.monotonic() + self._max_wait_sec
+                while not batch.is_closed and (remaining := deadline - time.monotonic()) > 0:
+                    self._filled.wait(remaining)
+                batch.is_closed = True
+                if self._batch is batch:
+                    self._batch = None
+
+            try:
+                results = self._execute(batch.values)
+            except BaseException as e:
+                self._set_exception(batch, e)
+            else:
+                self._set_results(batch, results)
+
+        return future.result()
+
+    async def process_async(self, value: AgentValue) -> AgentValue:
+        """
+        Add the value to the batch in the event loop and wait for the result
+        :param value:
+        :return: Transformed value
+        """
+        batch, future, is_leader = self._add(value, self._batch_async)
+        self._batch_async = None if batch.is_closed else batch
+        if batch.is_closed and batch.filled is not None:
+            batch.filled.set()
+
+        if is_leader:
+            batch.filled = asyncio.Event()
+            if not batch.is_closed:
+                try:
+                    await asyncio.wait_for(batch.filled.wait(), self._max_wait_sec)
+                except asyncio.TimeoutError:
+                    pass
+            batch.is_closed = True
+            if self._batch_async is batch:
+                self._batch_async = None
+
+            try:
+                results = await self._execute_async(batch.values)
+            except BaseException as e:
+                self._set_exception(batch, e)
+            else:
+                self._set_results(batch, results)
+
+        return await asyncio.wrap_future(future)
+
+    def _add(self, value: AgentValue, batch: SkillBatch | None):
+        is_leader = batch is None
+        if is_leader:
+            batch = SkillBatch()
+
+        future = futures.Future()
+        batch.values.append(value)
+        batch.futures.append(future)
+        if len(batch.values) >= self._max_size:
+            batch.is_closed = True
+        return batch, future, is_leader
+
+    @staticmethod
+    def _set_results(batch: SkillBatch, results):
+        if not isinstance(results, list) or len(results) != len(batch.values):
+            SkillBatcher._set_exception(batch, ValueError(
+                f'Batch skill must return a list of {len(batch.values)} values in the order of the input values'
+            ))
+            return
+
+        for future, result in zip(batch.futures, results):
+            future.set_result(result)
+
+    @staticmethod
+    def _set_exception(batch: SkillBatch, error: BaseException):
+        for future in batch.futures:
+            future.set_exception(error)
+
+
 class ThreadPool:
     """
     An auxiliary wrapper used to manage threads in an application.
 
-    todo: Add batches and locks
+    The pool runs calls on a fixed maximum number of worker threads. Workers are started on demand
+    and stopped after being idle for keep_alive_sec. Calls are queued in a bounded queue, and
+    the overflow policy determines the behavior when the queue is full:
+        - block: the caller waits for free space (calls from pool workers are executed in place)
+        - reject: TaskRejectedError is raised
+        - drop_oldest: the oldest queued call is dropped
+
+    Calls with the same lock key are executed one after another in the order of submission.
+    Calls waiting for their lock key stay in the queue bound.
     """
 
-    def __init__(self, pool_max_size: int = 16):
+    def __init__(self, pool_max_size: int = 16, queue_max_size: int = 1024,
+                 overflow_policy: str = __overflow_block__, keep_alive_sec: float = 5.0):
+        if pool_max_size < 1:
+            raise ValueError('Pool size must be greater than 0')
+
+        if overflow_policy not in __overflow_policies__:
+            raise ValueError(f'Unknown overflow policy {overflow_policy}. Use one of {__overflow_policies__}')
+
         self._pool_max_size = pool_max_size
+        self._queue_max_size = queue_max_size
+        self._overflow_policy = overflow_policy
+        self._keep_alive_sec = keep_alive_sec
+
+        self._queue = collections.deque()
+        self._lock = th.Lock()
+        self._not_empty = th.Condition(self._lock)
+        self._not_full = th.Condition(self._lock)
+        self._released = th.Condition(self._lock)
+        self._local = th.local()
+
+        self._workers = 0
+        self._idle_workers = 0
+        self._active_workers = 0
+        self._is_shutdown = False
+
+        # Calls waiting for the release of their lock key
+        self._locked_keys = {}
+        # Number of the calls waiting for the lock key, they take the queue space
+        self._parked_size = 0
+
+    #################################################################
+    # Gauges
+    #################################################################
+
+    @property
+    def pool_max_size(self) -> int:
+        return self._pool_max_size
+
+    @property
+    def queue_depth(self) -> int:
+        """
+        :return: Number of calls waiting for execution, including calls waiting for the lock key
+        """
+        with self._lock:
+            return len(self._queue) + self._parked_size
+
+    @property
+    def active_workers(self) -> int:
+        """
+        :return: Number of workers executing calls
+        """
+        return self._active_workers
+
+    @property
+    def worker_count(self) -> int:
+        """
+        :return: Number of started workers
+        """
+        return self._workers
+
+    #################################################################
+    # Execution
+    #################################################################
+
+    def execute(self, target=None, args=(), lock_key: Hashable = None):
+        """
+        Queue a call to execute on a pool worker
+        :param target: Callable
+        :param args: Callable arguments
+        :param lock_key: Calls with the same key are not executed simultaneously
+        :return:
+        """
+        self.submit(WorkItem(target, args, lock_key))
+
+    def execute_batch(self, target=None, args_list: list = (), lock_key: Hashable = None):
+        """
+        Queue several calls of the target at once. With the reject policy, the batch
+        is accepted only if it fits into the queue entirely.
+        :param target: Callable
+        :param args_list: List of arguments for each call
+        :param lock_key: Calls with the same key are not executed simultaneously
+        :return:
+        """
+        self.submit_batch([WorkItem(target, args, lock_key) for args in args_list])
+
+    def submit(self, item: WorkItem):
+        self.submit_batch([item])
+
+    def submit_batch(self, items: list, block: bool = True) -> bool:
+        """
+        Queue the items
+        :param items: Work items
+        :param block: Apply the overflow policy when the queue is full. If False, the batch is not queued
+        when it does not fit into the queue, whatever the policy: nothing is waited for, dropped or rejected
+        :return: True if the batch is queued
+        """
+        in_place = []
+        with self._lock:
+            if self._is_shutdown:
+                raise RuntimeError('Thread pool is shut down')
+
+            if not block and not self._fits(len(items)):
+                return False
+
+            if self._overflow_policy == __overflow_reject__ and not self._fits(len(items)):
+                raise TaskRejectedError(
+                    f'Thread pool queue is full ({len(self._queue) + self._parked_size} of {self._queue_max_size})'
+                )
+
+            for item in items:
+                if self._free_size() <= 0:
+                    if self._overflow_policy == __overflow_drop_oldest__:
+                        self._drop_oldest()
+                    elif self._is_worker():
+                        # The worker can not wait for itself
+                        in_place.append(item)
+                        continue
+                    else:
+                        while self._free_size() <= 0 and not self._is_shutdown:
+                            self._not_full.wait()
+                        if self._is_shutdown:
+                            raise RuntimeError('Thread pool is shut down')
+
+                self._queue.append(item)
+                self._not_empty.notify()
+
+            self._start_workers()
+
+        for item in in_place:
+            self._run(item)
+        return True
+
+    def call(self, target, *args) -> futures.Future:
+        """
+        Queue a call and get its future
+        :param target: Callable
+        :param args: Callable arguments
+        :return: Future of the call result
+        """
+        item = FutureWorkItem(target, args)
+        self.submit(item)
+        return item.future
+
+    def try_call(self, target, *args) -> futures.Future | None:
+        """
+        Queue a call without waiting for the queue space, e.g. from the event loop
+        :param target: Callable
+        :param args: Callable arguments
+        :return: Future of the call result, None if the queue is full (the overflow policy is not applied)
+        """
+        item = FutureWorkItem(target, args)
+        if not self.submit_batch([item], block=False):
+            return None
+        return item.future
+
+    def lock(self, lock_key: Hashable):
+        """
+        Context manager that holds the lock key in the current thread. Queued calls
+        with the same key wait until the block is finished, taking the queue space.
+        :param lock_key:
+        :return:
+        """
+        return _KeyLock(self, lock_key)
+
+    def shutdown(self, wait: bool = True):
+        """
+        Stop accepting new calls. Queued calls are executed
+        :param wait: Wait for the completion of all workers
+        :return:
+        """
+        with self._lock:
+            self._is_shutdown = True
+            self._not_empty.notify_all()
+            self._not_full.notify_all()
+            while wait and self._workers > 0:
+                self._released.wait()
+
+    #################################################################
+    # Workers
+    #################################################################
+
+    def _free_size(self):
+        if self._queue_max_size is None or self._queue_max_size <= 0:
+            return 1
+        return self._queue_max_size - len(self._queue) - self._parked_size
+
+    def _fits(self, size: int) -> bool:
+        if self._queue_max_size is None or self._queue_max_size <= 0:
+            return True
+        return size <= self._free_size()
+
+    def _drop_oldest(self):
+        if len(self._queue) > 0:
+            self._queue.popleft().drop()
+            return
+        # The queue space is taken by the calls waiting for the lock key, they were queued earlier
+        for waiting in self._locked_keys.values():
+            if len(waiting) > 0:
+                self._parked_size -= 1
+                waiting.popleft().drop()
+                return
+
+    def _is_worker(self):
+        return getattr(self._local, 'is_worker', False)
+
+    def _start_workers(self):
+        required = len(self._queue) - self._idle_workers
+        while required > 0 and self._workers < self._pool_max_size:
+            self._workers += 1
+            required -= 1
+            th.Thread(target=self._worker, name=f'sidusai-worker-{self._workers}').start()
+
+    def _worker(self):
+        self._local.is_worker = True
+        while True:
+            with self._lock:
+                item = self._next_item()
+                if item is None:
+                    self._workers -= 1
+                    self._released.notify_all()
+                    return
+                self._active_workers += 1
+                self._not_full.notify()
+
+            try:
+                self._run(item)
+            finally:
+                if item.lock_key is not None:
+                    self._release_key(item.lock_key)
+                with self._lock:
+                    self._active_workers -= 1
+
+    def _next_item(self):
+        while True:
+            while len(self._queue) == 0:
+                if self._is_shutdown:
+                    return None
+                self._idle_workers += 1
+                is_notified = self._not_empty.wait(self._keep_alive_sec)
+                self._idle_workers -= 1
+                if not is_notified and len(self._queue) == 0:
+                    return None
+
+            item = self._queue.popleft()
+            if item.lock_key is None:
+                return item
+
+            if item.lock_key in self._locked_keys:
+                # Wait for the release of the key
+                self._locked_keys[item.lock_key].append(item)
+                self._parked_size += 1
+                continue
+
+            self._locked_keys[item.lock_key] = collections.deque()
+            return item
+
+    def _acquire_key(self, lock_key: Hashable):
+        with self._lock:
+            while lock_key in self._locked_keys:
+                self._released.wait()
+            self._locked_keys[lock_key] = collections.deque()
+
+    def _release_key(self, lock_key: Hashable):
+        with self._lock:
+            waiting = self._locked_keys.pop(lock_key, None)
+            if waiting is not None and len(waiting) > 0:
+                # Calls waiting for the key get priority over the queue
+                self._parked_size -= len(waiting)
+                self._queue.extendleft(reversed(waiting))
+                self._not_empty.notify(len(waiting))
+                self._start_workers()
+            self._released.notify_all()
+
+    def _run(self, item: WorkItem):
+        try:
+            item.run()
+        except BaseException as e:
+            _log.exception(f'Unhandled exception in thread pool call {item.target}: {e}')
+
+
+class _KeyLock:
+
+    def __init__(self, pool: ThreadPool, lock_key: Hashable):
+        self.pool = pool
+        self.lock_key = lock_key
+
+    def __enter__(self):
+        self.pool._acquire_key(self.lock_key)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.pool._release_key(self.lock_key)
+
+
+def wait_all(handles: list, timeout: float = None, return_exceptions: bool = False) -> list:
+    """
+    Wait for the completion of all handles and get their results in the same order
+    :param handles: Futures returned from task execution
+    :param timeout: Maximum wait time in seconds for all handles
+    :param return_exceptions: Return exceptions of failed tasks as results instead of raising the first one
+    :return: List of results
+    """
+    done, not_done = futures.wait(handles, timeout=timeout)
+    if len(not_done) > 0:
+        raise TimeoutError(f'{len(not_done)} of {len(handles)} tasks are not completed')
+
+    results = []
+    for handle in handles:
+        if handle.cancelled():
+            if not return_exceptions:
+                raise futures.CancelledError()
+            results.append(futures.CancelledError())
+            continue
+
+        error = handle.exception()
+        if error is not None and not return_exceptions:
+            raise error
+        results.append(error if error is not None else handle.result())
+    return results
 
-    def execute(self, target=None, args=()):
-        thread = th.Thread(target=target, args=args)
-        thread.start()
 
+def as_completed(handles: list, timeout: float = None):
+    """
+    Iterate over the handles as they complete
+    :param handles: Futures returned from task execution
+    :param timeout: Maximum wait time in seconds for all handles
+    :return: Iterator of completed handles
+    """
+    return futures.as_completed(handles, timeout=timeout)
 
-def build_parameters(executable: Executable, container: NamedTypedContainer):
+
+def is_coroutine_handler(handler) -> bool:
+    """
+    Check that the call of the handler returns a coroutine: async functions and methods,
+    and objects with async __call__ method
+    :param handler:
+    :return:
     """
-    Build  method arguments for executable object
+    if inspect.isclass(handler):
+        return False
+    if inspect.iscoroutinefunction(handler):
+        return True
+    if not inspect.isfunction(handler) and not inspect.ismethod(handler):
+        return inspect.iscoroutinefunction(getattr(handler, '__call__', None))
+    return False
+
+
+def is_generator_handler(handler) -> bool:
+    """
+    Check that the call of the handler returns a generator or an async generator (streaming skill contract)
+    :param handler:
+    :return:
+    """
+    if inspect.isclass(handler):
+        return False
+    if inspect.isgeneratorfunction(handler) or inspect.isasyncgenfunction(handler):
+        return True
+    if not inspect.isfunction(handler) and not inspect.ismethod(handler):
+        _call = getattr(handler, '__call__', None)
+        return inspect.isgeneratorfunction(_call) or inspect.isasyncgenfunction(_call)
+    return False
+
+
+def get_stream_item_type(annotation):
+    """
+    Get the item type of the stream parameter annotation, e.g. ChatAgentValue for Iterator[ChatAgentValue]
+    or AsyncIterator[ChatAgentValue]
+    :param annotation: Parameter type
+    :return: AgentValue type or None if it is not a stream annotation
+    """
+    if typing.get_origin(annotation) not in __sync_stream_types__ + __async_stream_types__:
+        return None
+
+    args = typing.get_args(annotation)
+    if len(args) > 0 and inspect.isclass(args[0]) and issubclass(args[0], AgentValue):
+        return args[0]
+    return None
+
+
+def is_async_stream_annotation(annotation) -> bool:
+    return typing.get_origin(annotation) in __async_stream_types__
+
+
+def is_stream_consumer_executable(executable: Executable) -> bool:
+    """
+    Check that the executable accepts an iterator of values (stream consumer contract)
     :param executable:
-    :param container:
     :return:
     """
-    args = {}
-    for k, v in executable.parameters.items():
-        if v == any:
-            args[k] = container[k] if k in container else None
-        else:
-            args[k] = container[v] if v in container else None
+    return any(get_stream_item_type(v) is not None for v in executable.parameters.values())
+
+
+def get_batch_item_type(annotation):
+    """
+    Get the item type of the batch parameter annotation, e.g. ChatAgentValue for list[ChatAgentValue]
+    :param annotation: Parameter type
+    :return: AgentValue type or None if it is not a batch annotation
+    """
+    if typing.get_origin(annotation) is not list:
+        return None
 
-    return args
+    args = typing.get_args(annotation)
+    if len(args) == 1 and inspect.isclass(args[0]) and issubclass(args[0], AgentValue):
+        return args[0]
+    return None
 
 
-def update_parameters_from_dict(args: dict, executable: Executable, container: dict):
+def is_batch_executable(executable: Executable) -> bool:
     """
-    Update the argument dictionary with an additional context parameter dictionary
-    :param args:
+    Check that the executable accepts a list of values (batch skill contract)
     :param executable:
-    :param container:
     :return:
     """
-    typed_container = {type(v): v for k, v in container.items()}
+    return any(get_batch_item_type(v) is not None for v in executable.parameters.values())
 
-    for k, v in executable.parameters.items():
-        if k in container.keys():
-            args[k] = container[k]
-            continue
-        for t in typed_container:
-            if t == v or issubclass(v, t):
-                args[k] = typed_container[v]
 
+def find_runtime_slot(name: str, annotation, keys: tuple):
+    """
+    Find the key of the per-call container for the parameter
+    :param name: Parameter name
+    :param annotation: Parameter type
+    :param keys: Keys of the per-call container
+    :return: Key or None if the parameter is taken from the components container
+    """
+    if name in keys:
+        return name
+
+    item_type = get_batch_item_type(annotation) or get_stream_item_type(annotation)
+    if item_type is not None:
+        annotation = item_type
+
+    if not inspect.isclass(annotation):
+        return None
+
+    for key in keys:
+        _type = __runtime_slots__.get(key)
+        if _type is not None and issubclass(annotation, _type):
+            return key
+    return None
 
-def execute_executable(executable: Executable, container: NamedTypedContainer, additional_container: dict = None):
+
+@functools.lru_cache(maxsize=__executable_cache_size__)
+def _cached_executable(handler):
+    return Executable(handler)
+
+
+def get_executable(handler) -> Executable:
     """
-    Execute an executable object by generating method arguments from the container
-    :param additional_container:
+    Get a cached executable wrapper for the handler, so call plans are not compiled for each task.
+    Only functions and classes defined at the module or class level are cached: closures, lambdas and
+    callable objects are wrapped on each call, so the cache never keeps per-task objects alive.
+    Bound methods share the compiled plans of their function, the bound object is not cached
+    :param handler:
+    :return:
+    """
+    function = get_cached_handler(handler)
+    if function is None:
+        return Executable(handler)
+
+    executable = _cached_executable(function)
+    if function is handler:
+        return executable
+
+    bound_executable = copy.copy(executable)
+    bound_executable.handler = handler
+    bound_executable.default_name = bound_executable.name = build_handler_name(handler)
+    return bound_executable
+
+
+def get_cached_handler(handler):
+    """
+    :param handler:
+    :return: Function or class the executable of the handler is cached by, None if the handler is not cached
+    """
+    function = handler.__func__ if inspect.ismethod(handler) else handler
+    if not inspect.isfunction(function) and not inspect.isclass(function):
+        return None
+
+    # Only the handler found by its qualified name in its module is cached. Local functions, lambdas
+    # and functions redefined at runtime can capture any objects
+    obj = sys.modules.get(function.__module__)
+    for name in function.__qualname__.split('.'):
+        obj = getattr(obj, name, None)
+    return function if getattr(obj, '__func__', obj) is function else None
+
+
+def execute_executable(executable: Executable, container: NamedTypedContainer, additional_container: dict = None,
+                       instance=None):
+    """
+    Execute an executable object using the compiled call plan for the container
+    :param additional_container: Per-call objects
     :param container:
     :param executable: Executable object
+    :param instance: Object for executables wrapping unbound methods (e.g. task methods)
+    :return:
+    """
+    keys = tuple(additional_container) if additional_container else ()
+    plan = executable.get_plan(container, keys)
+    result = plan.call(executable.handler, additional_container, instance)
+    if executable.is_coroutine:
+        # Outside the event loop the coroutine is executed in the current thread
+        return asyncio.run(result)
+    return result
+
+
+async def execute_executable_async(executable: Executable, container: NamedTypedContainer,
+                                   additional_container: dict = None, instance=None, pool: ThreadPool = None):
+    """
+    Execute an executable object in the event loop. Coroutine handlers are awaited,
+    synchronous handlers are offloaded to the thread pool (or to the default loop executor)
+    :param executable: Executable object
+    :param container:
+    :param additional_container: Per-call objects
+    :param instance: Object for executables wrapping unbound methods
+    :param pool: Thread pool for synchronous handlers
     :return:
     """
+    keys = tuple(additional_container) if additional_container else ()
+    plan = executable.get_plan(container, keys)
+    if executable.is_coroutine:
+        return await plan.call(executable.handler, additional_container, instance)
 
-    _args = build_parameters(executable, container)
-    if additional_container is not None:
-        update_parameters_from_dict(_args, executable, additional_container)
-    _args = inspect.signature(executable.handler).bind(**_args).arguments
-    return executable.handler(**_args)
+    # The handler is called in the context of the caller, as in asyncio.to_thread
+    call_context = contextvars.copy_context()
+    return await call_async(pool, call_context.run, plan.call, executable.handler, additional_container, instance)
+
+
+async def call_async(pool: ThreadPool | None, target, *args):
+    """
+    Call the synchronous target from the event loop on a pool worker. The loop never waits for the queue
+    space: if the queue of the pool is full, the call is executed by the default loop executor whatever
+    the overflow policy, so the queued calls of other tasks are never dropped
+    :param pool: Thread pool, None - the default loop executor
+    :param target: Callable
+    :param args: Callable arguments
+    :return: Result of the call
+    """
+    future = pool.try_call(target, *args) if pool is not None else None
+    if future is None:
+        return await asyncio.get_running_loop().run_in_executor(None, functools.partial(target, *args))
+    return await asyncio.wrap_future(future)
@@ -1,4 +1,6 @@
-import networkx as nx
+import heapq
+import itertools
+import threading as th
 
 __separator__ = '__$'
 __in__ = 'in'
@@ -8,6 +10,18 @@ __out__ = 'out'
 class AgentSkillGraph:
     """
     Skill graph formation container
+
+    The graph is complete: every skill node (a skill repeated depth times) is connected to every other node,
+    and the in and out nodes are connected to every skill node. Edges have the weight for not used nodes,
+    except for the edges of the task skill chain. The graph is stored sparsely: only the edges with
+    explicitly set weights are kept, all other edges have the default weight implicitly.
+
+    The shortest path is cached together with a version counter, which is incremented when the
+    active skills change. Weight updates are serialized, the path is searched again only if the update
+    can change it, and readers get the current route without locks.
+
+    A stage of the available skills can be a tuple of alternative skills, e.g. ['a', ('b1', 'b2'), 'c'].
+    The route passes through one skill of the stage, selected by the skill costs (see set_skill_costs).
     """
 
     def __init__(self,
@@ -17,30 +31,207 @@ class AgentSkillGraph:
                  weight_for_used_nodes: int = 1
                  ):
         self.depth = max_skill_contains(available_skill_names)
+        self.default_weight = weight_for_not_use_nodes
+        self.used_weight = weight_for_used_nodes
+
+        # Node names of the skill chain stages, including the out node
+        self.stages = build_skill_stages(available_skill_names)
 
-        nodes = build_repeatable_nodes_names(full_skill_names, self.depth)
-        edges = build_edges(nodes, weight=weight_for_not_use_nodes)
+        self.nodes = build_repeatable_nodes_names(full_skill_names, self.depth)
+        self._node_set = set(self.nodes)
 
-        update_edges_at_skill(available_skill_names, edges, weight=weight_for_used_nodes)
+        # Edges with explicitly set weights: node -> {node: weight}
+        self.edges = {}
+        update_edges_at_stages(self.stages, self.edges, weight=weight_for_used_nodes)
 
-        self.graph = nx.Graph()
-        self.graph.add_weighted_edges_from(edges)
+        unknown_nodes = [v for v in self.edges if v not in self._node_set and v not in [__in__, __out__]]
+        if len(unknown_nodes) > 0:
+            raise ValueError(f'Skills {unknown_nodes} are not registered in the agent context')
 
-        # TODO: Print graph to console
-        #   use nx.write_network_text(self.graph)
+        self._lock = th.Lock()
+        self._route_listeners = []
+
+        # Current route: (version, active skill names) and edges of the current shortest path
+        self._route = (0, ())
+        self._path_edges = set()
+        self._update_route()
+
+    @property
+    def version(self) -> int:
+        """
+        :return: Version of the route. Incremented when the active skills change
+        """
+        return self._route[0]
+
+    def get_route(self) -> tuple:
+        """
+        :return: Pair (version, tuple of active skill names)
+        """
+        return self._route
 
     def get_active_nodes(self):
         """
         :return: Get a list of available skills from the graph
         """
-        _path = list(nx.dijkstra_path(self.graph, __in__, __out__))
-        return [v.split(__separator__)[0] if __separator__ in v else v for v in _path if v not in [__in__, __out__]]
+        return list(self._route[1])
+
+    def add_route_listener(self, listener):
+        """
+        Add a listener called when the active skills change
+        :param listener: Callable accepting the graph, the route version and the tuple of active skill names
+        :return:
+        """
+        self._route_listeners.append(listener)
+
+    def find_shortest_path(self) -> list:
+        """
+        Dijkstra's algorithm from the in node to the out node over the implicit complete graph.
+
+        All implicit edges have the same weight, so the first settled node gives the shortest implicit distance
+        to all other nodes. Each node is relaxed through an implicit edge only once, the nodes connected to
+        the settled node by explicit edges are left for the next settled nodes.
+        :return: List of path nodes
+        """
+        distances = {__in__: 0}
+        previous = {}
+        settled = set()
+        not_relaxed = set(self.nodes)
+        not_relaxed.add(__out__)
+
+        counter = itertools.count()
+        queue = [(0, next(counter), __in__)]
+        while len(queue) > 0:
+            distance, _, node = heapq.heappop(queue)
+            if node in settled:
+                continue
+            settled.add(node)
+            if node == __out__:
+                break
+
+            explicit_edges = self.edges.get(node, {})
+            for next_node, weight in explicit_edges.items():
+                _distance = distance + weight
+                if next_node not in settled and _distance < distances.get(next_node, _distance + 1):
+                    distances[next_node] = _distance
+                    previous[next_node] = node
+                    heapq.heappush(queue, (_distance, next(counter), next_node))
+
+            # Nodes without implicit edges from this node
+            skipped = {v for v in explicit_edges if v in not_relaxed}
+            skipped.discard(node)
+            if node == __in__ and __out__ in not_relaxed:
+                skipped.add(__out__)
+
+            _distance = distance + self.default_weight
+            for next_node in not_relaxed:
+                if next_node == node or next_node in skipped or next_node in settled:
+                    continue
+                if _distance < distances.get(next_node, _distance + 1):
+                    distances[next_node] = _distance
+                    previous[next_node] = node
+                    heapq.heappush(queue, (_distance, next(counter), next_node))
+            not_relaxed = skipped
+
+        if __out__ not in settled:
+            raise ValueError('The skill graph has no path from in to out node')
+
+        _path = [__out__]
+        while _path[-1] != __in__:
+            _path.append(previous[_path[-1]])
+        _path.reverse()
+        return _path
+
+    def has_edge(self, from_skill_name: str, to_skill_name: str) -> bool:
+        if from_skill_name == to_skill_name:
+            return False
+        if {from_skill_name, to_skill_name} == {__in__, __out__}:
+            return False
+        return self._has_node(from_skill_name) and self._has_node(to_skill_name)
 
     def get_skill_weight(self, from_skill_name: str, to_skill_name: str):
-        return self.graph[from_skill_name][to_skill_name]['weight']
+        if not self.has_edge(from_skill_name, to_skill_name):
+            raise KeyError(f'Edge {from_skill_name} - {to_skill_name} is not found')
+        return self.edges.get(from_skill_name, {}).get(to_skill_name, self.default_weight)
 
     def set_skill_weight(self, from_skill_name: str, to_skill_name: str, weight):
-        self.graph[from_skill_name][to_skill_name]['weight'] = weight
+        self.set_skill_weights({(from_skill_name, to_skill_name): weight})
+
+    def set_skill_weights(self, weights: dict):
+        """
+        Update the weights of several edges at once. The shortest path is searched again only if
+        an edge of the current path became heavier or another edge became lighter.
+        :param weights: Weights by (from node, to node) pairs
+        :return: True if the active skills changed
+        """
+        for (from_skill_name, to_skill_name), weight in weights.items():
+            if not self.has_edge(from_skill_name, to_skill_name):
+                raise KeyError(f'Edge {from_skill_name} - {to_skill_name} is not found')
+            if weight < 0:
+                raise ValueError('Skill weight can not be negative')
+
+        with self._lock:
+            is_affected = False
+            for (from_skill_name, to_skill_name), weight in weights.items():
+                prev_weight = self.get_skill_weight(from_skill_name, to_skill_name)
+                set_edge_weight(self.edges, from_skill_name, to_skill_name, weight)
+
+                is_path_edge = frozenset([from_skill_name, to_skill_name]) in self._path_edges
+                if (is_path_edge and weight > prev_weight) or (not is_path_edge and weight < prev_weight):
+                    is_affected = True
+
+            route = self._route
+            if is_affected:
+                self._update_route()
+            is_changed = route is not self._route
+
+        if is_changed:
+            for listener in self._route_listeners:
+                listener(self, *self._route)
+        return is_changed
+
+    def has_alternatives(self) -> bool:
+        return any(len(stage) > 1 for stage in self.stages)
+
+    def set_skill_costs(self, costs: dict) -> bool:
+        """
+        Route the stages with alternative skills through the cheapest skills. The cost of a skill is added
+        to the weights of the edges entering the skill nodes, relative to the most expensive alternative
+        of the stage. The added weights are bounded, so that the route never skips a stage.
+        :param costs: Non-negative costs by skill name. Skills without cost have zero cost
+        :return: True if the active skills changed
+        """
+        alternative_stages = [stage for stage in self.stages if len(stage) > 1]
+        if len(alternative_stages) == 0:
+            return False
+
+        # Skipping the chain (or a part of it) costs at least the weight of one not used edge
+        chain_weight = self.used_weight * len(self.stages)
+        max_penalty = max(self.default_weight - chain_weight, 0) / (len(alternative_stages) + 1)
+
+        weights = {}
+        prev_stage = [__in__]
+        for stage in self.stages:
+            if len(stage) > 1:
+                stage_costs = [max(costs.get(skill_name_of_node(v), 0), 0) for v in stage]
+                max_cost = max(stage_costs)
+                for node, cost in zip(stage, stage_costs):
+                    penalty = max_penalty * cost / max_cost if max_cost > 0 else 0
+                    for prev_node in prev_stage:
+                        weights[(prev_node, node)] = self.used_weight + penalty
+            prev_stage = stage
+        return self.set_skill_weights(weights)
+
+    def _update_route(self):
+        _path = self.find_shortest_path()
+        self._path_edges = {frozenset(edge) for edge in zip(_path, _path[1:])}
+
+        active_nodes = tuple(skill_name_of_node(v) for v in _path if v not in [__in__, __out__])
+        version, prev_active_nodes = self._route
+        if active_nodes != prev_active_nodes:
+            self._route = (version + 1, active_nodes)
+
+    def _has_node(self, node: str) -> bool:
+        return node in self._node_set or node == __in__ or node == __out__
 
 
 def max_skill_contains(skills: list) -> int:
@@ -49,17 +240,28 @@ def max_skill_contains(skills: list) -> int:
     :param skills:
     :return:
     """
-    _s = [skills.count(s) for s in skills]
+    _skills = flatten_skill_names(skills)
+    _s = [_skills.count(s) for s in _skills]
     return max(_s)
 
 
-def build_edges(nodes: list, weight: int = 100):
-    edges = []
-    build_node_with_weight(__in__, nodes, edges, weight)
-    for i, _node in enumerate(nodes):
-        build_node_with_weight(_node, nodes, edges, weight)
-    build_node_with_weight(__out__, nodes, edges, weight)
-    return edges
+def flatten_skill_names(skills: list) -> list:
+    """
+    List of skill names, including all alternatives of the stages
+    :param skills:
+    :return:
+    """
+    _skills = []
+    for skill in skills:
+        if isinstance(skill, (tuple, list)):
+            _skills += list(skill)
+        else:
+            _skills.append(skill)
+    return _skills
+
+
+def skill_name_of_node(node: str) -> str:
+    return node.split(__separator__)[0] if __separator__ in node else node
 
 
 def build_repeatable_nodes_names(nodes: [str], depth: int):
@@ -76,50 +278,49 @@ def build_repeatable_nodes_names(nodes: [str], depth: int):
     return _nodes
 
 
-def build_node_with_weight(from_node, to_nodes, edges, weight: int = 100):
+def set_edge_weight(edges: dict, from_node, to_node, weight):
     """
-    Generate weighted edges from a vertex to a specified list of vertices
+    Set the weight of the undirected edge
+    :param edges: Explicit edges: node -> {node: weight}
     :param from_node:
-    :param to_nodes:
-    :param edges: Current list of weighted edges
+    :param to_node:
     :param weight:
     :return:
     """
-    for _node_next in to_nodes:
-        if from_node == _node_next:
-            continue
-        _edge = (from_node, _node_next, weight)
-        edges.append(_edge)
+    edges.setdefault(from_node, {})[to_node] = weight
+    edges.setdefault(to_node, {})[from_node] = weight
 
 
-def build_skill_names_at_index(skills: list):
+def build_skill_stages(skills: list) -> list:
     """
-    Forming a list of vertices with a repeat inclusion index
+    Forming a list of stages with a repeat inclusion index of vertices. A stage is a list of
+    alternative vertices, the last stage is the out node
     :param skills:
     :return:
     """
-    _available_nodes = []
-    _contains_available_nodes = {s: 0 for s in set(skills)}
-    for skill in skills:
-        _available_nodes.append(f'{skill}{__separator__}{_contains_available_nodes[skill]}')
-        _contains_available_nodes[skill] += 1
-    _available_nodes.append(__out__)
-    return _available_nodes
+    _stages = []
+    _contains_available_nodes = {s: 0 for s in flatten_skill_names(skills)}
+    for stage in skills:
+        _stage = []
+        for skill in (stage if isinstance(stage, (tuple, list)) else [stage]):
+            _stage.append(f'{skill}{__separator__}{_contains_available_nodes[skill]}')
+            _contains_available_nodes[skill] += 1
+        _stages.append(_stage)
+    _stages.append([__out__])
+    return _stages
 
 
-def update_edges_at_skill(skills: list, edges, weight: int = 1):
+def update_edges_at_stages(stages: list, edges: dict, weight: int = 1):
     """
-    Updating edge weights for skill list
-    :param skills:
-    :param edges:
+    Updating edge weights for skill stages. Each vertex of the stage is connected to each vertex of the previous stage
+    :param stages:
+    :param edges: Explicit edges: node -> {node: weight}
     :param weight:
     :return:
     """
-    prev = __in__
-    _available_nodes = build_skill_names_at_index(skills)
-    for skill in _available_nodes:
-        for index, edge in enumerate(edges):
-            _in, _out, _weight = edge
-            if (_in == prev and _out == skill) or (_in == skill and _out == prev):
-                edges[index] = (_in, _out, weight)
-        prev = skill
+    prev_stage = [__in__]
+    for stage in stages:
+        for prev in prev_stage:
+            for skill in stage:
+                set_edge_weight(edges, prev, skill, weight)
+        prev_stage = stage
@@ -0,0 +1,180 @@
+import asyncio
+import threading as th
+import time
+
+
+class TokenBucket:
+    """
+    Token bucket with the level going below zero: a caller reserves the units at once and waits
+    until the bucket is refilled to zero, so the next callers are scheduled after it.
+    """
+
+    def __init__(self, rate_per_sec: float, capacity: float):
+        """
+        :param rate_per_sec: Refill rate
+        :param capacity: Maximum level (burst)
+        """
+        self.rate_per_sec = rate_per_sec
+        self.capacity = capacity
+        self.level = capacity
+        self.updated_at = time.monotonic()
+
+    def refill(self, now: float):
+        self.level = min(self.level + (now - self.updated_at) * self.rate_per_sec, self.capacity)
+        self.updated_at = now
+
+    def reserve(self, units: float, now: float) -> float:
+        """
+        Take the units from the bucket
+        :param units: Units, bounded by the capacity
+        :param now: Monotonic time
+        :return: Time to wait until the units are available, seconds
+        """
+        self.refill(now)
+        self.level -= min(units, self.capacity)
+        return -self.level / self.rate_per_sec if self.level < 0 else 0.0
+
+    def set_rate(self, rate_per_sec: float, capacity: float, now: float):
+        self.refill(now)
+        self.rate_per_sec = rate_per_sec
+        self.capacity = capacity
+        self.level = min(self.level, capacity)
+
+
+class RateLimiter:
+    """
+    Client-side rate limiter of the requests per second and the tokens per minute of a provider.
+
+    The caller acquires the limiter before the request with the estimated tokens of the request and
+    reconciles the reserved tokens with the actual usage after it. Callers are never rejected, they wait in
+    the order of arrival: each caller reserves its share of the buckets at once and sleeps until the buckets
+    are refilled, so a caller is never overtaken by the callers arrived after it. The same limiter can
+    be acquired by threads (acquire) and coroutines (acquire_async). The limits can be changed at runtime,
+    the new limits apply to the callers arriving after the change.
+    """
+
+    def __init__(self, requests_per_sec: float = None, tokens_per_min: float = None,
+                 burst_requests: float = None):
+        """
+        :param requests_per_sec: Maximum requests per second, None - not limited
+        :param tokens_per_min: Maximum tokens per minute, None - not limited
+        :param burst_requests: Maximum number of requests sent at once, default is a second of requests
+        """
+        self._lock = th.Lock()
+        self._requests = None
+        self._tokens = None
+
+        self.requests_per_sec = None
+        self.tokens_per_min = None
+        self.burst_requests = None
+
+        self.waits = 0
+        self.wait_sec = 0.0
+
+        self.set_limits(requests_per_sec, tokens_per_min, burst_requests)
+
+    def set_limits(self, requests_per_sec: float = None, tokens_per_min: float = None,
+                   burst_requests: float = None):
+        """
+        Change the limits. The reserved levels of the buckets are kept
+        :param requests_per_sec: Maximum requests per second, None - not limited
+        :param tokens_per_min: Maximum tokens per minute, None - not limited
+        :param burst_requests: Maximum number of requests sent at once, default is a second of requests
+        :return:
+        """
+        if requests_per_sec is not None and requests_per_sec <= 0:
+            raise ValueError('Requests per second must be greater than 0')
+        if tokens_per_min is not None and tokens_per_min <= 0:
+            raise ValueError('Tokens per minute must be greater than 0')
+
+        with self._lock:
+            now = time.monotonic()
+            self.requests_per_sec = requests_per_sec
+            self.tokens_per_min = tokens_per_min
+            self.burst_requests = burst_requests
+
+            if requests_per_sec is None:
+                self._requests = None
+            else:
+                capacity = burst_requests if burst_requests is not None else max(requests_per_sec, 1)
+                self._requests = _update_bucket(self._requests, requests_per_sec, capacity, now)
+
+            if tokens_per_min is None:
+                self._tokens = None
+            else:
+                self._tokens = _update_bucket(self._tokens, tokens_per_min / 60, tokens_per_min, now)
+
+    def reserve(self, tokens: int = 0) -> tuple:
+        """
+        Reserve a request with the tokens without waiting
+        :param tokens: Estimated tokens of the request
+        :return: Pair (time to wait before the request in seconds, reserved tokens). The reserved tokens
+        are bounded by the tokens per minute
+        """
+        with self._lock:
+            now = time.monotonic()
+            delay = 0.0
+            reserved_tokens = 0
+            if self._requests is not None:
+                delay = max(delay, self._requests.reserve(1, now))
+            if self._tokens is not None and tokens > 0:
+                reserved_tokens = min(tokens, self._tokens.capacity)
+                delay = max(delay, self._tokens.reserve(reserved_tokens, now))
+
+            if delay > 0:
+                self.waits += 1
+                self.wait_sec += delay
+            return delay, reserved_tokens
+
+    def acquire(self, tokens: int = 0) -> int:
+        """
+        Wait until the request with the tokens is allowed
+        :param tokens: Estimated tokens of the request
+        :return: Reserved tokens, pass them to reconcile
+        """
+        delay, reserved_tokens = self.reserve(tokens)
+        if delay > 0:
+            time.sleep(delay)
+        return reserved_tokens
+
+    async def acquire_async(self, tokens: int = 0) -> int:
+        """
+        Wait until the request with the tokens is allowed, without blocking the event loop
+        :param tokens: Estimated tokens of the request
+        :return: Reserved tokens, pass them to reconcile
+        """
+        delay, reserved_tokens = self.reserve(tokens)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return reserved_tokens
+
+    def reconcile(self, reserved_tokens: int, actual_tokens: int | None):
+        """
+        Correct the tokens of the acquired request with the actual usage: the overspent tokens are taken
+        from the bucket (the next callers wait for them), the unspent tokens are returned
+        :param reserved_tokens: Tokens returned by acquire
+        :param actual_tokens: Tokens of the usage, None if unknown (the reservation is kept)
+        :return:
+        """
+        if actual_tokens is None:
+            return
+        with self._lock:
+            if self._tokens is not None:
+                self._tokens.refill(time.monotonic())
+                self._tokens.level = min(self._tokens.level - (actual_tokens - reserved_tokens),
+                                         self._tokens.capacity)
+
+    def stats(self) -> dict:
+        return {
+            'requests_per_sec': self.requests_per_sec,
+            'tokens_per_min': self.tokens_per_min,
+            'waits': self.waits,
+            'wait_sec': self.wait_sec,
+        }
+
+
+def _update_bucket(bucket: TokenBucket | None, rate_per_sec: float, capacity: float, now: float) -> TokenBucket:
+    if bucket is None:
+        return TokenBucket(rate_per_sec, capacity)
+    bucket.set_rate(rate_per_sec, capacity, now)
+    return bucket
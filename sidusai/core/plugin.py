@@ -1,4 +1,8 @@
+import json
+import threading as th
+
 from sidusai.core.agent import Agent
+from sidusai.core.budget import TokenBudget
 from sidusai.core.types import AgentTask, AgentValue
 
 import sidusai.core.execute as ex
@@ -69,13 +73,105 @@ class ChatAgentValue(AgentValue):
 
     Most often, such an agent is transformed by adding a new element to the array
     describing the user's or agent's message. The logic can be overridden by the user.
+
+    The request form of the messages (role and content only) is cached for the message prefix,
+    both as a list and as JSON, and is extended with the messages appended since the last request.
+    The cache is rebuilt if the messages list is replaced or shrinks. Messages are expected to be
+    appended, a message changed in place is not detected.
+
+    If the token budget is set, the messages are trimmed to the budget before the request
+    (see TokenBudget). Tokens of the messages are estimated once, when the message is appended.
+
+    The chat can be shared by concurrent tasks: the caches and the trimming are guarded by the lock
+    of the value, messages are appended with append_* methods under the same lock.
     """
 
     messages: list = []
 
-    def __init__(self, messages):
+    def __init__(self, messages, token_budget: TokenBudget = None):
+        """
+        :param messages: Message dicts with role and content
+        :param token_budget: Token budget policy of the chat requests
+        """
         super().__init__()
         self.messages = messages
+        self.token_budget = token_budget
+        self._lock = th.RLock()
+
+        # Estimated tokens: source list, last message, tokens by message and the total
+        self._tokens_source = None
+        self._tokens_last = None
+        self._tokens = []
+        self._tokens_total = 0
+
+        # Cached message prefix: source list, number of messages, last message, request messages and JSON
+        self._prefix_source = None
+        self._prefix_count = 0
+        self._prefix_last = None
+        self._prefix_messages = []
+        self._prefix_json = bytearray()
+
+    @property
+    def tokens(self) -> int | None:
+        """
+        :return: Estimated tokens of the messages, None if the token budget is not set
+        """
+        if self.token_budget is None:
+            return None
+        with self._lock:
+            self._update_tokens()
+            return self._tokens_total
+
+    def trim_to_budget(self) -> int:
+        """
+        Trim the messages to the token budget. Called before the request
+        :return: Number of removed messages
+        """
+        if self.token_budget is None:
+            return 0
+        with self._lock:
+            self._update_tokens()
+            if self._tokens_total <= self.token_budget.max_tokens:
+                return 0
+
+            message_count = len(self.messages)
+            self._tokens_total = self.token_budget.trim(self.messages, self._tokens, self._tokens_total)
+            self._tokens_last = self.messages[-1] if len(self.messages) > 0 else None
+            # Messages are removed in place, the cached prefix is rebuilt
+            self._prefix_source = None
+            return message_count - len(self.messages)
+
+    def estimate_tokens(self) -> int:
+        """
+        :return: Estimated tokens of the messages: counted by the token budget if it is set,
+        otherwise estimated by the size of the cached request JSON
+        """
+        if self.token_budget is not None:
+            return self.tokens
+        with self._lock:
+            self._update_prefix()
+            return (len(self._prefix_json) + 3) // 4
+
+    def request_messages(self) -> list:
+        """
+        :return: Messages with role and content only. A shallow copy of the cached list,
+        the message dicts are shared and must not be changed
+        """
+        with self._lock:
+            self._update_prefix()
+            return list(self._prefix_messages)
+
+    def request_messages_json(self, head: bytes = b'[', tail: bytes = b']') -> bytes:
+        """
+        JSON array of the request messages, encoded as UTF-8
+        :param head: Bytes before the messages, e.g. the start of the payload object with the array bracket
+        :param tail: Bytes after the messages, e.g. the array bracket with the rest of the payload object
+        :return: The head, the messages and the tail joined with a single copy of the cached messages.
+        Only the new messages are encoded, but the copy of the cached messages grows with the chat
+        """
+        with self._lock:
+            self._update_prefix()
+            return b''.join((head, self._prefix_json, tail))
 
     def last_content(self) -> str | None:
         if len(self.messages) > 0:
@@ -83,6 +179,12 @@ class ChatAgentValue(AgentValue):
             return message['content'] if 'content' in message else None
         return None
 
+    def cache_key(self) -> tuple:
+        """
+        :return: Memoization key of the chat: roles and contents of all messages
+        """
+        return tuple((m.get('role'), m.get('content')) for m in self.messages)
+
     def append_user(self, content: str):
         self._append('user', content)
 
@@ -93,7 +195,82 @@ class ChatAgentValue(AgentValue):
         self._append('system', content)
 
     def _append(self, role: str, content: str):
-        self.messages.append({'role': role, 'content': content})
+        with self._lock:
+            self.messages.append({'role': role, 'content': content})
+
+    def __getstate__(self):
+        # The lock is not copied: copies (deep copies of the DAG branches, values of process skills)
+        # get their own lock
+        state = self.__dict__.copy()
+        state.pop('_lock', None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = th.RLock()
+
+    def _update_tokens(self):
+        messages = self.messages
+        count = len(self._tokens)
+        if not is_messages_prefix(messages, self._tokens_source, count, self._tokens_last):
+            self._tokens_source = messages
+            self._tokens = []
+            self._tokens_total = 0
+            count = 0
+
+        for message in messages[count:]:
+            tokens = self.token_budget.count_message(message)
+            self._tokens.append(tokens)
+            self._tokens_total += tokens
+        self._tokens_last = messages[-1] if len(messages) > 0 else None
+
+    def _update_prefix(self):
+        self.trim_to_budget()
+
+        messages = self.messages
+        count = self._prefix_count
+        if not is_messages_prefix(messages, self._prefix_source, count, self._prefix_last):
+            self._prefix_source = messages
+            self._prefix_count = 0
+            self._prefix_messages = []
+            self._prefix_json = bytearray()
+            count = 0
+
+        if len(messages) == count:
+            return
+
+        new_messages = [{'role': m['role'], 'content': m['content']} for m in messages[count:]]
+        self._prefix_messages.extend(new_messages)
+        for message in new_messages:
+            if len(self._prefix_json) > 0:
+                self._prefix_json += b', '
+            self._prefix_json += json.dumps(message).encode('utf-8')
+        self._prefix_count = len(messages)
+        self._prefix_last = messages[-1]
+
+
+def is_messages_prefix(messages: list, source: list, count: int, last: dict) -> bool:
+    """
+    Check that the cached messages are still the prefix of the messages
+    :param messages: Current messages
+    :param source: Messages list of the cache
+    :param count: Number of the cached messages
+    :param last: Last cached message
+    :return:
+    """
+    return messages is source and len(messages) >= count and (count == 0 or messages[count - 1] is last)
+
+
+class ChatChunkAgentValue(AgentValue):
+    """
+    The agent's data type for a chunk of the streamed chat message: a part of the message content.
+    Chunks are yielded by streaming chat skills before the complete message is added to the chat.
+    """
+
+    def __init__(self, content: str, role: str = 'assistant'):
+        super().__init__()
+        self.content = content
+        self.role = role
 
 
 class CompletedAgentTask(AgentTask):
@@ -108,6 +285,7 @@ class CompletedAgentTask(AgentTask):
         self.value = value
         self.ctx = agent.ctx
         self.handler = self._build_executable_handler(handler)
+        self.chunk_handler = None
 
     def data(self, value: AgentValue):
         self.value = value
@@ -117,6 +295,15 @@ class CompletedAgentTask(AgentTask):
         self.handler = self._build_executable_handler(handler)
         return self
 
+    def stream(self, handler):
+        """
+        Set the handler of chunks of streaming skills, called before the completion handler
+        :param handler:
+        :return:
+        """
+        self.chunk_handler = self._build_executable_handler(handler)
+        return self
+
     def forward(self, *args, **kwargs) -> AgentValue:
         return self.value
 
@@ -124,11 +311,15 @@ class CompletedAgentTask(AgentTask):
         if self.handler is not None:
             ex.execute_executable(self.handler, self.ctx.components, {'value': value})
 
+    def on_chunk(self, value: AgentValue, *args, **kwargs) -> None:
+        if self.chunk_handler is not None:
+            ex.execute_executable(self.chunk_handler, self.ctx.components, {'value': value})
+
     @staticmethod
     def _build_executable_handler(handler) -> ex.Executable | None:
         _ex = None
         if handler is not None:
-            _ex = ex.Executable(handler)
+            _ex = ex.get_executable(handler)
 
         return _ex
 
@@ -144,12 +335,17 @@ def build_and_register_task_skill_names(task_skills: [], agent: Agent):
     The resulting list can contain both the methods themselves, then they will be registered as skills,
     as well as the names of already registered skills.
 
-    :param task_skills: A list of skills. Names or objects of functions
+    :param task_skills: A list of skills. Names or objects of functions, or tuples of alternative skills
     :param agent: The current agent's object
     :return: Current list of registered skills
     """
     skill_names = []
     for task_skill in task_skills:
+        # If it is a stage of alternative skills
+        if type(task_skill) == tuple:
+            skill_names.append(tuple(build_and_register_task_skill_names(list(task_skill), agent)))
+            continue
+
         # If it is name of skill
         if type(task_skill) == str:
             skill_names.append(task_skill)
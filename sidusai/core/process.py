@@ -0,0 +1,180 @@
+import concurrent.futures as futures
+import inspect
+import multiprocessing as mp
+import pickle
+import threading as th
+
+import sidusai.core.context as context
+import sidusai.core.execute as ex
+import sidusai.core.types as types
+
+#############################################################
+# Worker process state
+#############################################################
+
+# Context of the worker process. Contains component builders of the agent
+_worker_context: context.AgentContext | None = None
+
+# Skills built in the worker process by registered handler
+_worker_skills = {}
+
+
+def _init_worker(agent_name: str, builders: list):
+    """
+    Process pool initializer. Registers the agent component builders in the worker context.
+    Components are built on demand, only those required by the executed skills.
+    :param agent_name:
+    :param builders: List of (name, builder) pairs
+    :return:
+    """
+    global _worker_context
+    _worker_context = context.AgentContext(agent_name)
+    for name, builder in builders:
+        _worker_context.add_component_builder(builder, name=name)
+
+
+def _build_worker_skill(handler) -> ex.Executable:
+    skill = _worker_skills.get(handler)
+    if skill is not None:
+        return skill
+
+    executable = ex.Executable(handler)
+    _build_worker_components(executable)
+    if inspect.isclass(handler):
+        executable = ex.Executable(ex.execute_executable(executable, _worker_context.components))
+        _build_worker_components(executable)
+
+    _worker_skills[handler] = executable
+    return executable
+
+
+def _build_worker_components(executable: ex.Executable):
+    for k, v in executable.parameters.items():
+        if inspect.isclass(v) and issubclass(v, types.AgentValue):
+            continue
+        if v not in _worker_context.components and v in _worker_context.components_builders:
+            context.build_component_in_context(_worker_context, v)
+
+
+def _execute_skill(handler, value: types.AgentValue) -> types.AgentValue:
+    skill = _build_worker_skill(handler)
+    return ex.execute_executable(skill, _worker_context.components, {'value': value})
+
+
+#############################################################
+# Process pool
+#############################################################
+
+class ProcessPool:
+    """
+    Pool of worker processes for CPU-bound skills.
+
+    The skill value is passed to the worker and back by pickling. Components required by the skills are
+    built in each worker from the component builders registered in the agent context, so builders and
+    skill handlers must be picklable (module level functions, classes or methods of picklable objects).
+    Configurations and post processors are not applied to components in worker processes.
+    """
+
+    def __init__(self, ctx: context.AgentContext, max_workers: int = None, start_method: str = None):
+        self._agent_name = ctx.agent_name
+        self._builders = find_required_builders(ctx, find_process_skills(ctx))
+        self._max_workers = max_workers
+        self._start_method = start_method
+        self._executor = None
+        # The executor is created by the first call, calls come from several pool workers at once
+        self._lock = th.Lock()
+
+    def call(self, skill: ex.Executable, value: types.AgentValue) -> futures.Future:
+        """
+        Execute the skill in a worker process
+        :param skill: Skill executable
+        :param value: Skill value
+        :return: Future of the transformed value
+        """
+        return self._get_executor().submit(_execute_skill, skill.options.handler, value)
+
+    def shutdown(self, wait: bool = True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+    def _get_executor(self) -> futures.ProcessPoolExecutor:
+        executor = self._executor
+        if executor is not None:
+            return executor
+
+        with self._lock:
+            if self._executor is None:
+                mp_context = mp.get_context(self._start_method) if self._start_method is not None else None
+                self._executor = futures.ProcessPoolExecutor(
+                    max_workers=self._max_workers,
+                    mp_context=mp_context,
+                    initializer=_init_worker,
+                    initargs=(self._agent_name, self._builders)
+                )
+            return self._executor
+
+
+def find_process_skills(ctx: context.AgentContext) -> list:
+    return [v for v in ctx.skills.values() if v.options.executor == ex.__executor_process__]
+
+
+def find_required_builders(ctx: context.AgentContext, skills: list) -> list:
+    """
+    Find component builders required by the skills, including builders of their dependencies
+    :param ctx:
+    :param skills: Skill executables
+    :return: List of (name, builder) pairs
+    """
+    required = []
+    types_to_check = []
+    for skill in skills:
+        types_to_check += list(skill.parameters.values())
+        types_to_check += list(ex.Executable(skill.options.handler).parameters.values())
+
+    while len(types_to_check) > 0:
+        _type = types_to_check.pop()
+        if inspect.isclass(_type) and issubclass(_type, types.AgentValue):
+            continue
+        if _type not in ctx.components_builders:
+            continue
+
+        name = ctx.components_builders.get_name_from_type(_type)
+        builder = ctx.components_builders[_type]
+        if any(n == name for n, _ in required):
+            continue
+
+        required.append((name, builder.handler))
+        types_to_check += list(builder.parameters.values())
+    return required
+
+
+def validate_process_skills(ctx: context.AgentContext) -> bool:
+    """
+    Check that skills executed in the process pool and their component builders
+    can be passed to worker processes
+    :param ctx:
+    :return: True if the context has process skills
+    """
+    skills = find_process_skills(ctx)
+    if len(skills) == 0:
+        return False
+
+    for skill in skills:
+        try:
+            pickle.dumps(skill.options.handler)
+        except Exception as e:
+            raise SyntaxError(
+                f'Skill {skill.name} is executed in the process pool and must be picklable. '
+                f'Use a module level function or class. {e}'
+            )
+
+    for name, builder in find_required_builders(ctx, skills):
+        try:
+            pickle.dumps(builder)
+        except Exception as e:
+            raise SyntaxError(
+                f'Component builder {name} must be picklable to build components in worker processes. {e}'
+            )
+    return True
@@ -0,0 +1,197 @@
+import contextvars
+import threading as th
+import time
+
+import sidusai.core.context as context
+
+# Sample of the currently executed skill, used to report its token cost
+_skill_sample = contextvars.ContextVar('_skill_sample', default=None)
+
+
+def report_skill_tokens(tokens: int):
+    """
+    Report the number of tokens spent by the currently executed skill. Used by the adaptive routing
+    as a part of the skill cost. The call is ignored outside the skill or if the adaptive routing is disabled.
+    Tokens reported in worker processes are not received by the agent.
+    :param tokens:
+    :return:
+    """
+    sample = _skill_sample.get()
+    if sample is not None:
+        sample.tokens += tokens
+
+
+class SkillSample:
+    """
+    Measurement of a single skill call
+    """
+
+    __slots__ = ('tokens',)
+
+    def __init__(self):
+        self.tokens = 0
+
+
+class SkillStats:
+    """
+    Exponentially weighted moving averages of the skill latency, error rate and token cost
+    """
+
+    def __init__(self):
+        self.latency_sec = 0.0
+        self.error_rate = 0.0
+        self.tokens = 0.0
+        self.samples = 0
+        self.updated_at = None
+
+    def update(self, alpha: float, latency_sec: float, is_error: bool, tokens: int):
+        if self.samples == 0:
+            self.latency_sec = latency_sec
+            self.error_rate = 1.0 if is_error else 0.0
+            self.tokens = float(tokens)
+        else:
+            self.latency_sec += alpha * (latency_sec - self.latency_sec)
+            self.error_rate += alpha * ((1.0 if is_error else 0.0) - self.error_rate)
+            self.tokens += alpha * (tokens - self.tokens)
+        self.samples += 1
+        self.updated_at = time.monotonic()
+
+    def to_dict(self) -> dict:
+        return {
+            'latency_sec': self.latency_sec,
+            'error_rate': self.error_rate,
+            'tokens': self.tokens,
+            'samples': self.samples,
+        }
+
+
+class AdaptiveRouter:
+    """
+    Adaptive routing of tasks with alternative skills.
+
+    Skill calls are measured and averaged, the cost of the skill is a weighted sum of its latency,
+    error rate and token cost. The costs are periodically applied to the skill graphs of tasks with
+    alternative skills, so the next tasks are routed through the cheapest alternatives.
+    Statistics of a skill are reset after stale_sec without calls, so the skill not used
+    because of the past measurements gets a chance to be routed again.
+    """
+
+    def __init__(self, ctx: context.AgentContext, alpha: float = 0.2, latency_weight: float = 1.0,
+                 error_weight: float = 10.0, token_weight: float = 0.001, update_interval_sec: float = 1.0,
+                 stale_sec: float = 300.0, max_latency_sec: float = 60.0):
+        """
+        :param ctx: Agent context
+        :param alpha: Smoothing factor of the moving averages, (0, 1]
+        :param latency_weight: Cost of a second of the skill latency
+        :param error_weight: Cost of the skill error rate
+        :param token_weight: Cost of a token spent by the skill
+        :param update_interval_sec: Minimum interval between updates of the skill graphs
+        :param stale_sec: Time without calls after which the skill statistics are reset
+        :param max_latency_sec: Upper bound of a measured latency, so that a single hung call does not
+        dominate the average
+        """
+        if not 0 < alpha <= 1:
+            raise ValueError('Smoothing factor must be in (0, 1]')
+
+        self.ctx = ctx
+        self.alpha = alpha
+        self.latency_weight = latency_weight
+        self.error_weight = error_weight
+        self.token_weight = token_weight
+        self.update_interval_sec = update_interval_sec
+        self.stale_sec = stale_sec
+        self.max_latency_sec = max_latency_sec
+
+        self._stats = {}
+        self._lock = th.Lock()
+        self._update_lock = th.Lock()
+        self._updated_at = time.monotonic()
+
+    def measure(self, skill_name: str):
+        """
+        Context manager measuring the skill call
+        :param skill_name:
+        :return:
+        """
+        return _SkillMeasure(self, skill_name)
+
+    def record(self, skill_name: str, latency_sec: float, is_error: bool = False, tokens: int = 0):
+        """
+        Add a measurement of the skill call. The skill graphs are updated if the update interval has passed
+        :param skill_name:
+        :param latency_sec:
+        :param is_error:
+        :param tokens:
+        :return:
+        """
+        latency_sec = min(max(latency_sec, 0.0), self.max_latency_sec)
+        with self._lock:
+            stats = self._stats.get(skill_name)
+            if stats is None or self._is_stale(stats):
+                stats = SkillStats()
+                self._stats[skill_name] = stats
+            stats.update(self.alpha, latency_sec, is_error, tokens)
+
+        if time.monotonic() - self._updated_at >= self.update_interval_sec:
+            self.update_routes()
+
+    def get_stats(self, skill_name: str) -> SkillStats | None:
+        return self._stats.get(skill_name)
+
+    def get_cost(self, skill_name: str) -> float:
+        """
+        :param skill_name:
+        :return: Cost of the skill. Skills without actual statistics have zero cost
+        """
+        stats = self._stats.get(skill_name)
+        if stats is None or self._is_stale(stats):
+            return 0.0
+        return (
+                self.latency_weight * stats.latency_sec +
+                self.error_weight * stats.error_rate +
+                self.token_weight * stats.tokens
+        )
+
+    def update_routes(self):
+        """
+        Apply the skill costs to the skill graphs of tasks with alternative skills.
+        Skipped if the routes are being updated by another thread
+        :return:
+        """
+        if not self._update_lock.acquire(blocking=False):
+            return
+        try:
+            self._updated_at = time.monotonic()
+            with self._lock:
+                costs = {name: self.get_cost(name) for name in self._stats}
+
+            for task_container in self.ctx.tasks.values():
+                skill_graph = task_container.skill_graph
+                if skill_graph is not None and skill_graph.has_alternatives():
+                    skill_graph.set_skill_costs(costs)
+        finally:
+            self._update_lock.release()
+
+    def _is_stale(self, stats: SkillStats) -> bool:
+        return self.stale_sec is not None and time.monotonic() - stats.updated_at > self.stale_sec
+
+
+class _SkillMeasure:
+
+    def __init__(self, router: AdaptiveRouter, skill_name: str):
+        self._router = router
+        self._skill_name = skill_name
+        self._sample = SkillSample()
+        self._token = None
+        self._started_at = None
+
+    def __enter__(self):
+        self._token = _skill_sample.set(self._sample)
+        self._started_at = time.perf_counter()
+        return self._sample
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        latency_sec = time.perf_counter() - self._started_at
+        _skill_sample.reset(self._token)
+        self._router.record(self._skill_name, latency_sec, exc_type is not None, self._sample.tokens)
+        return False
@@ -0,0 +1,120 @@
+import asyncio
+import inspect
+
+import sidusai.core.execute as ex
+
+
+class SkillStream:
+    """
+    Stream of chunks of a streaming skill.
+
+    A streaming skill is a generator (or an async generator) yielding partial values. The stream can be
+    iterated both synchronously and asynchronously, whatever the source is: a synchronous source iterated
+    in the event loop is advanced in the thread pool, an async source iterated in a thread is advanced
+    in the event loop of the agent (or in a private event loop if the agent runs synchronously).
+
+    The result of the stream is the value returned by the generator, or the last chunk if the generator
+    returns nothing.
+    """
+
+    def __init__(self, source, loop: asyncio.AbstractEventLoop = None, pool: ex.ThreadPool = None):
+        """
+        :param source: Generator, async generator or iterator of chunks
+        :param loop: Running event loop, used to advance the async source from other threads
+        :param pool: Thread pool, used to advance the synchronous source from the event loop
+        """
+        self.source = source
+        self.last_chunk = None
+        self.return_value = None
+
+        self._is_async = inspect.isasyncgen(source)
+        self._loop = loop
+        self._pool = pool
+        self._private_loop = None
+
+    @property
+    def result(self):
+        return self.return_value if self.return_value is not None else self.last_chunk
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._is_async:
+            if self._loop is not None and _is_loop_thread(self._loop):
+                raise RuntimeError('Async stream must be iterated with async for in the event loop')
+            try:
+                chunk = self._run_async(self.source.__anext__())
+            except StopAsyncIteration:
+                self._close_private_loop()
+                raise StopIteration
+        else:
+            try:
+                chunk = next(self.source)
+            except StopIteration as e:
+                self.return_value = e.value
+                raise StopIteration
+
+        self.last_chunk = chunk
+        return chunk
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._is_async:
+            chunk = await self.source.__anext__()
+        else:
+            is_next, chunk = await self._next_in_thread()
+            if not is_next:
+                raise StopAsyncIteration
+
+        self.last_chunk = chunk
+        return chunk
+
+    def _run_async(self, coroutine):
+        if self._loop is not None and self._loop.is_running():
+            return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+        if self._private_loop is None:
+            self._private_loop = asyncio.new_event_loop()
+        return self._private_loop.run_until_complete(coroutine)
+
+    def _close_private_loop(self):
+        if self._private_loop is not None:
+            self._private_loop.run_until_complete(self._private_loop.shutdown_asyncgens())
+            self._private_loop.close()
+            self._private_loop = None
+
+    async def _next_in_thread(self) -> tuple:
+        return await ex.call_async(self._pool, self._next_or_stop)
+
+    def _next_or_stop(self) -> tuple:
+        # StopIteration can not be raised into a future, so the end of the stream is returned as a flag
+        try:
+            return True, next(self.source)
+        except StopIteration as e:
+            self.return_value = e.value
+            return False, None
+
+
+def _is_loop_thread(loop: asyncio.AbstractEventLoop) -> bool:
+    try:
+        return asyncio.get_running_loop() is loop
+    except RuntimeError:
+        return False
+
+
+def to_stream(value, loop: asyncio.AbstractEventLoop = None, pool: ex.ThreadPool = None) -> SkillStream:
+    """
+    Wrap the value for the stream consumer. A single value is passed as a stream of one chunk
+    :param value: Stream, generator or value
+    :param loop:
+    :param pool:
+    :return:
+    """
+    if isinstance(value, SkillStream):
+        return value
+    if inspect.isgenerator(value) or inspect.isasyncgen(value):
+        return SkillStream(value, loop, pool)
+    return SkillStream(iter((value,)), loop, pool)
@@ -1,6 +1,8 @@
 #############################################################
 # Classes - environments
 #############################################################
+import threading as th
+
 import sidusai.core.utils as utils
 
 
@@ -38,24 +40,71 @@ class AgentTask:
         """
         pass
 
+    def on_chunk(self, value: AgentValue, *args, **kwargs) -> None:
+        """
+        Getting a chunk of the streaming skill (e.g. a part of the generated message) before the final result
+        :param value:
+        :return:
+        """
+        pass
+
 
 #############################################################
 # Helper classes - data types
 #############################################################
 
+class TaskCompletion:
+    """
+    The skill result completing the task: the remaining skills of the chain are skipped,
+    the value is the task result. In the skill DAG the value is the skill result, the other skills are executed.
+    """
+
+    __slots__ = ('value',)
+
+    def __init__(self, value: AgentValue):
+        self.value = value
+
+
+def complete_task(value: AgentValue) -> TaskCompletion:
+    """
+    Complete the task with the value, skipping the remaining skills of the chain.
+    Return it from the skill, e.g. when the answer is found in the cache
+    :param value: Task result
+    :return:
+    """
+    return TaskCompletion(value)
+
+
+def unwrap_completion(value):
+    return value.value if isinstance(value, TaskCompletion) else value
+
+
 class TaskContainer:
     """
     Graph caching configuration for a registered task
     """
 
-    def __init__(self, task_type: type, task_name: str, available_skill_name: [str]):
+    def __init__(self, task_type: type, task_name: str, available_skill_name: [str],
+                 skill_dag: dict = None, branch_timeouts: dict = None):
         self.task_type = task_type
         self.task_name = task_name
         self.available_skill_names = available_skill_name
 
+        # Skill DAG declaration. Tasks with the skill DAG have no skill graph
+        self.skill_dag = skill_dag
+        self.branch_timeouts = branch_timeouts
+        self.dag = None
+
         self.skill_graph = None
         self.executable_init = None
 
+        # Pair (graph version, skill chain resolved for the version), replaced as a whole
+        # so that concurrent tasks never read the chain of one version with another version
+        self.skill_chain = (None, ())
+        self.executable_forward = None
+        self.executable_on_complete = None
+        self.executable_on_chunk = None
+
 
 class LoopContainer:
     """
@@ -72,19 +121,28 @@ class LoopContainer:
 
 
 class ExceptionHandlerContainer:
+    """
+    Container of the exception handler. Detached handlers are executed in the thread pool
+    and do not hold the worker of the failed task
+    """
 
-    def __init__(self, executable, error_types: list = None):
+    def __init__(self, executable, error_types: list = None, is_detached: bool = False):
         if error_types is None:
             error_types = []
         self.order = executable.order
         self.error_types = error_types
         self.executable = executable
+        self.is_detached = is_detached
 
 
 class NamedTypedContainer:
     """
     A container that provides access to content by name or by object type.
     Don't use primitive data types for storage in container
+
+    Lookups by type are cached, including subclass matches and misses, so a lookup does not depend on
+    the number of stored objects. Changes are serialized and replace the indexes as a whole,
+    so the container can be read from several threads while tasks are running.
     """
 
     def __init__(self):
@@ -93,6 +151,16 @@ class NamedTypedContainer:
         self.types = {}
         self.names = {}
 
+        # Reverse index: name of the object by its index
+        self.index_names = {}
+
+        # Cache of resolved type lookups: index of the object or None for types without objects
+        self._resolved_types = {}
+        self._lock = th.Lock()
+
+        # Incremented on each change. Used to invalidate data compiled for the container
+        self.version = 0
+
     def put(self, obj, key, _type: type = None):
         """
         Put object to container
@@ -110,26 +178,31 @@ class NamedTypedContainer:
         if _type is None:
             _type = self._get_type_from_object(obj)
 
-        _index_type = self._get_index(_type)
-        _index_key = self._get_index(key)
+        with self._lock:
+            _index_type = self._get_index(_type)
+            _index_key = self._get_index(key)
 
-        if _index_key != _index_type and _index_type is not None and _index_key is not None:
-            raise ValueError('An object of this type is already registered under a different name.')
+            if _index_key != _index_type and _index_type is not None and _index_key is not None:
+                raise ValueError('An object of this type is already registered under a different name.')
 
-        if _index_key is not None and _index_type is None:
-            raise ValueError('Another object with the same name is already registered.')
+            if _index_key is not None and _index_type is None:
+                raise ValueError('Another object with the same name is already registered.')
 
-        if _index_key is None and _index_type is not None:
-            raise ValueError('An object of this type is already registered under a different name.')
+            if _index_key is None and _index_type is not None:
+                raise ValueError('An object of this type is already registered under a different name.')
 
-        if _index_type is None:
-            self.container.append(obj)
-        else:
-            self.container[_index_type] = obj
-        _index = len(self.container) - 1 if _index_type is None else _index_type
+            if _index_type is None:
+                self.container.append(obj)
+            else:
+                self.container[_index_type] = obj
+            _index = len(self.container) - 1 if _index_type is None else _index_type
 
-        self.types[_type] = _index
-        self.names[key] = _index
+            # Indexes are replaced, readers keep using the previous ones until the end of the lookup
+            self.types = {**self.types, _type: _index}
+            self.names = {**self.names, key: _index}
+            self.index_names = {**self.index_names, _index: key}
+            self._resolved_types = {}
+            self.version += 1
 
     def __getitem__(self, item):
         _index = self._get_index(item)
@@ -144,10 +217,10 @@ class NamedTypedContainer:
         return len(self.container)
 
     def __iter__(self):
+        index_names = self.index_names
         for _type, _index in self.types.items():
             _obj = self.container[_index]
-            _name = self.get_name_from_type(_type)
-            yield _name, _type, _obj
+            yield index_names[_index], _type, _obj
 
     def __contains__(self, item):
         _index = self._get_index(item)
@@ -155,10 +228,10 @@ class NamedTypedContainer:
 
     def get_name_from_type(self, _type):
         _index = self._get_index(_type)
-        _names = [k for k, v in self.names.items() if v == _index]
-        if len(_names) != 1:
+        _name = self.index_names.get(_index) if _index is not None else None
+        if _name is None:
             raise ValueError('A collision occurred. The object has multiple names or the name was not found.')
-        return _names[0]
+        return _name
 
     def _get_index(self, key):
         """
@@ -166,15 +239,21 @@ class NamedTypedContainer:
         :param key: name or type
         :return:
         """
-        if isinstance(key, str) and key in self.names.keys():
-            return self.names[key]
+        if isinstance(key, str):
+            return self.names.get(key)
+
         if isinstance(key, type):
-            if key in self.types.keys():
-                return self.types[key]
-            else:
+            resolved_types = self._resolved_types
+            if key in resolved_types:
+                return resolved_types[key]
+
+            types = self.types
+            _index = types.get(key)
+            if _index is None:
                 # Find subclass
-                _types = [v for k, v in self.types.items() if issubclass(k, key)]
-                return _types[0] if len(_types) > 0 else None
+                _index = next((v for k, v in types.items() if issubclass(k, key)), None)
+            resolved_types[key] = _index
+            return _index
 
         return None
 
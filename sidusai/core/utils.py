@@ -1,4 +1,9 @@
-import re, os, time, importlib.util
+import re, os, time, json, importlib.util
+
+# Fast JSON backend, used if installed
+__orjson__ = importlib.util.find_spec('orjson') is not None
+if __orjson__:
+    import orjson
 
 
 def camel_to_snake(name):
@@ -19,6 +24,18 @@ def validate_modules(module_names: [str]):
             )
 
 
+def json_loads(data: bytes | str):
+    """
+    Parse JSON from bytes or string. The orjson module is used if installed, bytes are parsed
+    without decoding to an intermediate string.
+    :param data:
+    :return:
+    """
+    if __orjson__:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
 def make_dir_if_not_exist(dir_name):
     """
     Create folder if not exist for files and folders
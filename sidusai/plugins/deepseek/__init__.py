@@ -13,19 +13,47 @@ __deepseek_agent_name__ = 'ds_ai_agent_name'
 class DeepSeekPlugin(sai.AgentPlugin):
 
     def __init__(self, api_key, temperature: float = None, top_p: float = None,
-                 max_tokens: float = None, model_name: str = None):
+                 max_tokens: float = None, model_name: str = None, base_url: str = None,
+                 connect_timeout_sec: float = 10, read_timeout_sec: float = 120, max_retries: int = 3,
+                 use_async: bool = False, max_in_flight: int = 256, response_cache: sai.ResponseCache = None,
+                 rate_limiter: sai.RateLimiter = None):
+        """
+        :param use_async: Register the async client component and the async chat skill (requires aiohttp)
+        :param max_in_flight: Maximum number of requests in flight of the async client
+        :param response_cache: Persistent cache of the responses of deterministic requests (zero temperature)
+        :param rate_limiter: Rate limiter of the requests per second and the tokens per minute, shared by
+        the synchronous and async clients. Limits can be changed at runtime with set_limits
+        """
         super().__init__()
 
         self.api_key = api_key
+        self.use_async = use_async
+        self.max_in_flight = max_in_flight
+        self.response_cache = response_cache
+        self.rate_limiter = rate_limiter
+        self.base_url = base_url
+        self.connect_timeout_sec = connect_timeout_sec
+        self.read_timeout_sec = read_timeout_sec
+        self.max_retries = max_retries
+        self.pool_max_size = None
         self.temperature = temperature
         self.top_p = top_p
         self.max_tokens = max_tokens
         self.model_name = model_name
 
     def apply_plugin(self, agent: sai.Agent):
+        # Each worker thread can hold a connection
+        self.pool_max_size = agent.thread_pool.pool_max_size
         agent.add_component_builder(self._build_deep_seek_connection)
+        agent.add_component_builder(self._build_prompt_cache_stats)
 
         agent.add_skill(skills.ds_chat_transform_skill)
+        agent.add_skill(skills.ds_chat_stream_skill)
+
+        if self.use_async:
+            sai.utils.validate_modules(['aiohttp'])
+            agent.add_component_builder(self._build_async_deep_seek_connection)
+            agent.add_skill(skills.ds_chat_transform_skill_async)
 
     def _build_deep_seek_connection(self) -> components.DeepSeekClientComponent:
         return components.DeepSeekClientComponent(
@@ -33,10 +61,44 @@ class DeepSeekPlugin(sai.AgentPlugin):
             temperature=self.temperature,
             top_p=self.top_p,
             max_tokens=self.max_tokens,
-            model_name=self.model_name
+            model_name=self.model_name,
+            base_url=self.base_url,
+            pool_max_size=self.pool_max_size,
+            response_cache=self.response_cache,
+            connect_timeout_sec=self.connect_timeout_sec,
+            read_timeout_sec=self.read_timeout_sec,
+            max_retries=self.max_retries,
+            rate_limiter=self.rate_limiter
+        )
+
+    def _build_prompt_cache_stats(self) -> components.PromptCacheStats:
+        return components.PromptCacheStats()
+
+    def _build_async_deep_seek_connection(self) -> components.AsyncDeepSeekClientComponent:
+        return components.AsyncDeepSeekClientComponent(
+            api_key=self.api_key,
+            temperature=self.temperature,
+            top_p=self.top_p,
+            max_tokens=self.max_tokens,
+            model_name=self.model_name,
+            base_url=self.base_url,
+            max_in_flight=self.max_in_flight,
+            connect_timeout_sec=self.connect_timeout_sec,
+            read_timeout_sec=self.read_timeout_sec,
+            max_retries=self.max_retries,
+            rate_limiter=self.rate_limiter
         )
 
 
+def get_prompt_cache_stats(agent: sai.Agent) -> components.PromptCacheStats | None:
+    """
+    Prompt cache usage of the DeepSeek requests of the agent, in total and by user
+    :param agent: Agent with the applied DeepSeek plugin
+    :return: Statistics, None if the agent is not built yet
+    """
+    return agent.ctx.components[components.PromptCacheStats]
+
+
 class DeepSeekChatTask(sai.CompletedAgentTask):
     pass
 
@@ -45,18 +107,33 @@ class DeepSeekSingleChatAgent(sai.Agent):
 
     def __init__(self, api_key, system_prompt: str = None, prepare_task_skills: [] = None,
                  temperature: float = None, top_p: float = None,
-                 max_tokens: float = None, model_name: str = None):
+                 max_tokens: float = None, model_name: str = None, base_url: str = None, stream: bool = False,
+                 use_async: bool = False, token_budget: sai.TokenBudget = None, rate_limiter: sai.RateLimiter = None):
+        """
+        :param stream: Stream the generated messages. Chunks are passed to the chunk handler of send_to_chat
+        :param use_async: Use the async client (requires aiohttp). Messages are sent with send_to_chat_async
+        in the event loop, requests in flight do not hold threads; send_to_chat raises RuntimeError
+        :param token_budget: Token budget of the chat requests. Older turns of the chat are dropped
+        (or folded) to fit the budget, the system prompt and the recent turns are kept. Set the block size
+        of the budget to keep the prompt prefix cached by DeepSeek between the trims
+        :param rate_limiter: Rate limiter of the chat requests
+        """
         super().__init__(__deepseek_agent_name__)
 
         self.system_prompt = system_prompt
-        self.chat = sai.ChatAgentValue([])
+        # Chat requests are sent by the async skill
+        self._is_async_chat = use_async and not stream
+        self.chat = sai.ChatAgentValue([], token_budget=token_budget)
 
         ds_plugin = DeepSeekPlugin(
             api_key=api_key,
             temperature=temperature,
             top_p=top_p,
             max_tokens=max_tokens,
-            model_name=model_name
+            model_name=model_name,
+            base_url=base_url,
+            use_async=use_async,
+            rate_limiter=rate_limiter
         )
 
         ds_plugin.apply_plugin(self)
@@ -64,15 +141,38 @@ class DeepSeekSingleChatAgent(sai.Agent):
             self.chat.append_system(system_prompt)
 
         task_skills = prepare_task_skills if prepare_task_skills is not None else []
-        task_skills.append(skills.ds_chat_transform_skill)
+        if stream:
+            task_skills.append(skills.ds_chat_stream_skill)
+        elif use_async:
+            task_skills.append(skills.ds_chat_transform_skill_async)
+        else:
+            task_skills.append(skills.ds_chat_transform_skill)
 
         task_skill_names = _cp.build_and_register_task_skill_names(task_skills, self)
         self.task_registration(DeepSeekChatTask, skill_names=task_skill_names)
 
-    def send_to_chat(self, message: str, handler):
+    def send_to_chat(self, message: str, handler=None, chunk_handler=None) -> sai.TaskFuture:
+        if message is None:
+            raise ValueError('Message can not be None')
+        if self._is_async_chat:
+            # Each synchronous execution of the async skill would run in a new event loop with a new session
+            raise RuntimeError('The agent uses the async client, send messages with send_to_chat_async')
+
+        self.chat.append_user(message)
+        task = DeepSeekChatTask(self).data(self.chat).then(handler).stream(chunk_handler)
+        return self.task_execute(task)
+
+    def get_prompt_cache_hit_ratio(self) -> float | None:
+        """
+        :return: Share of the prompt tokens of the chat requests served from the DeepSeek cache
+        """
+        stats = get_prompt_cache_stats(self)
+        return stats.get_hit_ratio() if stats is not None else None
+
+    async def send_to_chat_async(self, message: str, handler=None, chunk_handler=None) -> sai.ChatAgentValue:
         if message is None:
             raise ValueError('Message can not be None')
 
         self.chat.append_user(message)
-        task = DeepSeekChatTask(self).data(self.chat).then(handler)
-        self.task_execute(task)
+        task = DeepSeekChatTask(self).data(self.chat).then(handler).stream(chunk_handler)
+        return await self.task_execute_async(task)
@@ -1,9 +1,28 @@
+import asyncio
+import collections
 import requests
 import json
+import threading as th
 
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from sidusai.core.cache import ResponseCache
+from sidusai.core.limiter import RateLimiter
 from sidusai.core.plugin import ChatAgentValue
+from sidusai.core.utils import validate_modules, json_loads
+
+__default_base_url__ = 'https://api.deepseek.com'
+__chat_completions_path__ = '/chat/completions'
 
-__default_utl__ = 'https://api.deepseek.com/chat/completions'
+# Connection params
+__default_pool_max_size__ = 16
+__default_connect_timeout_sec__ = 10
+__default_read_timeout_sec__ = 120
+__default_max_retries__ = 3
+__default_retry_backoff_sec__ = 0.5
+__retry_status_codes__ = [429, 500, 502, 503, 504]
+__default_max_in_flight__ = 256
 
 # Default text generation params
 __default_deepseek_model__ = 'deepseek-chat'
@@ -13,76 +32,330 @@ __default_top_p__ = 1
 __frequency_penalty__ = 0
 __presence_penalty__ = 0
 
+# Maximum number of bytes read from the event stream at once
+__sse_read_size__ = 8192
+
+# Maximum number of users with prompt cache statistics, the least recently active users are evicted
+__default_cache_stats_max_users__ = 10000
+
 
 class DeepSeekResponse:
+    """
+    Chat completion response. Fields absent in the response object are None, the messages
+    of the choices are extracted on first access.
+    """
+
+    __slots__ = (
+        'status_code', 'id', 'object', 'created', 'model', 'system_fingerprint',
+        'prompt_tokens', 'completion_tokens', 'total_tokens', 'prompt_cache_hit_tokens', 'prompt_cache_miss_tokens',
+        'choices', 'is_cached', '_messages'
+    )
+
+    def __init__(self, response: requests.Response | None, obj: dict = None, status_code: int = None,
+                 body: bytes = None, is_cached: bool = False):
+        """
+        :param response: HTTP response
+        :param obj: Response object. If not set, it is parsed from the response body
+        :param status_code: Status code of the response received without requests (e.g. by the async client)
+        :param body: Body of the response received without requests
+        :param is_cached: The response is taken from the response cache, its usage is not spent
+        """
+        if obj is None:
+            obj = json_loads(body if body is not None else response.content)
+
+        self.status_code = status_code if status_code is not None else response.status_code
+        self.id = obj.get('id')
+        self.object = obj.get('object')
+        self.created = obj.get('created')
+        self.model = obj.get('model')
+        self.system_fingerprint = obj.get('system_fingerprint')
+
+        usage = obj.get('usage') or {}
+        self.prompt_tokens = usage.get('prompt_tokens')
+        self.completion_tokens = usage.get('completion_tokens')
+        self.total_tokens = usage.get('total_tokens')
+        self.prompt_cache_hit_tokens = usage.get('prompt_cache_hit_tokens')
+        self.prompt_cache_miss_tokens = usage.get('prompt_cache_miss_tokens')
+
+        self.choices = obj.get('choices') or []
+        self.is_cached = is_cached
+        self._messages = None
+
+    @property
+    def messages(self) -> list:
+        if self._messages is None:
+            self._messages = [choice['message'] for choice in self.choices]
+        return self._messages
+
+    @property
+    def last_message(self) -> dict | None:
+        return self.choices[-1]['message'] if len(self.choices) > 0 else None
+
 
-    def __init__(self, response: requests.Response):
-        obj = json.loads(response.text)
-
-        self.status_code = response.status_code
-        # Convert JSON to object
-        self.id = obj['id'] if 'id' in obj else None
-        self.object = obj['object'] if 'object' in obj else None
-        self.created = obj['created'] if 'created' in obj else None
-        self.model = obj['model'] if 'model' in obj else None
-        self.system_fingerprint = obj['system_fingerprint'] if 'system_fingerprint' in obj else None
-
-        if 'usage' in obj:
-            usage = obj['usage']
-            self.prompt_tokens = usage['prompt_tokens'] \
-                if 'prompt_tokens' in usage else None
-            self.completion_tokens = usage['completion_tokens'] \
-                if 'completion_tokens' in usage else None
-            self.total_tokens = usage['total_tokens'] \
-                if 'total_tokens' in usage else None
-            self.prompt_cache_hit_tokens = usage['prompt_cache_hit_tokens'] \
-                if 'prompt_cache_hit_tokens' in usage else None
-            self.prompt_cache_miss_tokens = usage['prompt_cache_miss_tokens'] \
-                if 'prompt_cache_miss_tokens' in usage else None
-
-        self.choices = []
-        self.messages = []
-        self.last_message = None
-
-        if 'choices' in obj:
-            choices = obj['choices']
-            self.choices = choices
-            self.messages = []
-            for choice in choices:
-                self.messages.append(choice['message'])
-
-            message_len = len(self.messages)
-            if message_len > 0:
-                self.last_message = self.messages[message_len - 1]
-
-
-class DeepSeekClientComponent:
+class PromptCacheCounter:
     """
-    A class-component that wraps data and connection information. It is used for
-    formation and subsequent use in the context of the application core.
+    Prompt cache hit and miss tokens of the requests
+    """
+
+    __slots__ = ('requests', 'hit_tokens', 'miss_tokens')
+
+    def __init__(self):
+        self.requests = 0
+        self.hit_tokens = 0
+        self.miss_tokens = 0
+
+    @property
+    def hit_ratio(self) -> float | None:
+        """
+        :return: Share of the prompt tokens served from the cache, None if no tokens are recorded
+        """
+        tokens = self.hit_tokens + self.miss_tokens
+        return self.hit_tokens / tokens if tokens > 0 else None
+
+    def add(self, hit_tokens: int, miss_tokens: int):
+        self.requests += 1
+        self.hit_tokens += hit_tokens
+        self.miss_tokens += miss_tokens
+
+    def to_dict(self) -> dict:
+        return {
+            'requests': self.requests,
+            'hit_tokens': self.hit_tokens,
+            'miss_tokens': self.miss_tokens,
+            'hit_ratio': self.hit_ratio,
+        }
+
+
+class PromptCacheStats:
+    """
+    A class-component collecting the prompt cache usage of the DeepSeek requests of the agent,
+    in total and by user. The user of the request is the user_id attribute of the chat value
+    (e.g. of the Telegram chat), requests without it are counted in the total only.
+    """
+
+    def __init__(self, max_users: int = __default_cache_stats_max_users__):
+        """
+        :param max_users: Maximum number of users with statistics
+        """
+        self.max_users = max_users
+        self.total = PromptCacheCounter()
+        self.users = collections.OrderedDict()
+        self._lock = th.Lock()
+
+    def record(self, response: DeepSeekResponse, user_id=None):
+        """
+        Add the prompt cache usage of the response. Responses without the usage are ignored
+        :param response:
+        :param user_id:
+        :return:
+        """
+        if response.prompt_cache_hit_tokens is None and response.prompt_cache_miss_tokens is None:
+            return
+        hit_tokens = response.prompt_cache_hit_tokens or 0
+        miss_tokens = response.prompt_cache_miss_tokens or 0
+
+        with self._lock:
+            self.total.add(hit_tokens, miss_tokens)
+            if user_id is None:
+                return
+
+            counter = self.users.get(user_id)
+            if counter is None:
+                counter = PromptCacheCounter()
+                self.users[user_id] = counter
+                if len(self.users) > self.max_users:
+                    self.users.popitem(last=False)
+            else:
+                self.users.move_to_end(user_id)
+            counter.add(hit_tokens, miss_tokens)
+
+    def get_hit_ratio(self, user_id=None) -> float | None:
+        """
+        :param user_id: User, the total ratio of the agent if not set
+        :return: Share of the prompt tokens served from the cache
+        """
+        counter = self.total if user_id is None else self.users.get(user_id)
+        return counter.hit_ratio if counter is not None else None
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                'total': self.total.to_dict(),
+                'users': {user_id: counter.to_dict() for user_id, counter in self.users.items()},
+            }
+
+
+class DeepSeekStreamCompletion:
+    """
+    Assembles the chat completion object from the chunks of the stream
+    """
+
+    def __init__(self):
+        self.obj = {}
+        self.choices = {}
+
+    def add_chunk(self, chunk: dict) -> str | None:
+        """
+        Add the stream chunk
+        :param chunk: Chunk object (chat.completion.chunk)
+        :return: Content delta of the first choice
+        """
+        for key in ['id', 'created', 'model', 'system_fingerprint']:
+            if chunk.get(key) is not None:
+                self.obj[key] = chunk[key]
+        if chunk.get('usage') is not None:
+            self.obj['usage'] = chunk['usage']
+
+        content = None
+        for choice in chunk.get('choices') or []:
+            index = choice.get('index', 0)
+            message = self.choices.setdefault(index, {'index': index, 'message': {}, 'finish_reason': None})
+            delta = choice.get('delta') or {}
+            for key, value in delta.items():
+                if value is None:
+                    continue
+                if key in ['content', 'reasoning_content']:
+                    message['message'][key] = message['message'].get(key, '') + value
+                else:
+                    message['message'][key] = value
+            if choice.get('finish_reason') is not None:
+                message['finish_reason'] = choice['finish_reason']
+            if index == 0 and delta.get('content'):
+                content = delta['content']
+        return content
+
+    def to_object(self) -> dict:
+        obj = dict(self.obj)
+        obj['object'] = 'chat.completion'
+        obj['choices'] = [self.choices[i] for i in sorted(self.choices)]
+        for choice in obj['choices']:
+            choice['message'].setdefault('role', 'assistant')
+        return obj
+
+
+def build_session(pool_max_size: int, max_retries: int, retry_backoff_sec: float) -> requests.Session:
+    """
+    Build the HTTP session with the pool of kept-alive connections and retries with backoff
+    :param pool_max_size: Maximum number of connections kept in the pool
+    :param max_retries: Number of retries
+    :param retry_backoff_sec: Backoff factor of retries
+    :return:
+    """
+    retry = Retry(
+        total=max_retries,
+        backoff_factor=retry_backoff_sec,
+        status_forcelist=__retry_status_codes__,
+        # Completion requests rejected by the server are retried. Requests failed while reading the response
+        # are not, the completion could be already generated
+        allowed_methods=None,
+        read=0,
+        respect_retry_after_header=True,
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_max_size, max_retries=retry)
+
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def iter_sse_data(response: requests.Response):
+    """
+    Iterate over the data of server-sent events until the [DONE] event
+    :param response: Streamed HTTP response
+    :return: Generator of event data strings
+    """
+    data = []
+    for line in _iter_sse_lines(response):
+        if line == '':
+            # End of the event
+            if len(data) > 0:
+                event = '\n'.join(data)
+                data = []
+                if event == '[DONE]':
+                    return
+                yield event
+            continue
+        if line.startswith(':'):
+            # Comment, e.g. keep-alive
+            continue
+
+        field, _, value = line.partition(':')
+        if field == 'data':
+            data.append(value[1:] if value.startswith(' ') else value)
+
+
+def _iter_sse_lines(response: requests.Response):
+    # Data is read as it arrives: chunks of the chunked response, or the available bytes of the plain response
+    raw = response.raw
+    if getattr(raw, 'chunked', False) or not hasattr(raw, 'read1'):
+        contents = response.iter_content(chunk_size=None)
+    else:
+        contents = iter(lambda: raw.read1(__sse_read_size__, decode_content=True), b'')
+
+    buffer = b''
+    for content in contents:
+        buffer += content
+        *lines, buffer = buffer.split(b'\n')
+        for line in lines:
+            # The event stream is always UTF-8
+            yield line.rstrip(b'\r').decode('utf-8')
+    if len(buffer) > 0:
+        yield buffer.rstrip(b'\r').decode('utf-8')
+    # End of the last event
+    yield ''
+
+
+class DeepSeekClientBase:
+    """
+    Connection information and request building, shared by the synchronous and async clients
     """
 
     params: dict = {}
 
-    def __init__(self, api_key: str, model_name: str = None, **kwargs):
+    def __init__(self, api_key: str, model_name: str = None, base_url: str = None,
+                 connect_timeout_sec: float = __default_connect_timeout_sec__,
+                 read_timeout_sec: float = __default_read_timeout_sec__,
+                 max_retries: int = __default_max_retries__,
+                 retry_backoff_sec: float = __default_retry_backoff_sec__, rate_limiter: RateLimiter = None,
+                 **kwargs):
+        """
+        :param api_key:
+        :param model_name:
+        :param base_url: API base url, e.g. url of a local stand-in server
+        :param connect_timeout_sec: Connection timeout
+        :param read_timeout_sec: Maximum time between received bytes of the response
+        :param max_retries: Number of retries of requests failed with 429 or 5xx status or connection error
+        :param retry_backoff_sec: Backoff factor of retries. Retry-After header of the response is honoured
+        :param rate_limiter: Rate limiter acquired before the requests, can be shared by the components.
+        Requests reserve the estimated prompt tokens and the maximum completion tokens, the reservation
+        is corrected by the usage of the response. The limiter is acquired once per request: retries
+        are not limited by it, they are delayed by the backoff and the Retry-After header
+        :param kwargs: Request params (temperature, top_p, max_tokens, etc.)
+        """
         self.api_key = api_key
 
         self.model_name = model_name if model_name is not None else __default_deepseek_model__
+        self.base_url = (base_url if base_url is not None else __default_base_url__).rstrip('/')
+        self.url = self.base_url + __chat_completions_path__
+        self.connect_timeout_sec = connect_timeout_sec
+        self.read_timeout_sec = read_timeout_sec
+        self.max_retries = max_retries
+        self.retry_backoff_sec = retry_backoff_sec
         self.params = kwargs
+        self.rate_limiter = rate_limiter
 
-    def request(self, chat: ChatAgentValue) -> DeepSeekResponse:
-        payload = json.dumps(self._build_payload(chat))
-        headers = self._build_headers()
+        # Request params without messages are encoded once, the messages are spliced in front of them
+        self._params_json = self._encode_params(self._build_params())
 
-        response = requests.request('POST', __default_utl__, headers=headers, data=payload)
-        return DeepSeekResponse(response)
+        max_tokens = self._build_params()['max_tokens']
+        self._completion_tokens = max_tokens if max_tokens is not None else __default_max_tokens__
 
-    def _build_payload(self, chat: ChatAgentValue):
+    def _build_params(self) -> dict:
         # TODO: Expand the configurability of the request
 
-        messages = [{'role': v['role'], 'content': v['content']} for v in chat.messages]
         default_payload = {
-            "messages": messages,
             "model": self.model_name,
             "frequency_penalty": __frequency_penalty__,
             "max_tokens": __default_max_tokens__,
@@ -103,9 +376,221 @@ class DeepSeekClientComponent:
 
         return {key: self.params[key] if key in self.params else default_payload[key] for key in default_payload}
 
+    def _build_payload(self, chat: ChatAgentValue, params: dict = None) -> bytes:
+        """
+        Encode the request payload. The cached JSON of the chat messages is spliced with the encoded params
+        :param chat:
+        :param params: Request params, the default params are used if not set
+        :return: JSON of the payload
+        """
+        params_json = self._params_json if params is None else self._encode_params(params)
+        return chat.request_messages_json(b'{"messages": [', params_json)
+
+    @staticmethod
+    def _encode_params(params: dict) -> bytes:
+        # End of the messages array and members of the payload object after it: '], "model": ...}'
+        return b'], ' + json.dumps(params)[1:].encode('utf-8')
+
+    def _estimate_tokens(self, chat: ChatAgentValue) -> int:
+        return chat.estimate_tokens() + self._completion_tokens
+
+    def _acquire(self, chat: ChatAgentValue) -> int:
+        """
+        Wait for the rate limiter
+        :param chat:
+        :return: Reserved tokens
+        """
+        if self.rate_limiter is None:
+            return 0
+        return self.rate_limiter.acquire(self._estimate_tokens(chat))
+
+    def _reconcile(self, reserved_tokens: int, response: DeepSeekResponse):
+        if self.rate_limiter is not None:
+            self.rate_limiter.reconcile(reserved_tokens, response.total_tokens)
+
     def _build_headers(self):
         return {
             'Content-Type': 'application/json',
             'Accept': 'application/json',
             'Authorization': f'Bearer {self.api_key}'
         }
+
+
+class DeepSeekClientComponent(DeepSeekClientBase):
+    """
+    A class-component that wraps data and connection information. It is used for
+    formation and subsequent use in the context of the application core.
+    """
+
+    def __init__(self, api_key: str, model_name: str = None, base_url: str = None,
+                 pool_max_size: int = __default_pool_max_size__, response_cache: ResponseCache = None, **kwargs):
+        """
+        :param pool_max_size: Maximum number of kept-alive connections. Should match the number of
+        threads executing requests (the agent pool size)
+        :param response_cache: Persistent cache of the responses. Used for deterministic requests only
+        (zero temperature), successful responses are cached by the url and the payload
+        :param kwargs: Connection and request params (see DeepSeekClientBase)
+        """
+        super().__init__(api_key, model_name, base_url, **kwargs)
+        self.timeout = (self.connect_timeout_sec, self.read_timeout_sec)
+        self.session = build_session(pool_max_size, self.max_retries, self.retry_backoff_sec)
+
+        self.response_cache = response_cache
+        self.is_deterministic = self._build_params()['temperature'] == 0
+
+    def request(self, chat: ChatAgentValue) -> DeepSeekResponse:
+        payload = self._build_payload(chat)
+        headers = self._build_headers()
+
+        cache_key = None
+        if self.response_cache is not None and self.is_deterministic:
+            cache_key = ResponseCache.build_key(self.url, payload)
+            body = self.response_cache.get(cache_key)
+            if body is not None:
+                return DeepSeekResponse(None, status_code=200, body=body, is_cached=True)
+
+        reserved_tokens = self._acquire(chat)
+        response = self.session.post(self.url, headers=headers, data=payload, timeout=self.timeout)
+        if cache_key is not None and response.status_code == 200:
+            self.response_cache.put(cache_key, response.content)
+
+        deep_seek_response = DeepSeekResponse(response)
+        self._reconcile(reserved_tokens, deep_seek_response)
+        return deep_seek_response
+
+    def request_stream(self, chat: ChatAgentValue):
+        """
+        Request the chat completion as a stream of server-sent events.
+        :param chat:
+        :return: Generator yielding content deltas. The generator returns the assembled response
+        with the usage of the request
+        """
+        params = self._build_params()
+        params['stream'] = True
+        params['stream_options'] = {'include_usage': True}
+        payload = self._build_payload(chat, params)
+        headers = self._build_headers()
+        headers['Accept'] = 'text/event-stream'
+
+        reserved_tokens = self._acquire(chat)
+        with self.session.post(
+                self.url, headers=headers, data=payload, timeout=self.timeout, stream=True
+        ) as response:
+            if response.status_code != 200:
+                deep_seek_response = DeepSeekResponse(response)
+                self._reconcile(reserved_tokens, deep_seek_response)
+                return deep_seek_response
+
+            completion = DeepSeekStreamCompletion()
+            for data in iter_sse_data(response):
+                delta = completion.add_chunk(json_loads(data))
+                if delta is not None:
+                    yield delta
+
+            deep_seek_response = DeepSeekResponse(response, completion.to_object())
+            self._reconcile(reserved_tokens, deep_seek_response)
+            return deep_seek_response
+
+    def close(self):
+        self.session.close()
+
+
+class AsyncDeepSeekClientComponent(DeepSeekClientBase):
+    """
+    Async client component for coroutine skills, requires the aiohttp module.
+
+    Requests of all coroutines share the pool of kept-alive connections, the number of requests
+    in flight is limited by the semaphore, the other requests wait for a free slot without blocking threads.
+    The session is bound to the event loop: the client is intended for the async runtime of the agent
+    (application_run_async, task_execute_async). A new event loop gets a new session, the session
+    of the previous loop is closed. Close the client before its loop is closed, the connections
+    of a closed loop can not be shut down gracefully.
+    """
+
+    def __init__(self, api_key: str, model_name: str = None, base_url: str = None,
+                 max_in_flight: int = __default_max_in_flight__, **kwargs):
+        """
+        :param max_in_flight: Maximum number of requests in flight, also the connection pool size
+        :param kwargs: Connection and request params (see DeepSeekClientBase)
+        """
+        validate_modules(['aiohttp'])
+        super().__init__(api_key, model_name, base_url, **kwargs)
+
+        if max_in_flight < 1:
+            raise ValueError('Maximum number of requests in flight must be greater than 0')
+        self.max_in_flight = max_in_flight
+
+        self._loop = None
+        self._session = None
+        self._semaphore = None
+
+    async def request(self, chat: ChatAgentValue) -> DeepSeekResponse:
+        import aiohttp
+
+        payload = self._build_payload(chat)
+        headers = self._build_headers()
+
+        reserved_tokens = 0
+        if self.rate_limiter is not None:
+            reserved_tokens = await self.rate_limiter.acquire_async(self._estimate_tokens(chat))
+
+        session, semaphore = await self._get_session()
+        async with semaphore:
+            attempt = 0
+            while True:
+                try:
+                    async with session.post(self.url, headers=headers, data=payload) as response:
+                        body = await response.read()
+                        if response.status not in __retry_status_codes__ or attempt >= self.max_retries:
+                            deep_seek_response = DeepSeekResponse(None, status_code=response.status, body=body)
+                            self._reconcile(reserved_tokens, deep_seek_response)
+                            return deep_seek_response
+                        delay = self._get_retry_delay(attempt, response.headers.get('Retry-After'))
+                except aiohttp.ClientConnectorError:
+                    # Requests failed while reading the response are not retried,
+                    # the completion could be already generated
+                    if attempt >= self.max_retries:
+                        raise
+                    delay = self._get_retry_delay(attempt, None)
+
+                attempt += 1
+                await asyncio.sleep(delay)
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def _get_session(self) -> tuple:
+        import aiohttp
+
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._loop is not loop or self._session.closed:
+            previous_session, previous_loop = self._session, self._loop
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.max_in_flight)
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_in_flight),
+                timeout=aiohttp.ClientTimeout(sock_connect=self.connect_timeout_sec, sock_read=self.read_timeout_sec)
+            )
+            # The new session is set before the await, so the concurrent requests do not replace it again
+            if previous_session is not None and not previous_session.closed:
+                await _close_session(previous_session, previous_loop)
+        return self._session, self._semaphore
+
+    def _get_retry_delay(self, attempt: int, retry_after: str | None) -> float:
+        if retry_after is not None:
+            try:
+                return max(float(retry_after), 0)
+            except ValueError:
+                # HTTP date is not supported, the backoff is used
+                pass
+        return self.retry_backoff_sec * (2 ** attempt)
+
+
+async def _close_session(session, loop: asyncio.AbstractEventLoop):
+    # The session is closed on its own loop if the loop is still running in another thread
+    if loop is not None and loop.is_running() and not loop.is_closed():
+        await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(session.close(), loop))
+    else:
+        await session.close()
@@ -1,11 +1,47 @@
-from sidusai.core.plugin import ChatAgentValue
-from sidusai.plugins.deepseek.components import DeepSeekClientComponent
+from typing import Iterator
 
+from sidusai.core.plugin import ChatAgentValue, ChatChunkAgentValue
+from sidusai.core.routing import report_skill_tokens
+from sidusai.plugins.deepseek.components import DeepSeekClientComponent, AsyncDeepSeekClientComponent, \
+    DeepSeekResponse, PromptCacheStats
 
-def ds_chat_transform_skill(value: ChatAgentValue, client: DeepSeekClientComponent) -> ChatAgentValue:
-    # TODO: Add general response processing to generate a messages stream
 
+def ds_chat_transform_skill(value: ChatAgentValue, client: DeepSeekClientComponent,
+                            cache_stats: PromptCacheStats) -> ChatAgentValue:
     response = client.request(value)
+    return _append_response(value, response, cache_stats)
+
+
+async def ds_chat_transform_skill_async(value: ChatAgentValue, client: AsyncDeepSeekClientComponent,
+                                        cache_stats: PromptCacheStats) -> ChatAgentValue:
+    response = await client.request(value)
+    return _append_response(value, response, cache_stats)
+
+
+def ds_chat_stream_skill(value: ChatAgentValue, client: DeepSeekClientComponent,
+                         cache_stats: PromptCacheStats) -> Iterator[ChatChunkAgentValue]:
+    """
+    Streaming chat skill. Yields chunks of the generated message, the complete message
+    is added to the chat at the end of the stream
+    """
+    stream = client.request_stream(value)
+    while True:
+        try:
+            delta = next(stream)
+        except StopIteration as e:
+            return _append_response(value, e.value, cache_stats)
+        yield ChatChunkAgentValue(delta)
+
+
+def _append_response(value: ChatAgentValue, response: DeepSeekResponse,
+                     cache_stats: PromptCacheStats) -> ChatAgentValue:
+    if not response.is_cached:
+        if response.total_tokens is not None:
+            report_skill_tokens(response.total_tokens)
+        # The stats are not registered if the skills are added to the agent without the plugin
+        if cache_stats is not None:
+            cache_stats.record(response, getattr(value, 'user_id', None))
+
     if response.last_message is not None and 'content' in response.last_message:
         content = response.last_message['content']
         value.append_assistant(content)
@@ -1,3 +1,5 @@
+import json
+
 import sidusai as sai
 import openai as ai
 
@@ -14,21 +16,51 @@ __presence_penalty__ = 0
 
 class OpenAiConnector:
 
-    def __init__(self, api_key: str, model_name: str = None):
+    def __init__(self, api_key: str, model_name: str = None, temperature: float = None,
+                 response_cache: sai.ResponseCache = None, rate_limiter: sai.RateLimiter = None):
+        """
+        :param api_key:
+        :param model_name:
+        :param temperature: Sampling temperature
+        :param response_cache: Persistent cache of the responses. Used for deterministic requests only
+        (zero temperature), completions are cached by the request params
+        :param rate_limiter: Rate limiter acquired before the requests, can be shared by the components
+        """
         self.api_key = api_key
         self.model_name = model_name if model_name is not None else __default_model_name__
+        self.temperature = temperature if temperature is not None else __default_temperature__
+        self.response_cache = response_cache
+        self.rate_limiter = rate_limiter
 
         self.client = ai.OpenAI(api_key=self.api_key)
 
-    def request(self, chat: sai.ChatAgentValue) -> ai.ChatCompletion:
-        messages = [{'role': v['role'], 'content': v['content']} for v in chat.messages]
-
-        return self.client.chat.completions.create(
-            model=self.model_name,
-            messages=messages,
-            temperature=__default_temperature__,
-            max_tokens=__default_max_tokens__,
-            top_p=__default_top_p__,
-            frequency_penalty=__frequency_penalty__,
-            presence_penalty=__presence_penalty__,
-        )
+    def request(self, chat: sai.ChatAgentValue) -> ai.types.chat.ChatCompletion:
+        params = {
+            'model': self.model_name,
+            'messages': chat.request_messages(),
+            'temperature': self.temperature,
+            'max_tokens': __default_max_tokens__,
+            'top_p': __default_top_p__,
+            'frequency_penalty': __frequency_penalty__,
+            'presence_penalty': __presence_penalty__,
+        }
+
+        cache_key = None
+        if self.response_cache is not None and self.temperature == 0:
+            cache_key = sai.ResponseCache.build_key(str(self.client.base_url), json.dumps(params, sort_keys=True))
+            body = self.response_cache.get(cache_key)
+            if body is not None:
+                return ai.types.chat.ChatCompletion.model_validate_json(body)
+
+        reserved_tokens = 0
+        if self.rate_limiter is not None:
+            reserved_tokens = self.rate_limiter.acquire(chat.estimate_tokens() + __default_max_tokens__)
+
+        completion = self.client.chat.completions.create(**params)
+        if self.rate_limiter is not None:
+            usage = completion.usage
+            self.rate_limiter.reconcile(reserved_tokens, usage.total_tokens if usage is not None else None)
+
+        if cache_key is not None:
+            self.response_cache.put(cache_key, completion.model_dump_json().encode('utf-8'))
+        return completion
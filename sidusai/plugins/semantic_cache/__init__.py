@@ -0,0 +1,77 @@
+import sidusai as sai
+
+__required_modules__ = ['numpy']
+sai.utils.validate_modules(__required_modules__)
+
+import sidusai.plugins.semantic_cache.skills as skills
+import sidusai.plugins.semantic_cache.components as components
+
+
+class SemanticCachePlugin(sai.AgentPlugin):
+    """
+    Semantic response cache. Insert the lookup skill before the LLM skill and the store skill after it:
+
+        task_skills = [skills.semantic_cache_lookup_skill, ds.skills.ds_chat_transform_skill,
+                       skills.semantic_cache_store_skill]
+
+    If the answer to a similar question is cached, the task is completed with it without the LLM request.
+    Only the last user message is compared: the system prompt and the previous turns are not part of the key.
+    """
+
+    def __init__(self, embedder, dim: int = components.__default_dim__,
+                 max_size: int = components.__default_max_size__,
+                 threshold: float = None,
+                 duplicate_threshold: float = components.__default_duplicate_threshold__, path: str = None):
+        """
+        :param embedder: Local embedding function from the text to the normalized vector of the dimension,
+        e.g. a sentence model. components.HashingEmbedder only matches the same questions
+        :param dim: Vector dimension
+        :param max_size: Maximum number of cached answers
+        :param threshold: Minimum similarity of the questions to reuse the answer, default depends on the embedder
+        :param duplicate_threshold: Minimum similarity of the questions to skip storing the new answer
+        :param path: Path of the persisted index (.npz), loaded at build and written by save_semantic_cache
+        """
+        super().__init__()
+
+        self.embedder = embedder
+        self.dim = dim
+        self.max_size = max_size
+        self.threshold = threshold
+        self.duplicate_threshold = duplicate_threshold
+        self.path = path
+
+    def apply_plugin(self, agent: sai.Agent):
+        agent.add_component_builder(self._build_semantic_cache)
+
+        agent.add_skill(skills.semantic_cache_lookup_skill)
+        agent.add_skill(skills.semantic_cache_store_skill)
+
+    def _build_semantic_cache(self) -> components.SemanticCache:
+        return components.SemanticCache(
+            embedder=self.embedder,
+            dim=self.dim,
+            max_size=self.max_size,
+            threshold=self.threshold,
+            duplicate_threshold=self.duplicate_threshold,
+            path=self.path
+        )
+
+
+def get_semantic_cache(agent: sai.Agent) -> components.SemanticCache | None:
+    """
+    :param agent: Agent with the applied semantic cache plugin
+    :return: Semantic cache, None if the agent is not built yet
+    """
+    return agent.ctx.components[components.SemanticCache]
+
+
+def save_semantic_cache(agent: sai.Agent, path: str = None):
+    """
+    Persist the semantic cache index of the agent
+    :param agent:
+    :param path: Archive path, the plugin path if not set
+    :return:
+    """
+    cache = get_semantic_cache(agent)
+    if cache is not None:
+        cache.save(path)
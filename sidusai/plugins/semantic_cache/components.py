@@ -0,0 +1,241 @@
+import os
+import re
+import threading as th
+import time
+import zlib
+
+import numpy as np
+
+__default_dim__ = 1024
+__default_max_size__ = 10000
+__default_threshold__ = 0.9
+# Lexical similarity of the questions differing in a single word is high, so the hashing threshold
+# only accepts the same questions written differently (case, punctuation)
+__hashing_threshold__ = 0.99
+__default_duplicate_threshold__ = 0.98
+
+__word_pattern__ = re.compile(r'\w+', re.UNICODE)
+
+
+class HashingEmbedder:
+    """
+    Local embedding function based on the hashing trick: words and word pairs of the text are hashed
+    into the signed buckets of the vector, the vector is normalized. Hashes are stable between processes,
+    so the vectors of the persisted index stay valid. The similarity is lexical: questions of the opposite
+    meaning differing in a single word ('ascending' and 'descending') are still similar, so the cache
+    with this embedder uses the strict threshold (__hashing_threshold__) and only reuses the answers
+    to the same questions. Use a semantic model to reuse the answers to the rephrased questions.
+    """
+
+    def __init__(self, dim: int = __default_dim__, ngram: int = 2):
+        """
+        :param dim: Vector dimension
+        :param ngram: Maximum number of consecutive words hashed together
+        """
+        if dim < 1:
+            raise ValueError('Vector dimension must be greater than 0')
+        self.dim = dim
+        self.ngram = ngram
+
+    def __call__(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        words = __word_pattern__.findall(text.lower())
+        for n in range(1, self.ngram + 1):
+            for i in range(len(words) - n + 1):
+                h = zlib.crc32(' '.join(words[i:i + n]).encode('utf-8'))
+                vector[h % self.dim] += 1.0 if (h >> 31) & 1 == 0 else -1.0
+
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+
+class SemanticIndex:
+    """
+    Bounded in-memory vector index of question and answer pairs. Vectors are normalized, the similarity is
+    the dot product (cosine similarity). If the index is full, the least recently used pair is replaced.
+    """
+
+    def __init__(self, dim: int = __default_dim__, max_size: int = __default_max_size__):
+        """
+        :param dim: Vector dimension
+        :param max_size: Maximum number of pairs
+        """
+        if max_size < 1:
+            raise ValueError('Index size must be greater than 0')
+
+        self.dim = dim
+        self.max_size = max_size
+        self.size = 0
+
+        self.vectors = np.zeros((max_size, dim), dtype=np.float32)
+        self.used_at = np.zeros(max_size, dtype=np.float64)
+        self.questions = [None] * max_size
+        self.answers = [None] * max_size
+
+    def search(self, vector: np.ndarray) -> tuple:
+        """
+        Find the most similar question
+        :param vector: Normalized question vector
+        :return: Pair (position, similarity), position is -1 if the index is empty
+        """
+        if self.size == 0:
+            return -1, 0.0
+        scores = self.vectors[:self.size] @ vector
+        position = int(np.argmax(scores))
+        return position, float(scores[position])
+
+    def touch(self, position: int):
+        self.used_at[position] = time.time()
+
+    def add(self, vector: np.ndarray, question: str, answer: str) -> int:
+        """
+        Add the pair, replacing the least recently used pair if the index is full
+        :return: Position of the pair
+        """
+        if self.size < self.max_size:
+            position = self.size
+            self.size += 1
+        else:
+            position = int(np.argmin(self.used_at))
+
+        self.vectors[position] = vector
+        self.questions[position] = question
+        self.answers[position] = answer
+        self.touch(position)
+        return position
+
+    def save(self, path: str):
+        """
+        Save the index to the NumPy archive. The archive is written to a temporary file and replaced,
+        so a concurrent reader never gets a partial index
+        :param path: Archive path (.npz)
+        :return:
+        """
+        directory = os.path.dirname(path)
+        if directory != '' and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+
+        temp_path = f'{path}.{os.getpid()}.tmp.npz'
+        np.savez(
+            temp_path,
+            vectors=self.vectors[:self.size],
+            used_at=self.used_at[:self.size],
+            questions=np.array(self.questions[:self.size], dtype=str),
+            answers=np.array(self.answers[:self.size], dtype=str),
+        )
+        os.replace(temp_path, path)
+
+    def load(self, path: str):
+        """
+        Load the pairs from the NumPy archive. If the archive has more pairs than the index size,
+        the most recently used pairs are loaded
+        :param path: Archive path (.npz)
+        :return:
+        """
+        with np.load(path, allow_pickle=False) as archive:
+            vectors = archive['vectors']
+            if vectors.shape[1] != self.dim:
+                raise ValueError(f'Index dimension {vectors.shape[1]} does not match the dimension {self.dim}')
+
+            order = np.argsort(archive['used_at'])[-self.max_size:]
+            self.size = len(order)
+            self.vectors[:self.size] = vectors[order]
+            self.used_at[:self.size] = archive['used_at'][order]
+            self.questions[:self.size] = [str(v) for v in archive['questions'][order]]
+            self.answers[:self.size] = [str(v) for v in archive['answers'][order]]
+
+
+class SemanticCache:
+    """
+    A class-component of the semantic response cache: answers of the questions similar to the question
+    are reused. The key is the last user message of the chat only: the system prompt and the previous turns
+    are ignored, so the cache suits single questions which do not depend on them, answered with the same
+    system prompt.
+    """
+
+    def __init__(self, embedder, dim: int = __default_dim__, max_size: int = __default_max_size__,
+                 threshold: float = None,
+                 duplicate_threshold: float = __default_duplicate_threshold__, path: str = None):
+        """
+        :param embedder: Function from the text to the normalized vector of the dimension, e.g. a local
+        sentence model. HashingEmbedder only matches the same questions
+        :param dim: Vector dimension
+        :param max_size: Maximum number of cached answers
+        :param threshold: Minimum similarity of the questions to reuse the answer. Default is
+        __hashing_threshold__ for HashingEmbedder and __default_threshold__ for other embedders
+        :param duplicate_threshold: Minimum similarity of the questions to treat the new pair as a duplicate,
+        duplicates are not added to the index
+        :param path: Path of the persisted index (.npz). The index is loaded if the file exists
+        """
+        if embedder is None:
+            raise ValueError('Embedder of the semantic cache is not set')
+        if threshold is None:
+            threshold = __hashing_threshold__ if isinstance(embedder, HashingEmbedder) else __default_threshold__
+        if not 0 < threshold <= 1:
+            raise ValueError('Similarity threshold must be in (0, 1]')
+
+        self.embedder = embedder
+        self.index = SemanticIndex(dim, max_size)
+        self.threshold = threshold
+        # A pair below the reuse threshold is never a duplicate, it could not be found otherwise
+        self.duplicate_threshold = max(duplicate_threshold, threshold)
+        self.path = path
+
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self._lock = th.Lock()
+
+        if path is not None and os.path.exists(path):
+            self.index.load(path)
+
+    def lookup(self, question: str) -> str | None:
+        """
+        :param question:
+        :return: Answer of the most similar question if the similarity reaches the threshold
+        """
+        vector = self.embedder(question)
+        with self._lock:
+            position, score = self.index.search(vector)
+            if position < 0 or score < self.threshold:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.index.touch(position)
+            return self.index.answers[position]
+
+    def store(self, question: str, answer: str):
+        vector = self.embedder(question)
+        with self._lock:
+            position, score = self.index.search(vector)
+            if position >= 0 and score >= self.duplicate_threshold:
+                self.index.touch(position)
+                return
+            self.index.add(vector, question, answer)
+            self.stores += 1
+
+    def save(self, path: str = None):
+        """
+        Persist the index
+        :param path: Archive path, the cache path if not set
+        :return:
+        """
+        path = path if path is not None else self.path
+        if path is None:
+            raise ValueError('Path of the semantic cache index is not set')
+        with self._lock:
+            self.index.save(path)
+
+    @property
+    def hit_ratio(self) -> float:
+        requests = self.hits + self.misses
+        return self.hits / requests if requests > 0 else 0.0
+
+    def stats(self) -> dict:
+        return {
+            'size': self.index.size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'stores': self.stores,
+            'hit_ratio': self.hit_ratio,
+        }
@@ -0,0 +1,34 @@
+import sidusai as sai
+
+from sidusai.plugins.semantic_cache.components import SemanticCache
+
+
+def semantic_cache_lookup_skill(value: sai.ChatAgentValue, cache: SemanticCache) -> sai.ChatAgentValue:
+    """
+    Answer the last user message from the cache. The task is completed with the cached answer,
+    the following skills (e.g. the LLM request) are skipped
+    """
+    message = value.messages[-1] if len(value.messages) > 0 else None
+    if message is None or message.get('role') != 'user' or not isinstance(message.get('content'), str):
+        return value
+
+    answer = cache.lookup(message['content'])
+    if answer is None:
+        return value
+
+    value.append_assistant(answer)
+    return sai.complete_task(value)
+
+
+def semantic_cache_store_skill(value: sai.ChatAgentValue, cache: SemanticCache) -> sai.ChatAgentValue:
+    """
+    Store the answer to the last user message in the cache
+    """
+    if len(value.messages) < 2:
+        return value
+
+    question, answer = value.messages[-2], value.messages[-1]
+    if question.get('role') == 'user' and answer.get('role') == 'assistant' and \
+            isinstance(question.get('content'), str) and isinstance(answer.get('content'), str):
+        cache.store(question['content'], answer['content'])
+    return value
@@ -95,7 +95,14 @@ class TelegramAiAgent(sai.Agent):
         chat_messages = self.cache[user_id]
 
         removed = self.bot.send_message(user_id, 'processing...')
-        chat = TelegramChatAgentValue(chat_messages, user_id, removed)
+        # The chat value is kept between the requests of the user, so only the new messages are encoded.
+        # A new value is built when the stored messages are trimmed to the store limit
+        chat = self.cache.get_chat(user_id)
+        if chat is None:
+            chat = TelegramChatAgentValue(chat_messages, user_id, removed)
+            self.cache.put_chat(user_id, chat)
+        else:
+            chat.removed_message = removed
         task = TelegramUserRequestTransformTask(self).data(chat).then(self._on_complete_task)
         self.cache.lock(user_id)
         self.task_execute(task)
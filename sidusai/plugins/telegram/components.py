@@ -13,6 +13,8 @@ class TelegramChatInMemoryCache:
 
         self.cache = {}
         self.locks = {}
+        # Chat values by user. The value keeps the encoded message prefix between the requests of the user
+        self.chats = {}
 
     def lock(self, user_id):
         self.locks[user_id] = True
@@ -56,6 +58,19 @@ class TelegramChatInMemoryCache:
 
         self.cache[user_id] = messages
 
+    def get_chat(self, user_id):
+        """
+        :param user_id:
+        :return: Chat value of the user, None if the user messages have been replaced since it was put
+        """
+        chat = self.chats.get(user_id)
+        if chat is None or chat.messages is not self.cache.get(user_id):
+            return None
+        return chat
+
+    def put_chat(self, user_id, chat):
+        self.chats[user_id] = chat
+
     def __getitem__(self, item):
         if item in self.cache:
             return self.cache[item]
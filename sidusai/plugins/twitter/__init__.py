@@ -17,7 +17,11 @@ class TwitterPrepareTweetTask(sai.CompletedAgentTask):
 class TwitterAget(sai.Agent):
     def __init__(self, system_prompt: str,
                  bearer_token: str, api_key: str, api_secret: str, access_token: str, access_token_secret: str,
-                 plugins: [sai.AgentPlugin], prepare_task_skills: [] = None):
+                 plugins: [sai.AgentPlugin], prepare_task_skills: [] = None, token_budget: sai.TokenBudget = None):
+        """
+        :param token_budget: Token budget of the chat requests. Older turns of the chat are dropped
+        (or folded) to fit the budget, the system prompt and the recent turns are kept
+        """
         super().__init__(__default_agent_name__)
 
         self.bearer_token = bearer_token
@@ -36,17 +40,17 @@ class TwitterAget(sai.Agent):
         skill_names = _cp.build_and_register_task_skill_names(task_skills, self)
         self.task_registration(TwitterPrepareTweetTask, skill_names=skill_names)
 
-        self.chat = sai.ChatAgentValue([])
+        self.chat = sai.ChatAgentValue([], token_budget=token_budget)
         if system_prompt is not None:
             self.chat.append_system(system_prompt)
 
-    def prepare_tweet(self, message: str, handler):
+    def prepare_tweet(self, message: str, handler=None) -> sai.TaskFuture:
         if message is None:
             raise ValueError('Message can not be None')
         self.chat.append_user(message)
 
         task = TwitterPrepareTweetTask(self).data(self.chat).then(handler)
-        self.task_execute(task)
+        return self.task_execute(task)
 
     def _build_twitter_client(self) -> components.TwitterClient:
         return components.TwitterClient(
@@ -0,0 +1,40 @@
+import asyncio
+import time
+
+import pytest
+
+import sidusai as sai
+
+
+class _SlowTask(sai.CompletedAgentTask):
+    pass
+
+
+def slow_skill(value: sai.ChatAgentValue) -> sai.ChatAgentValue:
+    time.sleep(0.05)
+    value.append_assistant('done')
+    return value
+
+
+def _build_agent(overflow_policy: str) -> sai.Agent:
+    agent = sai.Agent('test', pool_max_size=1, queue_max_size=1, overflow_policy=overflow_policy)
+    agent.add_skill(slow_skill)
+    agent.task_registration(_SlowTask, skill_names=['slow_skill'])
+    agent.application_build()
+    return agent
+
+
+@pytest.mark.parametrize('overflow_policy', ['block', 'reject', 'drop_oldest'])
+def test_skill_calls_of_concurrent_tasks_survive_full_pool(overflow_policy):
+    agent = _build_agent(overflow_policy)
+
+    async def execute_all():
+        tasks = [_SlowTask(agent, sai.ChatAgentValue([{'role': 'user', 'content': str(i)}])) for i in range(6)]
+        return await asyncio.gather(*[agent.task_execute_async(task) for task in tasks])
+
+    try:
+        values = asyncio.run(execute_all())
+    finally:
+        agent.halt()
+
+    assert [v.messages[-1]['content'] for v in values] == ['done'] * 6
@@ -0,0 +1,116 @@
+import gzip
+import http.server
+import json
+import threading
+
+import pytest
+
+from sidusai.core.plugin import ChatAgentValue
+from sidusai.plugins.deepseek.components import DeepSeekClientComponent, iter_sse_data
+
+__deltas__ = ['Hel', 'lo ', 'wörld']
+__usage__ = {'prompt_tokens': 3, 'completion_tokens': 3, 'total_tokens': 6}
+
+
+def _build_events() -> bytes:
+    events = [b': keep-alive\n\n']
+    chunks = [{'id': 'c1', 'model': 'm', 'choices': [{'index': 0, 'delta': {'role': 'assistant', 'content': ''}}]}]
+    chunks += [{'id': 'c1', 'choices': [{'index': 0, 'delta': {'content': delta}}]} for delta in __deltas__]
+    chunks.append({'id': 'c1', 'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}]})
+    # The usage chunk has no choices
+    chunks.append({'id': 'c1', 'choices': [], 'usage': __usage__})
+    for chunk in chunks:
+        events.append(b'data: ' + json.dumps(chunk, ensure_ascii=False).encode('utf-8') + b'\r\n\r\n')
+    events.append(b'data: [DONE]\n\n')
+    # Data after the [DONE] event is never read
+    events.append(b'data: {"choices": [{"index": 0, "delta": {"content": "late"}}]}\n\n')
+    return b''.join(events)
+
+
+class _SSEHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    # Transfer mode of the response: 'chunked', 'chunked_gzip' or 'plain_gzip'
+    mode = 'chunked'
+    # Size of the chunks, frames and UTF-8 characters are split between them
+    chunk_size = 7
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        assert request['stream'] is True
+        assert request['stream_options'] == {'include_usage': True}
+
+        body = _build_events()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        if self.mode.endswith('gzip'):
+            body = gzip.compress(body)
+            self.send_header('Content-Encoding', 'gzip')
+
+        if self.mode == 'plain_gzip':
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            self.wfile.flush()
+            return
+
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        for i in range(0, len(body), self.chunk_size):
+            chunk = body[i:i + self.chunk_size]
+            self.wfile.write(b'%x\r\n' % len(chunk) + chunk + b'\r\n')
+            self.wfile.flush()
+        self.wfile.write(b'0\r\n\r\n')
+        self.wfile.flush()
+
+
+@pytest.fixture(params=['chunked', 'chunked_gzip', 'plain_gzip'])
+def base_url(request):
+    handler = type('Handler', (_SSEHandler,), {'mode': request.param})
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_port}'
+    server.shutdown()
+    server.server_close()
+
+
+def _stream(client: DeepSeekClientComponent, chat: ChatAgentValue) -> tuple:
+    deltas = []
+    stream = client.request_stream(chat)
+    while True:
+        try:
+            deltas.append(next(stream))
+        except StopIteration as e:
+            return deltas, e.value
+
+
+def test_request_stream_assembles_the_completion(base_url):
+    client = DeepSeekClientComponent('key', base_url=base_url, max_retries=0)
+    try:
+        deltas, response = _stream(client, ChatAgentValue([{'role': 'user', 'content': 'hi'}]))
+    finally:
+        client.close()
+
+    assert ''.join(deltas) == ''.join(__deltas__)
+    assert response.status_code == 200
+    assert response.last_message == {'role': 'assistant', 'content': 'Hello wörld'}
+    assert response.total_tokens == __usage__['total_tokens']
+    assert response.prompt_tokens == __usage__['prompt_tokens']
+
+
+def test_iter_sse_data_stops_at_done(base_url):
+    client = DeepSeekClientComponent('key', base_url=base_url, max_retries=0)
+    payload = json.dumps({'stream': True, 'stream_options': {'include_usage': True}})
+    try:
+        with client.session.post(client.url, data=payload, stream=True, timeout=5) as response:
+            events = [json.loads(data) for data in iter_sse_data(response)]
+    finally:
+        client.close()
+
+    assert len(events) == len(__deltas__) + 3
+    assert events[-1]['usage'] == __usage__
+    assert all('late' not in json.dumps(event) for event in events)
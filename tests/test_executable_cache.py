@@ -0,0 +1,53 @@
+import gc
+import weakref
+
+import sidusai.core.execute as ex
+
+
+class _Handler:
+
+    def handle(self, value: int) -> int:
+        return value
+
+
+def _module_handler(value: int) -> int:
+    return value
+
+
+def _make_closure(obj):
+    def closure(value: int) -> int:
+        return obj
+
+    return closure
+
+
+def test_module_level_function_is_cached():
+    assert ex.get_executable(_module_handler) is ex.get_executable(_module_handler)
+
+
+def test_bound_method_shares_plans_without_keeping_the_object():
+    handler = _Handler()
+    ref = weakref.ref(handler)
+
+    executable = ex.get_executable(handler.handle)
+    assert executable.handler == handler.handle
+    assert executable.name == ex.build_handler_name(handler.handle)
+    assert executable._plans is ex.get_executable(_Handler.handle)._plans
+
+    del handler, executable
+    gc.collect()
+    assert ref() is None
+
+
+def test_closures_and_lambdas_are_not_cached():
+    obj = _Handler()
+    ref = weakref.ref(obj)
+
+    assert ex.get_cached_handler(_make_closure(obj)) is None
+    assert ex.get_cached_handler(lambda value: obj) is None
+    ex.get_executable(_make_closure(obj))
+    ex.get_executable(lambda value: obj)
+
+    del obj
+    gc.collect()
+    assert ref() is None
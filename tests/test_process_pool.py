@@ -0,0 +1,55 @@
+import concurrent.futures as futures
+import threading as th
+import time
+import types
+
+import sidusai.core.context as context
+import sidusai.core.process as process
+
+__threads__ = 8
+
+
+class _SlowExecutor:
+    """
+    Stand-in of the process pool executor, slow to create so that the first calls overlap
+    """
+    created = []
+
+    def __init__(self, **kwargs):
+        time.sleep(0.05)
+        self.is_shutdown = False
+        _SlowExecutor.created.append(self)
+
+    def submit(self, fn, *args):
+        future = futures.Future()
+        future.set_result(args[-1])
+        return future
+
+    def shutdown(self, wait: bool = True):
+        self.is_shutdown = True
+
+
+def test_concurrent_first_calls_create_one_executor(monkeypatch):
+    monkeypatch.setattr(process.futures, 'ProcessPoolExecutor', _SlowExecutor)
+    _SlowExecutor.created = []
+    pool = process.ProcessPool(context.AgentContext('test'), max_workers=2)
+    skill = types.SimpleNamespace(options=types.SimpleNamespace(handler=None))
+
+    barrier = th.Barrier(__threads__)
+    results = []
+
+    def first_call(value):
+        barrier.wait()
+        results.append(pool.call(skill, value).result())
+
+    threads = [th.Thread(target=first_call, args=(i,)) for i in range(__threads__)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(results) == list(range(__threads__))
+    assert len(_SlowExecutor.created) == 1
+
+    pool.shutdown()
+    assert _SlowExecutor.created[0].is_shutdown
@@ -0,0 +1,43 @@
+import pytest
+
+from sidusai.core.limiter import RateLimiter
+
+
+def test_acquire_reserves_tokens_bounded_by_capacity():
+    limiter = RateLimiter(tokens_per_min=6000)
+
+    assert limiter.acquire(100) == 100
+    # The request larger than the bucket reserves the whole bucket
+    delay, reserved_tokens = limiter.reserve(10000)
+    assert reserved_tokens == 6000
+    assert delay == pytest.approx(1.0, abs=0.05)
+
+
+def test_reconcile_uses_reserved_tokens():
+    limiter = RateLimiter(tokens_per_min=6000)
+
+    reserved_tokens = limiter.acquire(10000)
+    limiter.reconcile(reserved_tokens, 1000)
+    # Only the unspent tokens of the reservation are returned, the bucket is short of 1000 tokens
+    delay, _ = limiter.reserve(6000)
+    assert delay == pytest.approx(10.0, abs=0.05)
+
+
+def test_reconcile_takes_overspent_tokens():
+    limiter = RateLimiter(tokens_per_min=6000)
+
+    reserved_tokens = limiter.acquire(1000)
+    limiter.reconcile(reserved_tokens, 7000)
+    # 1000 tokens over the bucket are refilled in 10 seconds
+    delay, _ = limiter.reserve(0)
+    assert delay == 0.0
+    delay, _ = limiter.reserve(100)
+    assert delay == pytest.approx(11.0, abs=0.05)
+
+
+def test_acquire_without_token_limit_reserves_nothing():
+    limiter = RateLimiter(requests_per_sec=100)
+
+    assert limiter.acquire(1000) == 0
+    limiter.reconcile(0, 1000)
+    assert limiter.stats()['waits'] == 0
@@ -0,0 +1,56 @@
+import gc
+import sqlite3
+import threading as th
+
+import pytest
+
+from sidusai.core.cache import ResponseCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = ResponseCache(str(tmp_path / 'responses.db'))
+    yield cache
+    cache.close()
+
+
+def test_connection_is_closed_when_thread_ends(cache):
+    connections = []
+
+    def use_cache(i):
+        cache.put(f'key-{i}', b'body')
+        connections.append(cache._connect())
+
+    for i in range(50):
+        thread = th.Thread(target=use_cache, args=(i,))
+        thread.start()
+        thread.join()
+    gc.collect()
+
+    # Only the connection of the main thread is open
+    assert len(cache._connections) == 1
+    for connection in connections:
+        with pytest.raises(sqlite3.ProgrammingError):
+            connection.execute('SELECT 1')
+    assert all(cache.get(f'key-{i}') == b'body' for i in range(50))
+
+
+def test_close_closes_connections_of_live_threads(cache):
+    connected = th.Event()
+    release = th.Event()
+    connections = []
+
+    def hold_connection():
+        connections.append(cache._connect())
+        connected.set()
+        release.wait(5)
+
+    thread = th.Thread(target=hold_connection)
+    thread.start()
+    assert connected.wait(5)
+
+    cache.close()
+    with pytest.raises(sqlite3.ProgrammingError):
+        connections[0].execute('SELECT 1')
+    release.set()
+    thread.join()
@@ -0,0 +1,175 @@
+import threading as th
+import time
+
+import pytest
+
+import sidusai.core.execute as ex
+
+__timeout_sec__ = 5
+
+
+@pytest.fixture
+def make_pool():
+    pools = []
+
+    def make(**kwargs) -> ex.ThreadPool:
+        pool = ex.ThreadPool(**kwargs)
+        pools.append(pool)
+        return pool
+
+    yield make
+    for pool in pools:
+        pool.shutdown()
+
+
+def _wait_until(condition):
+    deadline = time.monotonic() + __timeout_sec__
+    while not condition():
+        if time.monotonic() > deadline:
+            raise TimeoutError('Condition is not reached')
+        time.sleep(0.01)
+
+
+def _occupy_worker(pool: ex.ThreadPool, lock_key=None) -> th.Event:
+    """
+    Run a call holding the worker until the returned event is set
+    """
+    started = th.Event()
+    release = th.Event()
+
+    def hold():
+        started.set()
+        release.wait(__timeout_sec__)
+
+    pool.execute(hold, lock_key=lock_key)
+    assert started.wait(__timeout_sec__)
+    return release
+
+
+def test_block_policy_waits_for_queue_space(make_pool):
+    pool = make_pool(pool_max_size=1, queue_max_size=1, overflow_policy='block')
+    release = _occupy_worker(pool)
+    first = pool.call(lambda: 1)
+
+    submitted = []
+    submitter = th.Thread(target=lambda: submitted.append(pool.call(lambda: 2)))
+    submitter.start()
+    submitter.join(0.2)
+    assert submitter.is_alive()
+    assert pool.try_call(lambda: 3) is None
+
+    release.set()
+    submitter.join(__timeout_sec__)
+    assert first.result(__timeout_sec__) == 1
+    assert submitted[0].result(__timeout_sec__) == 2
+
+
+def test_reject_policy_raises_when_full(make_pool):
+    pool = make_pool(pool_max_size=1, queue_max_size=2, overflow_policy='reject')
+    release = _occupy_worker(pool)
+    first = pool.call(lambda: 1)
+
+    # The batch is accepted only if it fits entirely
+    with pytest.raises(ex.TaskRejectedError):
+        pool.execute_batch(lambda value: value, [(2,), (3,)])
+    second = pool.call(lambda: 2)
+    with pytest.raises(ex.TaskRejectedError):
+        pool.call(lambda: 3)
+
+    release.set()
+    assert first.result(__timeout_sec__) == 1
+    assert second.result(__timeout_sec__) == 2
+
+
+def test_drop_oldest_policy_cancels_oldest_call(make_pool):
+    pool = make_pool(pool_max_size=1, queue_max_size=1, overflow_policy='drop_oldest')
+    release = _occupy_worker(pool)
+    first = pool.call(lambda: 1)
+    second = pool.call(lambda: 2)
+
+    release.set()
+    assert second.result(__timeout_sec__) == 2
+    assert first.cancelled()
+
+
+def test_calls_waiting_for_lock_key_take_queue_space(make_pool):
+    pool = make_pool(pool_max_size=2, queue_max_size=2, overflow_policy='reject')
+    release = _occupy_worker(pool, lock_key='key')
+
+    items = [ex.FutureWorkItem(lambda value: value, (i,), lock_key='key') for i in range(2)]
+    for item in items:
+        pool.submit(item)
+    # The second worker moves the calls from the queue to the calls waiting for the key
+    _wait_until(lambda: pool._parked_size == 2)
+    assert pool.queue_depth == 2
+
+    with pytest.raises(ex.TaskRejectedError):
+        pool.call(lambda: 3)
+
+    release.set()
+    assert [item.future.result(__timeout_sec__) for item in items] == [0, 1]
+    assert pool.queue_depth == 0
+
+
+def test_drop_oldest_policy_drops_call_waiting_for_lock_key(make_pool):
+    pool = make_pool(pool_max_size=2, queue_max_size=2, overflow_policy='drop_oldest')
+    release = _occupy_worker(pool, lock_key='key')
+
+    items = [ex.FutureWorkItem(lambda value: value, (i,), lock_key='key') for i in range(2)]
+    for item in items:
+        pool.submit(item)
+    _wait_until(lambda: pool._parked_size == 2)
+
+    last = pool.call(lambda: 2)
+    release.set()
+    assert last.result(__timeout_sec__) == 2
+    assert items[1].future.result(__timeout_sec__) == 1
+    assert items[0].future.cancelled()
+
+
+def test_lock_key_calls_keep_submission_order(make_pool):
+    pool = make_pool(pool_max_size=4, queue_max_size=64)
+    executed = []
+    running = []
+
+    def append(value):
+        running.append(value)
+        assert len(running) == 1
+        time.sleep(0.001)
+        executed.append(value)
+        running.remove(value)
+
+    items = [ex.FutureWorkItem(append, (i,), lock_key='key') for i in range(32)]
+    pool.submit_batch(items)
+    for item in items:
+        item.future.result(__timeout_sec__)
+
+    assert executed == list(range(32))
+
+
+def test_worker_executes_call_in_place_when_queue_is_full(make_pool):
+    pool = make_pool(pool_max_size=1, queue_max_size=1, overflow_policy='block')
+
+    def submit_from_worker():
+        worker = th.current_thread()
+        queued = pool.call(th.current_thread)
+        # The queue is full and the only worker is busy, the call is executed by the worker itself
+        in_place = pool.call(th.current_thread)
+        assert in_place.done()
+        return worker, queued, in_place.result()
+
+    worker, queued, in_place_thread = pool.call(submit_from_worker).result(__timeout_sec__)
+    assert in_place_thread is worker
+    assert queued.result(__timeout_sec__) is worker
+
+
+@pytest.mark.parametrize('overflow_policy', ['block', 'reject', 'drop_oldest'])
+def test_try_call_does_not_apply_overflow_policy(make_pool, overflow_policy):
+    pool = make_pool(pool_max_size=1, queue_max_size=1, overflow_policy=overflow_policy)
+    release = _occupy_worker(pool)
+    queued = pool.call(lambda: 1)
+
+    assert pool.try_call(lambda: 2) is None
+
+    release.set()
+    assert queued.result(__timeout_sec__) == 1